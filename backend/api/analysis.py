@@ -1,21 +1,75 @@
-def variant_detection(reference, sample):
+import numpy as np
+
+from .instrumentation import PROGRESS_ROWS, phase, progress_reporter, record_sizes
+from .kmer_index import find_seed_window, get_kmer_index
+from .sequences import BASES, PackedSequence, as_packed, as_string, codon_indices, complement_codes, sequence_bytes
+
+def variant_alignment(reference, sample, engine='auto', band_width=None, index=None):
+    """
+    Align a sample to a reference as variant detection does: 'auto' uses the
+    'banded' engine, since samples are usually close to the reference.
+    """
+    if engine == 'auto':
+        engine = 'banded'
+    return sequence_alignment(reference, sample, engine=engine, band_width=band_width, index=index)
+
+def variant_detection(reference, sample, engine='auto', band_width=None, index=None, normalize=False):
     """
     Detects variants (mismatches and gaps) between two DNA sequences.
 
     Args:
-        reference (str): The reference DNA sequence.
-        sample (str): The sample DNA sequence.
+        reference (str or PackedSequence): The reference DNA sequence.
+        sample (str or PackedSequence): The sample DNA sequence.
+        engine (str): Alignment engine passed to sequence_alignment. 'auto'
+            uses 'banded', since samples are usually close to the reference.
+        band_width (int): Band half-width for the 'banded' engine.
+        index (KmerIndex): Prebuilt index of the reference for the 'seeded' engine.
+        normalize (bool): Report variants as produced by normalized_variants.
 
     Returns:
-        dict: Aligned sequences and a list of detected variants.
+        dict: Aligned sequences and a list of detected variants, plus the band
+        width used when the 'banded' engine ran. Variant positions are
+        alignment columns, except with the 'seeded' or 'local' engines or
+        normalize, where they are 1-based reference coordinates (an insertion
+        is placed at the reference base it follows) and the aligned region is
+        reported. With 'local', unaligned flanks of the sample are not variants.
     """
-    alignment_result = sequence_alignment(reference, sample)
+    alignment_result = variant_alignment(reference, sample, engine=engine, band_width=band_width, index=index)
     ref_aligned = alignment_result['aligned_sequence_1']
     sample_aligned = alignment_result['aligned_sequence_2']
 
+    with phase('variants'):
+        if normalize:
+            variants = list(normalized_variants(ref_aligned, sample_aligned, alignment_result.get('reference_start', 0)))
+        else:
+            variants = column_variants(ref_aligned, sample_aligned, alignment_result.get('reference_start'))
+
+    result = {
+        'aligned_reference': ref_aligned,
+        'aligned_sample': sample_aligned,
+        'variants': variants
+    }
+    for key in ('band_width', 'reference_start', 'reference_end', 'query_start', 'query_end'):
+        if key in alignment_result:
+            result[key] = alignment_result[key]
+    return result
+
+def column_variants(ref_aligned, sample_aligned, reference_start=None):
+    """
+    One variant per differing alignment column.
+
+    Positions are 1-based alignment columns, or 1-based reference coordinates
+    when reference_start (the 0-based reference offset of the alignment) is
+    given.
+    """
     variants = []
+    reference_position = reference_start
 
     for position, (ref_base, sample_base) in enumerate(zip(ref_aligned, sample_aligned), start=1):
+        if reference_position is not None:
+            if ref_base != '-':
+                reference_position += 1
+            position = reference_position
         if ref_base == sample_base:
             continue
         elif ref_base == '-':
@@ -37,27 +91,283 @@ def variant_detection(reference, sample):
                 'reference_base': ref_base,
                 'sample_base': sample_base
             })
+    return variants
 
-    return {
-        'aligned_reference': ref_aligned,
-        'aligned_sample': sample_aligned,
-        'variants': variants
-    }
+_GAP = ord('-')
+
+def normalized_variants(ref_aligned, sample_aligned, reference_start=0):
+    """
+    Variants of an alignment as compact, left-normalized events.
+
+    Consecutive gap columns become one multi-base insertion or deletion, and
+    each indel is shifted left as far as the reference allows without passing
+    the previous event. Only the differing columns are visited in Python.
+
+    Args:
+        ref_aligned (str): Aligned reference, '-' for gaps.
+        sample_aligned (str): Aligned sample, '-' for gaps.
+        reference_start (int): 0-based reference offset of the alignment.
+
+    Yields:
+        dict: Events in reference order, with 1-based reference positions. An
+        insertion's position is the reference base it follows (0 before the
+        first base); a deletion's is its first deleted base.
+    """
+    ref_codes = np.frombuffer(ref_aligned.encode('ascii'), dtype=np.uint8)
+    sample_codes = np.frombuffer(sample_aligned.encode('ascii'), dtype=np.uint8)
+    ref_bases = ref_codes != _GAP
+    # Reference bases consumed up to and including each column
+    consumed = np.cumsum(ref_bases)
+    reference = ref_codes[ref_bases].tobytes()
+
+    columns = np.flatnonzero(ref_codes != sample_codes).tolist()
+    floor = 0
+    i = 0
+    while i < len(columns):
+        column = columns[i]
+        if ref_codes[column] != _GAP and sample_codes[column] != _GAP:
+            ref_index = int(consumed[column]) - 1
+            floor = ref_index + 1
+            i += 1
+            yield {
+                'type': 'substitution',
+                'position': reference_start + ref_index + 1,
+                'reference_base': ref_aligned[column],
+                'sample_base': sample_aligned[column]
+            }
+            continue
+
+        gapped = ref_codes if ref_codes[column] == _GAP else sample_codes
+        j = i
+        while j + 1 < len(columns) and columns[j + 1] == columns[j] + 1 and gapped[columns[j + 1]] == _GAP:
+            j += 1
+        last = columns[j]
+        i = j + 1
+
+        if gapped is ref_codes:
+            inserted = sample_aligned[column:last + 1]
+            after = int(consumed[column])
+            while after > floor and reference[after - 1] == ord(inserted[-1]):
+                inserted = inserted[-1] + inserted[:-1]
+                after -= 1
+            floor = after
+            yield {
+                'type': 'insertion',
+                'position': reference_start + after,
+                'inserted_bases': inserted
+            }
+        else:
+            start, end = int(consumed[column]) - 1, int(consumed[last])
+            while start > floor and reference[start - 1] == reference[end - 1]:
+                start -= 1
+                end -= 1
+            floor = end
+            yield {
+                'type': 'deletion',
+                'position': reference_start + start + 1,
+                'deleted_bases': reference[start:end].decode('ascii')
+            }
 
-def sequence_alignment(seq1, seq2, match=1, mismatch=-1, gap=-2):
+def vcf_lines(variants, reference, contig='reference'):
+    """
+    Write normalized variants as VCF 4.2, one line at a time.
+
+    Indels are anchored on the preceding reference base, or on the following
+    one at the start of the reference, as VCF requires.
+
+    Args:
+        variants (iterable): Events from normalized_variants.
+        reference (str or PackedSequence): The full reference sequence.
+        contig (str): CHROM value for every record.
+
+    Yields:
+        str: Header lines, then one record per variant, each ending in a newline.
+    """
+    yield '##fileformat=VCFv4.2\n'
+    yield f'##contig=<ID={contig},length={len(reference)}>\n'
+    yield '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+
+    for variant in variants:
+        position = variant['position']
+        if variant['type'] == 'substitution':
+            ref, alt = variant['reference_base'], variant['sample_base']
+        elif variant['type'] == 'insertion':
+            bases = variant['inserted_bases']
+            if position > 0:
+                ref = reference[position - 1]
+                alt = ref + bases
+            else:
+                position = 1
+                ref = reference[0]
+                alt = bases + ref
+        else:
+            bases = variant['deleted_bases']
+            if position > 1:
+                position -= 1
+                alt = reference[position - 1]
+                ref = alt + bases
+            elif position + len(bases) <= len(reference):
+                alt = reference[position + len(bases) - 1]
+                ref = bases + alt
+            else:
+                ref, alt = bases, '<DEL>'
+        yield f'{contig}\t{position}\t.\t{ref}\t{alt}\t.\tPASS\t.\n'
+
+HIRSCHBERG_THRESHOLD = 100_000_000
+HIRSCHBERG_BLOCK = 4096
+
+ALIGNMENT_ENGINES = ('auto', 'full', 'numpy', 'linear', 'banded', 'seeded', 'local')
+TRACE_DIAGONAL, TRACE_UP, TRACE_LEFT = 0, 1, 2
+_PACK_SHIFTS = np.array([0, 2, 4, 6], dtype=np.uint8)
+
+BAND_INITIAL_WIDTH = 16
+_BAND_OUTSIDE = np.iinfo(np.int64).min // 4
+
+def sequence_alignment(seq1, seq2, match=1, mismatch=-1, gap=-2, engine='auto', band_width=None, index=None):
     """
     Implements the Needleman–Wunsch algorithm for global sequence alignment.
 
     Args:
-        seq1 (str): The first sequence.
-        seq2 (str): The second sequence.
+        seq1 (str or PackedSequence): The first sequence.
+        seq2 (str or PackedSequence): The second sequence.
         match (int): The score for a match.
         mismatch (int): The penalty for a mismatch.
         gap (int): The penalty for a gap.
+        engine (str): 'full' for the pure-Python full-matrix algorithm,
+            'numpy' for the vectorized full-matrix algorithm, 'linear' for the
+            linear-memory Hirschberg algorithm, or 'auto' to use 'numpy' and
+            switch to 'linear' once the matrix exceeds HIRSCHBERG_THRESHOLD cells.
+            'banded' only fills cells near the diagonal, see banded_alignment.
+            'seeded' aligns all of seq2 to the best window of a long seq1,
+            see seeded_alignment. 'local' aligns only the best-scoring pair
+            of substrings (Smith–Waterman), see local_alignment.
+        band_width (int): Band half-width for the 'banded' engine. If None it
+            is found automatically.
+        index (KmerIndex): Prebuilt index of seq1 for the 'seeded' engine.
 
     Returns:
-        dict: Aligned sequences and the alignment score.
+        dict: Aligned sequences and the alignment score. The 'banded' engine
+        also reports the band width used, or None if it fell back to 'auto'.
+        The 'seeded' engine also reports the aligned region of seq1 as
+        0-based, half-open 'reference_start' and 'reference_end'; the
+        'local' engine reports those and 'query_start' and 'query_end' for
+        the aligned region of seq2.
+    """
+    record_sizes(n=len(seq1), m=len(seq2), cells=len(seq1) * len(seq2))
+    with phase('align'):
+        return _sequence_alignment(seq1, seq2, match, mismatch, gap, engine, band_width, index)
+
+def _sequence_alignment(seq1, seq2, match, mismatch, gap, engine, band_width, index):
+    if engine == 'seeded':
+        aligned_seq1, aligned_seq2, score, start, end = seeded_alignment(seq1, seq2, match, mismatch, gap, index)
+        return {
+            'aligned_sequence_1': aligned_seq1,
+            'aligned_sequence_2': aligned_seq2,
+            'alignment_score': score,
+            'reference_start': start,
+            'reference_end': end
+        }
+
+    if engine == 'local':
+        aligned_seq1, aligned_seq2, score, start1, end1, start2, end2 = local_alignment(seq1, seq2, match, mismatch, gap)
+        return {
+            'aligned_sequence_1': aligned_seq1,
+            'aligned_sequence_2': aligned_seq2,
+            'alignment_score': score,
+            'reference_start': start1,
+            'reference_end': end1,
+            'query_start': start2,
+            'query_end': end2
+        }
+
+    if engine == 'banded':
+        banded = banded_alignment(seq1, seq2, match, mismatch, gap, band_width)
+        if banded is None:
+            result = sequence_alignment(seq1, seq2, match, mismatch, gap)
+        else:
+            aligned_seq1, aligned_seq2, score, band_width = banded
+            result = {
+                'aligned_sequence_1': aligned_seq1,
+                'aligned_sequence_2': aligned_seq2,
+                'alignment_score': score
+            }
+        result['band_width'] = None if banded is None else band_width
+        return result
+
+    if engine == 'auto':
+        engine = 'linear' if len(seq1) * len(seq2) > HIRSCHBERG_THRESHOLD else 'numpy'
+
+    if engine == 'full':
+        aligned_seq1, aligned_seq2, score = full_matrix_alignment(seq1, seq2, match, mismatch, gap)
+    elif engine == 'numpy':
+        aligned_seq1, aligned_seq2, score = numpy_alignment(seq1, seq2, match, mismatch, gap)
+    elif engine == 'linear':
+        aligned_seq1, aligned_seq2, score = hirschberg_alignment(seq1, seq2, match, mismatch, gap)
+    else:
+        raise ValueError(f"Unknown alignment engine: {engine}")
+
+    return {
+        'aligned_sequence_1': aligned_seq1,
+        'aligned_sequence_2': aligned_seq2,
+        'alignment_score': score
+    }
+
+def alignment_cigar(aligned_seq1, aligned_seq2):
+    """
+    Run-length encode an alignment as an extended CIGAR string.
+
+    Columns are '=' (match), 'X' (mismatch), 'I' (base only in seq2) or 'D'
+    (base only in seq1), so seq1 plays the role of the reference. Columns are
+    classified with whole-array operations; Python only visits the runs.
     """
+    codes1 = np.frombuffer(aligned_seq1.encode('ascii'), dtype=np.uint8)
+    codes2 = np.frombuffer(aligned_seq2.encode('ascii'), dtype=np.uint8)
+    if len(codes1) == 0:
+        return ''
+    ops = np.full(len(codes1), ord('='), dtype=np.uint8)
+    ops[codes1 != codes2] = ord('X')
+    ops[codes1 == _GAP] = ord('I')
+    ops[codes2 == _GAP] = ord('D')
+
+    starts = np.flatnonzero(np.concatenate(([True], ops[1:] != ops[:-1])))
+    lengths = np.diff(np.append(starts, len(ops)))
+    return ''.join(f'{length}{chr(op)}' for length, op in zip(lengths.tolist(), ops[starts].tolist()))
+
+def compact_alignment(alignment, seq1_length, seq2_length, include_gapped=False):
+    """
+    Replace the gapped strings of a sequence_alignment result with a CIGAR
+    string and 0-based, half-open coordinates on both sequences.
+
+    Args:
+        alignment (dict): Result of sequence_alignment.
+        seq1_length (int): Length of the first sequence.
+        seq2_length (int): Length of the second sequence.
+        include_gapped (bool): Keep the gapped strings as well.
+
+    Returns:
+        dict: The result with 'cigar', 'reference_start', 'reference_end',
+        'query_start' and 'query_end' added.
+    """
+    result = dict(alignment)
+    result['cigar'] = alignment_cigar(alignment['aligned_sequence_1'], alignment['aligned_sequence_2'])
+    result.setdefault('reference_start', 0)
+    result.setdefault('reference_end', seq1_length)
+    result.setdefault('query_start', 0)
+    result.setdefault('query_end', seq2_length)
+    if not include_gapped:
+        del result['aligned_sequence_1'], result['aligned_sequence_2']
+    return result
+
+def full_matrix_alignment(seq1, seq2, match=1, mismatch=-1, gap=-2):
+    """
+    Needleman–Wunsch with full (n+1)x(m+1) scoring and traceback matrices.
+
+    Ties are broken 'D' (diagonal) before 'U' (up) before 'L' (left).
+
+    Returns:
+        tuple: (aligned_seq1, aligned_seq2, score)
+    """
+    seq1, seq2 = as_string(seq1), as_string(seq2)
     n, m = len(seq1), len(seq2)
     scoring_matrix = [[0 for _ in range(m + 1)] for _ in range(n + 1)]
     traceback_matrix = [[None for _ in range(m + 1)] for _ in range(n + 1)]
@@ -83,28 +393,588 @@ def sequence_alignment(seq1, seq2, match=1, mismatch=-1, gap=-2):
             else:
                 traceback_matrix[i][j] = 'L'
 
-    aligned_seq1, aligned_seq2 = '', ''
+    # Filled from the back, so the traceback never copies a partial alignment
+    aligned_seq1, aligned_seq2 = [None] * (n + m), [None] * (n + m)
+    position = n + m
     i, j = n, m
     while i > 0 or j > 0:
+        position -= 1
         if traceback_matrix[i][j] == 'D':
-            aligned_seq1 = seq1[i - 1] + aligned_seq1
-            aligned_seq2 = seq2[j - 1] + aligned_seq2
+            aligned_seq1[position] = seq1[i - 1]
+            aligned_seq2[position] = seq2[j - 1]
             i -= 1
             j -= 1
         elif traceback_matrix[i][j] == 'U':
-            aligned_seq1 = seq1[i - 1] + aligned_seq1
-            aligned_seq2 = '-' + aligned_seq2
+            aligned_seq1[position] = seq1[i - 1]
+            aligned_seq2[position] = '-'
             i -= 1
         elif traceback_matrix[i][j] == 'L':
-            aligned_seq1 = '-' + aligned_seq1
-            aligned_seq2 = seq2[j - 1] + aligned_seq2
+            aligned_seq1[position] = '-'
+            aligned_seq2[position] = seq2[j - 1]
             j -= 1
+    aligned_seq1 = ''.join(aligned_seq1[position:])
+    aligned_seq2 = ''.join(aligned_seq2[position:])
 
-    return {
-        'aligned_sequence_1': aligned_seq1,
-        'aligned_sequence_2': aligned_seq2,
-        'alignment_score': scoring_matrix[n][m]
-    }
+    return aligned_seq1, aligned_seq2, scoring_matrix[n][m]
+
+def encode_sequence(seq):
+    """
+    Encode a str or PackedSequence as a uint8 NumPy array of its ASCII codes.
+    """
+    return np.frombuffer(sequence_bytes(seq), dtype=np.uint8)
+
+def _score_rows(encoded_seq1, encoded_seq2, match, mismatch):
+    """
+    Build one substitution-score row against seq2 per distinct base of seq1.
+    """
+    return {base: np.where(encoded_seq2 == base, match, mismatch).astype(np.int64)
+            for base in np.unique(encoded_seq1).tolist()}
+
+def _score_row(prev, substitution, first_cell, gap, gap_offsets):
+    """
+    Compute a DP row from the previous one with whole-array operations.
+
+    The left-neighbour dependency is resolved with a running maximum: with a
+    linear gap penalty, cur[j] = max_k<=j (t[k] + (j - k) * gap), where t holds
+    the best of the diagonal and up moves.
+
+    Returns:
+        tuple: (cur, diagonal_scores, up_scores), the latter two for columns 1..m.
+    """
+    diagonal_scores = prev[:-1] + substitution
+    up_scores = prev[1:] + gap
+    best = np.empty_like(prev)
+    best[0] = first_cell
+    np.maximum(diagonal_scores, up_scores, out=best[1:])
+    best -= gap_offsets
+    np.maximum.accumulate(best, out=best)
+    best += gap_offsets
+    return best, diagonal_scores, up_scores
+
+def _trace_codes(cur, diagonal_scores, up_scores):
+    """
+    Traceback codes for columns 1..m, breaking ties 'D' before 'U' before 'L'.
+    """
+    return np.where(cur[1:] == diagonal_scores, TRACE_DIAGONAL,
+                    np.where(cur[1:] == up_scores, TRACE_UP, TRACE_LEFT)).astype(np.uint8)
+
+def numpy_alignment(seq1, seq2, match=1, mismatch=-1, gap=-2):
+    """
+    Vectorized Needleman–Wunsch.
+
+    Each DP row is computed with NumPy array operations and the traceback is
+    stored as 2-bit codes packed four cells per byte. Returns the same
+    alignment as full_matrix_alignment, including its tie-breaking.
+
+    Returns:
+        tuple: (aligned_seq1, aligned_seq2, score)
+    """
+    n, m = len(seq1), len(seq2)
+    encoded_seq1, encoded_seq2 = encode_sequence(seq1), encode_sequence(seq2)
+    score_rows = _score_rows(encoded_seq1, encoded_seq2, match, mismatch)
+    gap_offsets = np.arange(m + 1, dtype=np.int64) * gap
+    packed_width = (m + 4) // 4
+
+    traceback = np.zeros((n + 1, packed_width), dtype=np.uint8)
+    codes = np.full(packed_width * 4, TRACE_LEFT, dtype=np.uint8)
+    codes[0] = TRACE_DIAGONAL
+    traceback[0] = _pack_codes(codes)
+    codes[0] = TRACE_UP
+
+    report = progress_reporter()
+    prev = gap_offsets.copy()
+    for i in range(1, n + 1):
+        prev, diagonal_scores, up_scores = _score_row(prev, score_rows[int(encoded_seq1[i - 1])], i * gap, gap, gap_offsets)
+        codes[1:m + 1] = _trace_codes(prev, diagonal_scores, up_scores)
+        traceback[i] = _pack_codes(codes)
+        if report is not None and i % PROGRESS_ROWS == 0:
+            report(i / n)
+    score = int(prev[m])
+
+    aligned_seq1, aligned_seq2 = _packed_traceback(seq1, seq2, traceback, None)
+    return aligned_seq1, aligned_seq2, score
+
+def _pack_codes(codes):
+    """
+    Pack 2-bit traceback codes four to a byte; len(codes) must be a multiple of 4.
+    """
+    return np.bitwise_or.reduce(codes.reshape(-1, 4) << _PACK_SHIFTS, axis=1)
+
+def _packed_traceback(seq1, seq2, traceback, diagonal_offset, free_seq1_start=False):
+    """
+    Walk a packed traceback from (n, m) back to (0, 0).
+
+    Row i of a full traceback stores column j at index j; a banded traceback
+    stores it at index j - i - diagonal_offset, where diagonal_offset is the
+    lowest diagonal of the band. With free_seq1_start the walk stops as soon as
+    seq2 is used up, leaving a prefix of seq1 unaligned.
+
+    Returns:
+        tuple: (aligned_seq1, aligned_seq2)
+    """
+    seq1, seq2 = sequence_bytes(seq1), sequence_bytes(seq2)
+    i, j = len(seq1), len(seq2)
+    # Filled from the back; an alignment is at most n + m columns long
+    aligned_seq1, aligned_seq2 = bytearray(i + j), bytearray(i + j)
+    position = i + j
+    gap_byte = ord('-')
+    while j > 0 or (i > 0 and not free_seq1_start):
+        column = j if diagonal_offset is None else j - i - diagonal_offset
+        code = (int(traceback[i, column >> 2]) >> ((column & 3) * 2)) & 3
+        position -= 1
+        if code == TRACE_DIAGONAL:
+            aligned_seq1[position] = seq1[i - 1]
+            aligned_seq2[position] = seq2[j - 1]
+            i -= 1
+            j -= 1
+        elif code == TRACE_UP:
+            aligned_seq1[position] = seq1[i - 1]
+            aligned_seq2[position] = gap_byte
+            i -= 1
+        else:
+            aligned_seq1[position] = gap_byte
+            aligned_seq2[position] = seq2[j - 1]
+            j -= 1
+
+    return aligned_seq1[position:].decode('ascii'), aligned_seq2[position:].decode('ascii')
+
+def edit_distance(seq1, seq2, max_distance=None):
+    """
+    Unit-cost (Levenshtein) edit distance with Myers' bit-parallel algorithm.
+
+    One DP column of seq1 is held as bit vectors in Python integers, so each
+    step over seq2 updates all len(seq1) cells with a handful of word-level
+    operations (Hyyrö's formulation for global distance). No matrix or
+    traceback is allocated.
+
+    With max_distance the scan stops as soon as the distance provably exceeds
+    it: the last DP row changes by at most one per column, so the final
+    distance is at least the current one less the columns still to come.
+
+    Args:
+        seq1 (str or PackedSequence): The first sequence.
+        seq2 (str or PackedSequence): The second sequence.
+        max_distance (int): Largest distance of interest.
+
+    Returns:
+        int: The minimum number of substitutions, insertions and deletions, or
+        None if that exceeds max_distance.
+    """
+    seq1, seq2 = as_string(seq1), as_string(seq2)
+    n, m = len(seq1), len(seq2)
+    if max_distance is not None and abs(n - m) > max_distance:
+        return None
+    if n == 0:
+        return m
+
+    mask = (1 << n) - 1
+    high_bit = 1 << (n - 1)
+    peq = {}
+    for i, base in enumerate(seq1):
+        peq[base] = peq.get(base, 0) | (1 << i)
+
+    positive_vertical, negative_vertical = mask, 0
+    distance = n
+    # Stop once distance - (m - j) > max_distance; the default can never be reached.
+    limit = n + 2 * m if max_distance is None else max_distance + m
+    for j, base in enumerate(seq2, 1):
+        equal = peq.get(base, 0)
+        vertical = equal | negative_vertical
+        horizontal = ((((equal & positive_vertical) + positive_vertical) & mask) ^ positive_vertical) | equal
+        positive_horizontal = negative_vertical | (~(horizontal | positive_vertical) & mask)
+        negative_horizontal = positive_vertical & horizontal
+        if positive_horizontal & high_bit:
+            distance += 1
+        elif negative_horizontal & high_bit:
+            distance -= 1
+        positive_horizontal = ((positive_horizontal << 1) | 1) & mask
+        negative_horizontal = (negative_horizontal << 1) & mask
+        positive_vertical = negative_horizontal | (~(vertical | positive_horizontal) & mask)
+        negative_vertical = positive_horizontal & vertical
+        if distance + j > limit:
+            return None
+    if max_distance is not None and distance > max_distance:
+        return None
+    return distance
+
+def alignment_score(seq1, seq2, match=1, mismatch=-1, gap=-2):
+    """
+    Needleman–Wunsch score without a traceback.
+
+    An alignment with X mismatches and G gaps scores
+    match * (n + m) / 2 - (match - mismatch) * X - (match / 2 - gap) * G, so
+    when both costs are equal the score follows directly from edit_distance.
+    Otherwise the score is computed with the vectorized row kernel, keeping a
+    single DP row.
+
+    Returns:
+        int: The global alignment score.
+    """
+    n, m = len(seq1), len(seq2)
+    mismatch_cost = match - mismatch
+    if mismatch_cost > 0 and 2 * mismatch_cost == match - 2 * gap:
+        return (match * (n + m) - 2 * mismatch_cost * edit_distance(seq1, seq2)) // 2
+
+    encoded_seq1, encoded_seq2 = encode_sequence(seq1), encode_sequence(seq2)
+    score_rows = _score_rows(encoded_seq1, encoded_seq2, match, mismatch)
+    gap_offsets = np.arange(m + 1, dtype=np.int64) * gap
+    prev = gap_offsets.copy()
+    for i in range(1, n + 1):
+        prev, _, _ = _score_row(prev, score_rows[int(encoded_seq1[i - 1])], i * gap, gap, gap_offsets)
+    return int(prev[m])
+
+def alignment_scores(seq1, others, match=1, mismatch=-1, gap=-2):
+    """
+    alignment_score of seq1 against each of several sequences at once.
+
+    The other sequences are padded to a common length and laid out one per
+    column, so each DP row of the whole batch is advanced with the same few
+    array operations and the running maximum runs down contiguous rows.
+    Padding lies past the end of each sequence and never feeds back into its
+    cells. Scores are kept in int32 whenever they cannot overflow it.
+
+    Returns:
+        np.ndarray: Scores, one per sequence in others.
+    """
+    lengths = np.array([len(other) for other in others], dtype=np.int64)
+    if not len(lengths):
+        return lengths
+    encoded = np.zeros((int(lengths.max()), len(lengths)), dtype=np.uint8)
+    for column, other in enumerate(others):
+        encoded[:len(other), column] = encode_sequence(other)
+    encoded_seq1 = encode_sequence(seq1)
+    bound = max(abs(match), abs(mismatch), abs(gap)) * (len(encoded_seq1) + len(encoded) + 1)
+    dtype = np.int32 if bound < np.iinfo(np.int32).max else np.int64
+    score_rows = {base: row.astype(dtype) for base, row in _score_rows(encoded_seq1, encoded, match, mismatch).items()}
+    gap_offsets = (np.arange(len(encoded) + 1, dtype=dtype) * gap)[:, None]
+
+    prev = np.repeat(gap_offsets, len(lengths), axis=1)
+    best = np.empty_like(prev)
+    up_scores = np.empty_like(prev[1:])
+    for i in range(1, len(encoded_seq1) + 1):
+        np.add(prev[:-1], score_rows[int(encoded_seq1[i - 1])], out=best[1:])
+        np.add(prev[1:], gap, out=up_scores)
+        np.maximum(best[1:], up_scores, out=best[1:])
+        best[0] = i * gap
+        best -= gap_offsets
+        np.maximum.accumulate(best, axis=0, out=best)
+        best += gap_offsets
+        prev, best = best, prev
+    return prev[lengths, np.arange(len(lengths))]
+
+def _band_escape_bound(n, m, low, high, match, mismatch, gap):
+    """
+    Upper bound on the score of any path that leaves diagonals low..high.
+
+    A path from diagonal 0 to diagonal m - n that touches diagonal d needs at
+    least |d| + |m - n - d| gaps; with G gaps it has (n + m - G) / 2 aligned
+    columns, each scoring at most max(match, mismatch).
+
+    Returns:
+        float: The bound, or None if no path can leave the band.
+    """
+    min_gaps = min(abs(d) + abs(m - n - d) for d in (low - 1, high + 1))
+    if min_gaps > n + m:
+        return None
+    best_column = max(match, mismatch)
+    return max(best_column * (n + m - gaps) / 2 + gap * gaps for gaps in (min_gaps, n + m))
+
+def _banded_pass(seq1, seq2, low, high, match, mismatch, gap):
+    """
+    Fill the DP cells on diagonals low..high (j - i) with a packed traceback.
+
+    Row i is stored by offset d = j - i - low, so the diagonal, up and left
+    neighbours of offset d sit at offsets d, d + 1 and d - 1. Cells outside the
+    matrix hold a large negative score.
+
+    Returns:
+        tuple: (score, traceback)
+    """
+    n, m = len(seq1), len(seq2)
+    width = high - low + 1
+    encoded_seq1, encoded_seq2 = encode_sequence(seq1), encode_sequence(seq2)
+    padded_seq2 = np.zeros(m + 1, dtype=np.uint8)
+    padded_seq2[1:] = encoded_seq2
+    offsets = np.arange(width, dtype=np.int64)
+    gap_offsets = offsets * gap
+    packed_width = (width + 3) // 4
+    traceback = np.zeros((n + 1, packed_width), dtype=np.uint8)
+    codes = np.full(packed_width * 4, TRACE_LEFT, dtype=np.uint8)
+
+    columns = low + offsets
+    prev = np.where((columns >= 0) & (columns <= m), columns * gap, _BAND_OUTSIDE)
+    if low <= 0:
+        codes[-low] = TRACE_DIAGONAL
+    traceback[0] = _pack_codes(codes)
+
+    report = progress_reporter()
+    for i in range(1, n + 1):
+        columns = i + low + offsets
+        inside = (columns >= 0) & (columns <= m)
+        substitution = np.where(padded_seq2[np.clip(columns, 0, m)] == encoded_seq1[i - 1], match, mismatch)
+        diagonal_scores = prev + substitution
+        up_scores = np.empty_like(prev)
+        up_scores[:-1] = prev[1:] + gap
+        up_scores[-1] = _BAND_OUTSIDE
+        best = np.maximum(diagonal_scores, up_scores)
+        left_edge = -i - low
+        if 0 <= left_edge < width:
+            best[left_edge] = i * gap
+        best[~inside] = _BAND_OUTSIDE
+        best -= gap_offsets
+        np.maximum.accumulate(best, out=best)
+        best += gap_offsets
+        best[~inside] = _BAND_OUTSIDE
+
+        codes[:width] = np.where(best == diagonal_scores, TRACE_DIAGONAL,
+                                 np.where(best == up_scores, TRACE_UP, TRACE_LEFT))
+        if 0 <= left_edge < width:
+            codes[left_edge] = TRACE_UP
+        traceback[i] = _pack_codes(codes)
+        prev = best
+        if report is not None and i % PROGRESS_ROWS == 0:
+            report(i / n)
+
+    return int(prev[m - n - low]), traceback
+
+def banded_alignment(seq1, seq2, match=1, mismatch=-1, gap=-2, band_width=None):
+    """
+    Global alignment restricted to cells within band_width of the diagonal.
+
+    The band spans diagonals min(0, m - n) - band_width to max(0, m - n) +
+    band_width, so it always contains both corners. With an explicit
+    band_width the result is the best in-band alignment. Without one, the band
+    starts at BAND_INITIAL_WIDTH and doubles until the in-band score strictly
+    beats _band_escape_bound, at which point the alignment is identical to
+    full_matrix_alignment.
+
+    Returns:
+        tuple: (aligned_seq1, aligned_seq2, score, band_width), or None when no
+        band narrower than half the matrix is provably optimal.
+    """
+    n, m = len(seq1), len(seq2)
+    automatic = band_width is None
+    if automatic:
+        band_width = BAND_INITIAL_WIDTH
+
+    while True:
+        low, high = min(0, m - n) - band_width, max(0, m - n) + band_width
+        full_band = low <= -n and high >= m
+        if automatic and not full_band and 2 * (high - low + 1) > m + 1:
+            return None
+        score, traceback = _banded_pass(seq1, seq2, low, high, match, mismatch, gap)
+        bound = _band_escape_bound(n, m, low, high, match, mismatch, gap)
+        if not automatic or full_band or bound is None or score > bound:
+            break
+        band_width *= 2
+
+    aligned_seq1, aligned_seq2 = _packed_traceback(seq1, seq2, traceback, low)
+    return aligned_seq1, aligned_seq2, score, band_width
+
+def fitting_alignment(seq1, seq2, match=1, mismatch=-1, gap=-2):
+    """
+    Align all of seq2 against the best-scoring substring of seq1.
+
+    Gaps before and after the aligned part of seq1 are free, so a short read
+    aligned to a window of a longer reference does not pay for the flanks.
+    Uses the vectorized row kernel and a packed traceback.
+
+    Returns:
+        tuple: (aligned_seq1, aligned_seq2, score, start, end), where the
+        alignment covers seq1[start:end].
+    """
+    n, m = len(seq1), len(seq2)
+    encoded_seq1, encoded_seq2 = encode_sequence(seq1), encode_sequence(seq2)
+    score_rows = _score_rows(encoded_seq1, encoded_seq2, match, mismatch)
+    gap_offsets = np.arange(m + 1, dtype=np.int64) * gap
+    packed_width = (m + 4) // 4
+
+    traceback = np.zeros((n + 1, packed_width), dtype=np.uint8)
+    codes = np.full(packed_width * 4, TRACE_LEFT, dtype=np.uint8)
+    traceback[0] = _pack_codes(codes)
+    last_column = np.empty(n + 1, dtype=np.int64)
+    last_column[0] = gap_offsets[m]
+
+    report = progress_reporter()
+    prev = gap_offsets.copy()
+    for i in range(1, n + 1):
+        prev, diagonal_scores, up_scores = _score_row(prev, score_rows[int(encoded_seq1[i - 1])], 0, gap, gap_offsets)
+        codes[1:m + 1] = _trace_codes(prev, diagonal_scores, up_scores)
+        traceback[i] = _pack_codes(codes)
+        last_column[i] = prev[m]
+        if report is not None and i % PROGRESS_ROWS == 0:
+            report(i / n)
+
+    end = int(np.argmax(last_column))
+    aligned_seq1, aligned_seq2 = _packed_traceback(seq1[:end], seq2, traceback, None, free_seq1_start=True)
+    start = end - (len(aligned_seq1) - aligned_seq1.count('-'))
+    return aligned_seq1, aligned_seq2, int(last_column[end]), start, end
+
+def seeded_alignment(reference, read, match=1, mismatch=-1, gap=-2, index=None):
+    """
+    Align a read against a long reference by seed-and-extend.
+
+    k-mer hits from the reference's KmerIndex select a window around the best
+    chain of seeds, and only that window is aligned with fitting_alignment.
+    Without any seed hit the whole reference is used. If no index is given,
+    the cached one from get_kmer_index is used.
+
+    Returns:
+        tuple: (aligned_reference, aligned_read, score, start, end), with
+        start and end in reference coordinates.
+    """
+    if index is None:
+        index = get_kmer_index(reference)
+    window_start, window_end = find_seed_window(index, read) or (0, len(reference))
+    aligned_reference, aligned_read, score, start, end = fitting_alignment(
+        reference[window_start:window_end], read, match, mismatch, gap)
+    return aligned_reference, aligned_read, score, window_start + start, window_start + end
+
+def local_alignment_score(seq1, seq2, match=1, mismatch=-1, gap=-2):
+    """
+    Smith–Waterman score of the best local alignment and the region it covers,
+    without a traceback.
+
+    Rows run over the shorter sequence and are computed with the vectorized
+    row kernel, floored at zero. Alongside each row, every cell carries the
+    cell its local path started from, so one pass over O(min(n, m)) rows of
+    O(max(n, m)) memory finds both ends of the best alignment.
+
+    Returns:
+        tuple: (score, start1, end1, start2, end2), where the alignment covers
+        seq1[start1:end1] and seq2[start2:end2]. All zero if no pair of
+        bases scores above zero.
+    """
+    transposed = len(seq1) < len(seq2)
+    rows, columns = (seq1, seq2) if transposed else (seq2, seq1)
+    n, m = len(rows), len(columns)
+    encoded_rows, encoded_columns = encode_sequence(rows), encode_sequence(columns)
+    score_rows = _score_rows(encoded_rows, encoded_columns, match, mismatch)
+    gap_offsets = np.arange(m + 1, dtype=np.int64) * gap
+    positions = np.arange(m + 1, dtype=np.int64)
+
+    # Origins are encoded as i * (m + 1) + j: the path starts after rows[:i], columns[:j].
+    report = progress_reporter()
+    prev = np.zeros(m + 1, dtype=np.int64)
+    prev_origin = positions.copy()
+    best, best_end, best_origin = 0, 0, 0
+    for i in range(1, n + 1):
+        diagonal_scores = prev[:-1] + score_rows[int(encoded_rows[i - 1])]
+        up_scores = prev[1:] + gap
+        cur = np.zeros(m + 1, dtype=np.int64)
+        np.maximum(diagonal_scores, up_scores, out=cur[1:])
+        np.maximum(cur, 0, out=cur)
+        # A cell scoring zero starts a new path; otherwise it continues the move it took.
+        origin = np.empty_like(prev_origin)
+        origin[0] = i * (m + 1)
+        origin[1:] = np.where(cur[1:] == 0, i * (m + 1) + positions[1:],
+                              np.where(cur[1:] == diagonal_scores, prev_origin[:-1], prev_origin[1:]))
+        # Running maximum as in _score_row, remembering which column each maximum came from.
+        cur -= gap_offsets
+        running = np.maximum.accumulate(cur)
+        source = np.maximum.accumulate(np.where(cur == running, positions, 0))
+        prev = running + gap_offsets
+        prev_origin = origin[source]
+
+        j = int(np.argmax(prev))
+        if prev[j] > best:
+            best, best_end, best_origin = int(prev[j]), i * (m + 1) + j, int(prev_origin[j])
+        if report is not None and i % PROGRESS_ROWS == 0:
+            report(i / n)
+
+    (start_row, start_column), (end_row, end_column) = divmod(best_origin, m + 1), divmod(best_end, m + 1)
+    if transposed:
+        return best, start_row, end_row, start_column, end_column
+    return best, start_column, end_column, start_row, end_row
+
+def local_alignment(seq1, seq2, match=1, mismatch=-1, gap=-2):
+    """
+    Smith–Waterman local alignment of the best-scoring pair of substrings.
+
+    local_alignment_score locates the region in linear memory; the traceback
+    is then the global alignment of just that region, which scores the same
+    (it cannot score higher, and the local path is one such alignment), so
+    memory grows with the aligned region rather than with len(seq1) * len(seq2).
+
+    Returns:
+        tuple: (aligned_seq1, aligned_seq2, score, start1, end1, start2, end2),
+        where the alignment covers seq1[start1:end1] and seq2[start2:end2].
+    """
+    score, start1, end1, start2, end2 = local_alignment_score(seq1, seq2, match, mismatch, gap)
+    window = _sequence_alignment(seq1[start1:end1], seq2[start2:end2], match, mismatch, gap, 'auto', None, None)
+    return window['aligned_sequence_1'], window['aligned_sequence_2'], score, start1, end1, start2, end2
+
+def _crossing_column(seq1, seq2, mid, match, mismatch, gap):
+    """
+    Find the column at which the full-matrix traceback passes through row `mid`.
+
+    Scores rows 1..mid keeping one row, then scores rows mid+1..n while
+    carrying, for every cell, the row-`mid` column its traceback path reaches.
+    Uses the same 'D' > 'U' > 'L' tie-breaking as full_matrix_alignment, so the
+    split lies on exactly the path the full-matrix traceback would take.
+    """
+    n, m = len(seq1), len(seq2)
+    encoded_seq1, encoded_seq2 = encode_sequence(seq1), encode_sequence(seq2)
+    score_rows = _score_rows(encoded_seq1, encoded_seq2, match, mismatch)
+    gap_offsets = np.arange(m + 1, dtype=np.int64) * gap
+    columns = np.arange(m + 1)
+
+    prev = gap_offsets.copy()
+    for i in range(1, mid + 1):
+        prev, _, _ = _score_row(prev, score_rows[int(encoded_seq1[i - 1])], i * gap, gap, gap_offsets)
+
+    crossing = columns.copy()
+    for i in range(mid + 1, n + 1):
+        prev, diagonal_scores, up_scores = _score_row(prev, score_rows[int(encoded_seq1[i - 1])], i * gap, gap, gap_offsets)
+        codes = _trace_codes(prev, diagonal_scores, up_scores)
+        source = np.empty_like(crossing)
+        source[0] = crossing[0]
+        source[1:] = np.where(codes == TRACE_DIAGONAL, crossing[:-1], crossing[1:])
+        # A left move inherits the crossing of its left neighbour: forward-fill.
+        filled = np.where(np.concatenate(([True], codes != TRACE_LEFT)), columns, 0)
+        np.maximum.accumulate(filled, out=filled)
+        crossing = source[filled]
+
+    return int(crossing[m])
+
+def hirschberg_alignment(seq1, seq2, match=1, mismatch=-1, gap=-2):
+    """
+    Linear-memory global alignment (Hirschberg divide and conquer).
+
+    Splits seq1 in half, locates where the optimal path crosses the middle row
+    using O(m) memory, and recurses on both halves. Sub-problems of at most
+    HIRSCHBERG_BLOCK cells are solved with full_matrix_alignment. Returns the
+    same alignment as full_matrix_alignment, including its tie-breaking.
+
+    Returns:
+        tuple: (aligned_seq1, aligned_seq2, score)
+    """
+    parts_1, parts_2 = [], []
+    score = 0
+    # Sub-problems are solved in order along seq1, so the rows of seq1 solved
+    # so far measure progress
+    report = progress_reporter()
+    rows_done = next_report = 0
+    stack = [(seq1, seq2)]
+    while stack:
+        sub_seq1, sub_seq2 = stack.pop()
+        n, m = len(sub_seq1), len(sub_seq2)
+        if n <= 1 or m <= 1 or (n + 1) * (m + 1) <= HIRSCHBERG_BLOCK:
+            aligned_seq1, aligned_seq2, sub_score = full_matrix_alignment(sub_seq1, sub_seq2, match, mismatch, gap)
+            parts_1.append(aligned_seq1)
+            parts_2.append(aligned_seq2)
+            score += sub_score
+            rows_done += n
+            if report is not None and rows_done >= next_report:
+                report(rows_done / len(seq1))
+                next_report = rows_done + PROGRESS_ROWS
+            continue
+        mid = n // 2
+        j = _crossing_column(sub_seq1, sub_seq2, mid, match, mismatch, gap)
+        stack.append((sub_seq1[mid:], sub_seq2[j:]))
+        stack.append((sub_seq1[:mid], sub_seq2[:j]))
+
+    return ''.join(parts_1), ''.join(parts_2), score
 
 GENETIC_CODE = {
     'TTT':'F', 'TTC':'F', 'TTA':'L', 'TTG':'L',
@@ -125,115 +995,216 @@ GENETIC_CODE = {
     'GGT':'G', 'GGC':'G', 'GGA':'G', 'GGG':'G'
 }
 
+CODON_TABLE = ''.join(GENETIC_CODE[first + second + third]
+                      for first in BASES for second in BASES for third in BASES) + 'X'
+START_CODON = 'ATG'
+STOP_CODONS = ('TAA', 'TAG', 'TGA')
+_CODON_TABLE_BYTES = np.frombuffer(CODON_TABLE.encode('ascii'), dtype=np.uint8)
+
+class _ComplementTable(dict):
+    def __missing__(self, key):
+        return 'N'
+
+_COMPLEMENT = _ComplementTable({ord(base): complement for base, complement in zip('ATCGatcgNn', 'TAGCtagcNn')})
+
+def codon_index(codon):
+    """
+    Index of a codon in CODON_TABLE and PackedSequence.codon_indices.
+    """
+    return sum(BASES.index(base) << (2 * (2 - k)) for k, base in enumerate(codon))
+
+_START_INDEX = codon_index(START_CODON)
+_STOP_INDICES = np.array([codon_index(codon) for codon in STOP_CODONS])
+
 def reverse_complement(seq):
     """
     Generate the reverse complement of a DNA sequence.
     
     Args:
-        seq (str): DNA sequence.
+        seq (str or PackedSequence): DNA sequence.
         
     Returns:
-        str: Reverse complement of the sequence.
+        str or PackedSequence: Reverse complement, of the same type as seq.
     """
-    complement = {'A':'T', 'T':'A', 'C':'G', 'G':'C',
-                  'a':'t', 't':'a', 'c':'g', 'g':'c',
-                  'N':'N', 'n':'n'}
-    return ''.join([complement.get(base, 'N') for base in reversed(seq)])
+    if isinstance(seq, PackedSequence):
+        return seq.reverse_complement()
+    return seq.translate(_COMPLEMENT)[::-1]
 
 def translate(seq):
     """
     Translate a DNA sequence into a protein sequence.
     
     Args:
-        seq (str): DNA sequence.
+        seq (str or PackedSequence): DNA sequence.
         
     Returns:
         str: Protein sequence.
     """
-    protein = []
-    for i in range(0, len(seq)-2, 3):
-        codon = seq[i:i+3].upper()
-        amino_acid = GENETIC_CODE.get(codon, 'X')
-        if amino_acid == '*':
-            protein.append('*')
-            break
-        protein.append(amino_acid)
-    return ''.join(protein)
+    protein = _CODON_TABLE_BYTES[as_packed(seq).codon_indices()]
+    stops = np.flatnonzero(protein == ord('*'))
+    if len(stops):
+        protein = protein[:stops[0] + 1]
+    return protein.tobytes().decode('ascii')
+
+def _strand_orfs(codes, strand, min_length, longest_only):
+    """
+    Coordinate arrays of one strand's ORFs, frame by frame (see iter_orfs).
+
+    Yields:
+        tuple: (frame, codons, columns), where codons are the frame's codon
+        indices and columns holds, per ORF that passes the filters, its start
+        and stop codon, start and end position, and whether it is closed.
+    """
+    seq_len = len(codes)
+    report = progress_reporter()
+    # Frames done out of the six scan_orfs covers
+    frames_before = 0 if strand == '+' else 3
+    for frame in range(3):
+        if report is not None:
+            report((frames_before + frame) / 6)
+        codons = codon_indices(codes, frame)
+        starts = np.flatnonzero(codons == _START_INDEX)
+        stops = np.flatnonzero(np.isin(codons, _STOP_INDICES))
+        next_stops = np.searchsorted(stops, starts)
+        if longest_only:
+            opens = np.ones(len(starts), dtype=bool)
+            opens[1:] = next_stops[1:] != next_stops[:-1]
+            starts, next_stops = starts[opens], next_stops[opens]
+
+        closed = next_stops < len(stops)
+        stop_codons = np.where(closed, stops[np.minimum(next_stops, len(stops) - 1)] if len(stops) else 0, len(codons))
+        start_positions = frame + 3 * starts
+        ends = np.where(closed, frame + 3 * stop_codons + 3, seq_len)
+        keep = ends - start_positions >= min_length
+        yield frame, codons, (starts[keep], stop_codons[keep], start_positions[keep], ends[keep], closed[keep])
+
+def _orf_records(seq, strand, frame, seq_len, codons, columns, include_sequences):
+    """
+    One record per ORF of columns, as yielded by _strand_orfs.
+    """
+    protein = _CODON_TABLE_BYTES[codons].tobytes().decode('ascii') if include_sequences else None
+    for start_codon, stop_codon, start_pos, end, is_closed in zip(*(column.tolist() for column in columns)):
+        orf_length = end - start_pos
+        if strand == '-' and is_closed:
+            orf_start = seq_len - end
+            orf_end = seq_len - start_pos
+        else:
+            orf_start = start_pos
+            orf_end = end
+        orf = {
+            'strand': strand,
+            'frame': frame +1,
+            'start': orf_start,
+            'end': orf_end,
+            'length': orf_length
+        }
+        if include_sequences:
+            orf['nucleotide_seq'] = as_string(seq[start_pos:end])
+            orf['protein_seq'] = protein[start_codon:stop_codon + 1]
+        yield orf
+
+def iter_orfs(seq, strand='+', codes=None, min_length=0, longest_only=True, include_sequences=True):
+    """
+    Yield the ORFs of one strand frame by frame, in order of position.
+
+    Each frame is translated in one table lookup over its codon indices. An
+    ORF opens at the first ATG after the previous ORF's stop and closes at the
+    next in-frame stop, so ORF starts are the first ATG in each group of ATGs
+    sharing a next stop, found with np.searchsorted. An ORF still open at the
+    end of the sequence is reported up to the last full codon. Filters are
+    applied to the coordinate arrays before any record is built.
+
+    Args:
+        seq (str or PackedSequence): DNA sequence. Only read when
+            include_sequences is set.
+        strand (str): '+' for forward strand, '-' for reverse complement.
+        codes (numpy.ndarray): Base codes of seq, if already computed.
+        min_length (int): Skip ORFs shorter than this many bases.
+        longest_only (bool): Report only the longest ORF per stop codon. If
+            False, every in-frame ATG before a stop starts its own ORF.
+        include_sequences (bool): Add 'nucleotide_seq' and 'protein_seq'.
+
+    Yields:
+        dict: ORF information, as returned by find_orfs.
+    """
+    if codes is None:
+        codes = as_packed(seq).codes()
+    for frame, codons, columns in _strand_orfs(codes, strand, min_length, longest_only):
+        yield from _orf_records(seq, strand, frame, len(codes), codons, columns, include_sequences)
 
 def find_orfs(seq, strand='+'):
     """
     Find ORFs in a DNA sequence for a given strand.
     
     Args:
-        seq (str): DNA sequence.
+        seq (str or PackedSequence): DNA sequence.
         strand (str): '+' for forward strand, '-' for reverse complement.
         
     Returns:
         list of dicts: Each dict contains ORF information.
     """
-    orfs = []
-    seq_len = len(seq)
-    for frame in range(3):
-        start_pos = None
-        for pos in range(frame, seq_len-2, 3):
-            codon = seq[pos:pos+3].upper()
-            if start_pos is None:
-                if codon == 'ATG':
-                    start_pos = pos
-            else:
-                if codon in ['TAA', 'TAG', 'TGA']:
-                    orf_length = pos + 3 - start_pos
-                    orf_seq = seq[start_pos:pos+3]
-                    protein_seq = translate(orf_seq)
-                    if strand == '-':
-                        orf_start = seq_len - (pos + 3)
-                        orf_end = seq_len - start_pos
-                    else:
-                        orf_start = start_pos
-                        orf_end = pos + 3
-                    orfs.append({
-                        'strand': strand,
-                        'frame': frame +1,
-                        'start': orf_start,
-                        'end': orf_end,
-                        'length': orf_length,
-                        'nucleotide_seq': orf_seq,
-                        'protein_seq': protein_seq
-                    })
-                    start_pos = None
-        if start_pos is not None:
-            orf_length = seq_len - start_pos
-            orf_seq = seq[start_pos:]
-            protein_seq = translate(orf_seq)
-            if strand == '-':
-                orf_start = seq_len - len(orf_seq)
-                orf_end = seq_len
-            else:
-                orf_start = start_pos
-                orf_end = seq_len
-            orfs.append({
-                'strand': strand,
-                'frame': frame +1,
-                'start': orf_start,
-                'end': orf_end,
-                'length': orf_length,
-                'nucleotide_seq': orf_seq,
-                'protein_seq': protein_seq
-            })
-    return orfs
+    return list(iter_orfs(seq, strand))
+
+def scan_orfs(dna_sequence, min_length=0, longest_only=True, include_sequences=True):
+    """
+    Lazily yield the ORFs of all six reading frames, forward strand first.
+
+    See iter_orfs for the options.
+    """
+    record_sizes(n=len(dna_sequence))
+    codes = as_packed(dna_sequence).codes()
+    yield from iter_orfs(dna_sequence, '+', codes, min_length, longest_only, include_sequences)
+    rev_comp_seq = reverse_complement(dna_sequence) if include_sequences else None
+    yield from iter_orfs(rev_comp_seq, '-', complement_codes(codes), min_length, longest_only, include_sequences)
+
+def orf_page(dna_sequence, offset, limit, min_length=0, longest_only=True, include_sequences=True):
+    """
+    One page of the ORFs scan_orfs yields, and how many it yields in all.
+
+    ORFs are counted from the coordinate arrays of each frame; records, and
+    their sequences, are built only for the ORFs in the page, and the reverse
+    complement only if the page reaches the reverse strand.
+
+    Args:
+        dna_sequence (str or PackedSequence): DNA sequence.
+        offset (int): ORFs to skip.
+        limit (int): Most ORFs to return, or None for all after offset.
+
+    Returns:
+        tuple: (count, page), the total number of ORFs and a list of dicts.
+        See iter_orfs for the other options.
+    """
+    record_sizes(n=len(dna_sequence))
+    codes = as_packed(dna_sequence).codes()
+    seq_len = len(codes)
+    stop = None if limit is None else offset + limit
+    count = 0
+    page = []
+    for strand, strand_codes in (('+', codes), ('-', complement_codes(codes))):
+        seq = None
+        for frame, codons, columns in _strand_orfs(strand_codes, strand, min_length, longest_only):
+            orfs = len(columns[0])
+            first = max(offset - count, 0)
+            last = orfs if stop is None else min(stop - count, orfs)
+            if first < last:
+                if include_sequences and seq is None:
+                    seq = dna_sequence if strand == '+' else reverse_complement(dna_sequence)
+                page.extend(_orf_records(seq, strand, frame, seq_len, codons,
+                                         [column[first:last] for column in columns], include_sequences))
+            count += orfs
+    return count, page
 
-def orf_detection(dna_sequence):
+def orf_detection(dna_sequence, min_length=0, longest_only=True, include_sequences=True):
     """
     Detect all ORFs in the given DNA sequence across all six reading frames.
     
     Args:
-        dna_sequence (str): DNA sequence.
+        dna_sequence (str or PackedSequence): DNA sequence.
+        min_length (int): Skip ORFs shorter than this many bases.
+        longest_only (bool): Report only the longest ORF per stop codon.
+        include_sequences (bool): Add nucleotide and protein sequences.
         
     Returns:
         list of dicts: All detected ORFs with their details.
     """
-    orfs = []
-    orfs += find_orfs(dna_sequence, strand='+')
-    rev_comp_seq = reverse_complement(dna_sequence)
-    orfs += find_orfs(rev_comp_seq, strand='-')
-    return orfs
\ No newline at end of file
+    return list(scan_orfs(dna_sequence, min_length, longest_only, include_sequences))
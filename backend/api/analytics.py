@@ -0,0 +1,154 @@
+import atexit
+import logging
+import queue
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import AnalysisResult, DailyAnalysisCount
+
+logger = logging.getLogger(__name__)
+
+def increment_daily_count(analysis_type, count=1, date=None):
+    """
+    Add recorded analyses to the daily rollup read by the chart views.
+
+    Args:
+        analysis_type (str): One of AnalysisResult.ANALYSIS_TYPES.
+        count (int): Number of analyses recorded.
+        date (date): Day to count them on; defaults to today in the current
+            time zone, matching TruncDate over created_at.
+    """
+    if date is None:
+        date = timezone.localdate()
+    rows = DailyAnalysisCount.objects.filter(date=date, analysis_type=analysis_type)
+    if rows.update(count=F('count') + count):
+        return
+    try:
+        with transaction.atomic():
+            DailyAnalysisCount.objects.create(date=date, analysis_type=analysis_type, count=count)
+    except IntegrityError:
+        # Another request created the row first.
+        rows.update(count=F('count') + count)
+
+def rebuild_daily_counts():
+    """
+    Recompute the whole rollup from AnalysisResult rows.
+
+    Returns:
+        int: Number of rollup rows written.
+    """
+    totals = (AnalysisResult.objects.annotate(date=TruncDate('created_at'))
+              .values('date', 'analysis_type').annotate(count=Count('id')).order_by())
+    with transaction.atomic():
+        DailyAnalysisCount.objects.all().delete()
+        rows = DailyAnalysisCount.objects.bulk_create(
+            DailyAnalysisCount(date=row['date'], analysis_type=row['analysis_type'], count=row['count'])
+            for row in totals)
+    return len(rows)
+
+class AnalyticsRecorder:
+    """
+    Buffers recorded analyses in memory and writes them in bulk from a
+    background thread, so requests never wait on the analytics tables.
+
+    Events are flushed when flush_size of them are queued or every
+    flush_interval seconds, and once more when the process exits. The queue
+    holds at most max_queue events; beyond that new events are dropped and
+    counted in dropped. Events lost to a failed write are counted in failed.
+    With buffered=False every event is written immediately.
+    """
+
+    def __init__(self, max_queue, flush_size, flush_interval, buffered=True):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.buffered = buffered
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def record(self, analysis_type, count=1):
+        event = (analysis_type, timezone.now(), count)
+        if not self.buffered:
+            self._write([event])
+            return
+        self._start()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.dropped += count
+            return
+        if self._queue.qsize() >= self.flush_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Write every queued event now.
+        """
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not events:
+            return
+        try:
+            self._write(events)
+        except Exception:
+            logger.exception('Dropping %d analytics events after a failed write', len(events))
+            with self._lock:
+                self.failed += sum(count for _, _, count in events)
+
+    def close(self):
+        """
+        Stop the background thread after a final flush.
+        """
+        self._closed.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None and not self._closed.is_set():
+                self._thread = threading.Thread(target=self._run, name='analytics-recorder', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def _write(self, events):
+        daily = Counter()
+        results = []
+        for analysis_type, created_at, count in events:
+            daily[timezone.localdate(created_at), analysis_type] += count
+            results.extend(AnalysisResult(analysis_type=analysis_type, created_at=created_at) for _ in range(count))
+        with transaction.atomic():
+            AnalysisResult.objects.bulk_create(results)
+            for (date, analysis_type), count in daily.items():
+                increment_daily_count(analysis_type, count, date=date)
+
+analytics_recorder = AnalyticsRecorder(settings.ANALYTICS_QUEUE_SIZE, settings.ANALYTICS_FLUSH_SIZE,
+                                       settings.ANALYTICS_FLUSH_INTERVAL, buffered=settings.ANALYTICS_BUFFERED)
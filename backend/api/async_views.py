@@ -0,0 +1,172 @@
+import json
+from functools import wraps
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .analytics import analytics_recorder
+from .executor import ExecutorBusy, analysis_executor
+from .instrumentation import phase, record_sizes
+from .jobs import wants_async
+from .result_cache import result_cache, result_key
+from .runners import run_distance_matrix, run_orf_detection, run_sequence_alignment, run_variant_alignment, run_variant_detection, variant_lines, worker_data
+from .serializers import VariantDetectionSerializer, SequenceAlignmentSerializer, DistanceMatrixSerializer, ORFDetectionSerializer
+from .views import VariantDetectionView, SequenceAlignmentView, DistanceMatrixView, ORFDetectionView, area_data, area_rows, daily_counts, distance_matrix_result, npy_response, radar_data, radar_rows
+
+# Views for serving under ASGI (settings.ASYNC_VIEWS). Analyses run on
+# api.executor.analysis_executor, so the event loop stays free for cheap
+# requests while they are in flight.
+
+# Lines of a streaming response produced per hop to a worker thread
+STREAM_BATCH_LINES = 256
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
+
+async def iterate_in_thread(lines, batch_size=STREAM_BATCH_LINES):
+    """
+    Drive a synchronous iterator of str or bytes lines on worker threads,
+    yielding them joined in batches, so producing a streaming response
+    neither blocks the event loop nor is buffered whole by Django.
+    """
+    lines = iter(lines)
+    take = sync_to_async(lambda: list(islice(lines, batch_size)), thread_sensitive=False)
+    while batch := await take():
+        yield (b'' if isinstance(batch[0], bytes) else '').join(batch)
+
+def streaming_view(view):
+    """
+    Wrap a synchronous view so its streaming content is produced by
+    iterate_in_thread rather than buffered.
+    """
+    sync_view = sync_to_async(view)
+
+    # wraps keeps view_class, which middleware inspects (see RequestDecompressionMiddleware).
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        response = await sync_view(request, *args, **kwargs)
+        if response.streaming and not response.is_async:
+            response.streaming_content = iterate_in_thread(response.streaming_content)
+        return response
+    return csrf_exempt(wrapper)
+
+async def health_check(request):
+    return JsonResponse({"status": "ok"})
+
+class AsyncRadarChartView(View):
+    async def get(self, request):
+        counts, errors = daily_counts(request)
+        if errors:
+            return json_response(errors, status=400)
+        return json_response(radar_data([row async for row in radar_rows(counts)]))
+
+class AsyncAreaChartView(View):
+    async def get(self, request):
+        counts, errors = daily_counts(request)
+        if errors:
+            return json_response(errors, status=400)
+        return json_response(area_data([row async for row in area_rows(counts)]))
+
+class AsyncAnalysisView(View):
+    """
+    Validate a JSON request, then serve its analysis from the result cache or
+    run it on the analysis executor.
+
+    Requests the synchronous view handles just as well are passed to it:
+    background jobs (?async=true), which return at once, and bodies that are
+    not JSON, which need DRF's parsers.
+    """
+
+    analysis_type = None
+    serializer_class = None
+    sync_view = None
+    # Function of the validated data, run on the executor (see api.runners)
+    run = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def post(self, request):
+        if wants_async(request) or request.content_type != 'application/json':
+            return await sync_to_async(self.sync_view.as_view())(request)
+
+        # Read the stream rather than request.body, which refuses bodies over
+        # DATA_UPLOAD_MAX_MEMORY_SIZE; sequence fields enforce their own limits.
+        try:
+            body = request.read()
+            data = json.loads(body) if body else {}
+        except ValueError as exc:
+            return json_response({'detail': f'JSON parse error - {exc}'}, status=400)
+
+        serializer = self.serializer_class(data=data)
+        with phase('validate'):
+            valid = await sync_to_async(serializer.is_valid)()
+        if not valid:
+            return json_response(serializer.errors, status=400)
+
+        try:
+            with phase('analysis'):
+                response = await self.analyze(serializer.validated_data)
+        except ExecutorBusy:
+            response = json_response({'detail': 'The server is busy with other analyses; retry shortly or submit with ?async=true.'}, status=503)
+            response['Retry-After'] = '1'
+            return response
+
+        await sync_to_async(analytics_recorder.record)(self.analysis_type)
+        return response
+
+    async def analyze(self, data):
+        key = await sync_to_async(result_key, thread_sensitive=False)(self.analysis_type, data)
+        result = await sync_to_async(result_cache.get)(key)
+        if result is None:
+            result = await analysis_executor.run(self.run, worker_data(data))
+            await sync_to_async(result_cache.put)(key, self.analysis_type, result)
+        return json_response(result)
+
+class AsyncVariantDetectionView(AsyncAnalysisView):
+    analysis_type = 'variant_detection'
+    serializer_class = VariantDetectionSerializer
+    sync_view = VariantDetectionView
+    run = staticmethod(run_variant_detection)
+
+    async def analyze(self, data):
+        output_format = data['output_format']
+        if output_format == 'json':
+            return await super().analyze(data)
+
+        alignment = await analysis_executor.run(run_variant_alignment, worker_data(data))
+        content_type = 'text/vcf' if output_format == 'vcf' else 'application/x-ndjson'
+        return StreamingHttpResponse(iterate_in_thread(variant_lines(data, alignment)), content_type=content_type)
+
+class AsyncSequenceAlignmentView(AsyncAnalysisView):
+    analysis_type = 'sequence_alignment'
+    serializer_class = SequenceAlignmentSerializer
+    sync_view = SequenceAlignmentView
+    run = staticmethod(run_sequence_alignment)
+
+class AsyncDistanceMatrixView(AsyncAnalysisView):
+    # Recorded as one alignment per matrix, as DistanceMatrixView does
+    analysis_type = 'sequence_alignment'
+    serializer_class = DistanceMatrixSerializer
+    sync_view = DistanceMatrixView
+    run = staticmethod(run_distance_matrix)
+
+    async def analyze(self, data):
+        n = len(data['sequences'])
+        record_sizes(sequences=n, pairs=n * (n - 1) // 2)
+        condensed = await analysis_executor.run(self.run, data)
+        if data['output_format'] == 'npy':
+            return npy_response(condensed)
+        return json_response(distance_matrix_result(condensed, data))
+
+class AsyncORFDetectionView(AsyncAnalysisView):
+    analysis_type = 'orf_detection'
+    serializer_class = ORFDetectionSerializer
+    sync_view = ORFDetectionView
+    run = staticmethod(run_orf_detection)
@@ -0,0 +1,47 @@
+import itertools
+
+from django.conf import settings
+
+from .analysis import variant_detection
+from .executor import batch_pool
+from .runners import worker_data
+from .sequences import as_packed
+
+def _detect(sample, data):
+    return variant_detection(data['reference_sequence'], sample, engine=data['engine'],
+                             band_width=data['band_width'], index=data.get('reference_index'))
+
+def batch_variant_detection(reference, samples, engine='auto', band_width=None, index=None, workers=None):
+    """
+    Run variant_detection for many samples against one reference.
+
+    The reference is packed once, and samples are dispatched across the shared
+    api.executor.batch_pool, each sent with the packed reference. The index
+    goes along only when it pickles cheaply (see worker_data); otherwise
+    workers use their own cached index.
+
+    Args:
+        reference (str or PackedSequence): The reference DNA sequence.
+        samples (list): Sample DNA sequences.
+        engine (str): Alignment engine passed to variant_detection.
+        band_width (int): Band half-width for the 'banded' engine.
+        index (KmerIndex): Prebuilt index of the reference for the 'seeded' engine.
+        workers (int): Samples run at once; defaults to settings.BATCH_WORKERS.
+            With one worker, or a single sample, the batch runs in-process.
+
+    Yields:
+        dict: One variant_detection result per sample, in input order, each as
+        soon as it and every sample before it have finished.
+    """
+    reference = as_packed(reference)
+    if workers is None:
+        workers = settings.BATCH_WORKERS
+    workers = min(workers, len(samples))
+
+    if workers <= 1:
+        for sample in samples:
+            yield variant_detection(reference, sample, engine=engine, band_width=band_width, index=index)
+        return
+
+    data = worker_data({'reference_sequence': reference, 'engine': engine, 'band_width': band_width, 'reference_index': index})
+    yield from batch_pool.map(_detect, samples, itertools.repeat(data), window=workers)
@@ -0,0 +1,158 @@
+import os
+import platform
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+from .analysis import (alignment_score, edit_distance, find_orfs, orf_detection, reverse_complement,
+                       sequence_alignment, translate, variant_detection)
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+DEFAULT_SEED = 42
+DEFAULT_THRESHOLD = 0.25
+MUTATION_RATE = 0.01
+SEEDED_READ_LENGTH = 1_000
+# Results of the default run, written with --output and compared against by default
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+
+def random_sequence(rng, length):
+    return ''.join(rng.choices('ACGT', k=length))
+
+def mutated_copy(rng, seq, rate=MUTATION_RATE):
+    """
+    Copy a sequence with substitutions, insertions and deletions at a total
+    per-base rate, as a sample read against a reference would differ.
+    """
+    pieces = []
+    for base in seq:
+        roll = rng.random()
+        if roll >= rate:
+            pieces.append(base)
+        elif roll < rate / 3:
+            pieces.append(rng.choice('ACGT'.replace(base, '')))
+        elif roll < 2 * rate / 3:
+            pieces.append(base + rng.choice('ACGT'))
+    return ''.join(pieces)
+
+class Inputs:
+    """
+    Seeded inputs of one size: a random reference, a mutated copy of it, and
+    a mutated read from its middle.
+    """
+
+    def __init__(self, size, seed=DEFAULT_SEED):
+        rng = random.Random(f'{seed}:{size}')
+        self.reference = random_sequence(rng, size)
+        self.sample = mutated_copy(rng, self.reference)
+        start = max(0, (size - SEEDED_READ_LENGTH) // 2)
+        self.read = mutated_copy(rng, self.reference[start:start + SEEDED_READ_LENGTH])
+
+def _alignment(engine):
+    return lambda inputs: sequence_alignment(inputs.reference, inputs.sample, engine=engine)
+
+# name -> (function of Inputs, largest size it is run at, or None for all)
+CASES = {
+    'sequence_alignment[full]': (_alignment('full'), 1_000),
+    'sequence_alignment[numpy]': (_alignment('numpy'), 10_000),
+    'sequence_alignment[linear]': (_alignment('linear'), 10_000),
+    'sequence_alignment[banded]': (_alignment('banded'), None),
+    'sequence_alignment[seeded]': (lambda inputs: sequence_alignment(inputs.reference, inputs.read, engine='seeded'), None),
+    'sequence_alignment[local]': (lambda inputs: sequence_alignment(inputs.reference, inputs.read, engine='local'), None),
+    'alignment_score': (lambda inputs: alignment_score(inputs.reference, inputs.sample), 10_000),
+    'edit_distance': (lambda inputs: edit_distance(inputs.reference, inputs.sample), 10_000),
+    'variant_detection': (lambda inputs: variant_detection(inputs.reference, inputs.sample), None),
+    'reverse_complement': (lambda inputs: reverse_complement(inputs.reference), None),
+    'translate': (lambda inputs: translate(inputs.reference), None),
+    'find_orfs': (lambda inputs: find_orfs(inputs.reference), None),
+    'orf_detection': (lambda inputs: orf_detection(inputs.reference), None)
+}
+
+def measure(function, repeat):
+    """
+    Time a call and record its peak traced memory.
+
+    Returns:
+        tuple: (best wall time of repeat untraced calls in seconds, peak bytes
+        allocated during one extra call under tracemalloc)
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def run_benchmarks(sizes=DEFAULT_SIZES, names=None, repeat=3, seed=DEFAULT_SEED, progress=None):
+    """
+    Run every case at every size it supports.
+
+    Args:
+        sizes (iterable): Reference lengths.
+        names (iterable): Case names to run; defaults to all of CASES.
+        repeat (int): Timed calls per measurement.
+        seed (int): Seed for the generated inputs.
+        progress (callable): Called with each result as it is measured.
+
+    Returns:
+        dict: 'meta' describing the run and 'results', one entry per case and
+        size with 'name', 'size', 'seconds' and 'peak_bytes'.
+    """
+    names = list(CASES) if names is None else list(names)
+    results = []
+    for size in sizes:
+        inputs = Inputs(size, seed)
+        for name in names:
+            function, max_size = CASES[name]
+            if max_size is not None and size > max_size:
+                continue
+            seconds, peak = measure(lambda: function(inputs), repeat)
+            result = {'name': name, 'size': size, 'seconds': seconds, 'peak_bytes': peak}
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    return {
+        'meta': {
+            'seed': seed,
+            'repeat': repeat,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine()
+        },
+        'results': results
+    }
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Find measurements that got slower, or used more memory, than the
+    baseline by more than threshold (a fraction).
+
+    Returns:
+        list: One dict per regression with 'name', 'size', 'metric',
+        'baseline', 'current' and 'ratio'.
+    """
+    previous = {(result['name'], result['size']): result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        before = previous.get((result['name'], result['size']))
+        if before is None:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            if before[metric] and result[metric] > before[metric] * (1 + threshold):
+                regressions.append({
+                    'name': result['name'],
+                    'size': result['size'],
+                    'metric': metric,
+                    'baseline': before[metric],
+                    'current': result[metric],
+                    'ratio': result[metric] / before[metric]
+                })
+    return regressions
@@ -0,0 +1,182 @@
+import numpy as np
+from django.conf import settings
+
+from .analysis import alignment_scores, edit_distance
+from .executor import batch_pool
+from .sequences import as_packed, as_string
+
+DISTANCE_METRICS = ('edit_distance', 'alignment_score')
+# Reported for pairs whose edit distance exceeds the cutoff
+BEYOND_CUTOFF = -1
+# Rows and columns of the matrix per unit of work sent to the pool
+TILE_SIZE = 32
+# q-gram length of the profiles that bound edit distances from below
+QGRAM_SIZE = 4
+
+def condensed_index(n, i, j):
+    """
+    Position of pair (i, j), i < j, in a condensed matrix of n sequences: the
+    upper triangle read row by row, as in scipy.spatial.distance.squareform.
+    """
+    return n * i - i * (i + 1) // 2 + j - i - 1
+
+def matrix_tiles(n, tile_size=TILE_SIZE):
+    """
+    Split the upper triangle of an n x n matrix into square tiles.
+
+    Returns:
+        list: (row_start, row_stop, column_start, column_stop) per tile; a
+        tile on the diagonal covers only its pairs above the diagonal.
+    """
+    starts = range(0, n, tile_size)
+    return [(row, min(row + tile_size, n), column, min(column + tile_size, n))
+            for row in starts for column in starts if column >= row]
+
+def qgram_profiles(sequences, q=QGRAM_SIZE):
+    """
+    Count every q-gram of each sequence; q-grams containing N share one bin.
+
+    Returns:
+        np.ndarray: int32 array of shape (len(sequences), 4 ** q + 1).
+    """
+    bins = 4 ** q
+    profiles = np.zeros((len(sequences), bins + 1), dtype=np.int32)
+    for row, sequence in zip(profiles, sequences):
+        codes = as_packed(sequence).codes()
+        count = len(codes) - q + 1
+        if count <= 0:
+            continue
+        grams = np.zeros(count, dtype=np.int64)
+        unknown = np.zeros(count, dtype=bool)
+        for offset in range(q):
+            window = codes[offset:offset + count]
+            unknown |= window > 3
+            grams = grams * 4 + (window & 3)
+        grams[unknown] = bins
+        row += np.bincount(grams, minlength=bins + 1).astype(np.int32)
+    return profiles
+
+def edit_distance_lower_bounds(rows, columns, q=QGRAM_SIZE):
+    """
+    Lower bounds on the edit distance of every pair between two blocks of
+    sequences, from their lengths and q-gram profiles.
+
+    One edit adds or removes at most q q-grams on each side, so d edits
+    change the profiles by at most 2qd in L1 norm (the q-gram lemma).
+
+    Args:
+        rows (tuple): (lengths, profiles) of the first block.
+        columns (tuple): (lengths, profiles) of the second block.
+
+    Returns:
+        np.ndarray: Bounds of shape (len(rows[0]), len(columns[0])).
+    """
+    (row_lengths, row_profiles), (column_lengths, column_profiles) = rows, columns
+    length_bound = np.abs(row_lengths[:, None] - column_lengths[None, :])
+    profile_distance = np.abs(row_profiles[:, None, :] - column_profiles[None, :, :]).sum(axis=2)
+    return np.maximum(length_bound, -(-profile_distance // (2 * q)))
+
+def _matrix_state(sequences, metric, cutoff):
+    """
+    What _tile_inputs slices for the tiles of one matrix.
+    """
+    state = {'metric': metric, 'cutoff': cutoff}
+    if metric == 'edit_distance':
+        strings = [as_string(sequence) for sequence in sequences]
+        state.update(sequences=strings,
+                     lengths=np.array([len(sequence) for sequence in strings], dtype=np.int64),
+                     profiles=qgram_profiles(sequences) if cutoff is not None else None)
+    else:
+        state.update(sequences=list(sequences))
+    return state
+
+def _tile_inputs(state, tile):
+    """
+    The part of a matrix's state one tile reads: its rows' and columns'
+    sequences (and lengths and q-gram profiles), so a pool worker is sent
+    2 * tile_size sequences per tile rather than the whole matrix.
+    """
+    row_start, row_stop, column_start, column_stop = tile
+    inputs = {'metric': state['metric'], 'cutoff': state['cutoff']}
+    for key in ('sequences', 'lengths', 'profiles'):
+        if state.get(key) is not None:
+            inputs['row_' + key] = state[key][row_start:row_stop]
+            inputs['column_' + key] = state[key][column_start:column_stop]
+    return inputs
+
+def _tile_values(tile, inputs):
+    """
+    Values of one tile's pairs, row by row, in condensed order.
+    """
+    row_start, row_stop, column_start, column_stop = tile
+    rows, columns, cutoff = inputs['row_sequences'], inputs['column_sequences'], inputs['cutoff']
+    values = []
+    if inputs['metric'] == 'alignment_score':
+        for i in range(row_start, row_stop):
+            values.extend(alignment_scores(rows[i - row_start], columns[max(i + 1, column_start) - column_start:]).tolist())
+        return values
+
+    bounds = None
+    if cutoff is not None:
+        bounds = edit_distance_lower_bounds((inputs['row_lengths'], inputs['row_profiles']),
+                                            (inputs['column_lengths'], inputs['column_profiles']))
+    for i in range(row_start, row_stop):
+        for j in range(max(i + 1, column_start), column_stop):
+            if bounds is not None and bounds[i - row_start, j - column_start] > cutoff:
+                values.append(BEYOND_CUTOFF)
+                continue
+            distance = edit_distance(rows[i - row_start], columns[j - column_start], max_distance=cutoff)
+            values.append(BEYOND_CUTOFF if distance is None else distance)
+    return values
+
+def distance_matrix(sequences, metric='edit_distance', cutoff=None, workers=None, tile_size=TILE_SIZE):
+    """
+    Score every pair of sequences, without tracebacks.
+
+    The upper triangle is cut into tiles that are spread across the shared
+    api.executor.batch_pool, each sent with the sequences of its own rows and
+    columns.
+    With a cutoff, pairs whose q-gram lower bound already exceeds it are
+    skipped, and the rest stop scanning once their distance does.
+
+    Args:
+        sequences (list): DNA sequences (str or PackedSequence).
+        metric (str): 'edit_distance', or 'alignment_score' for the
+            Needleman–Wunsch score with the default scoring.
+        cutoff (int): Largest edit distance of interest; pairs beyond it are
+            reported as BEYOND_CUTOFF. Only for 'edit_distance'.
+        workers (int): Tiles computed at once; defaults to settings.BATCH_WORKERS.
+            With one worker, or a single tile, the matrix is computed in-process.
+        tile_size (int): Rows and columns per tile.
+
+    Returns:
+        np.ndarray: The condensed matrix (see condensed_index), int32 unless
+        scores could overflow it.
+    """
+    if cutoff is not None and metric != 'edit_distance':
+        raise ValueError('cutoff applies only to the edit_distance metric')
+    n = len(sequences)
+    tiles = matrix_tiles(n, tile_size)
+    if workers is None:
+        workers = settings.BATCH_WORKERS
+    workers = min(workers, len(tiles))
+
+    state = _matrix_state(sequences, metric, cutoff)
+    tile_inputs = (_tile_inputs(state, tile) for tile in tiles)
+    if workers <= 1:
+        tile_values = list(map(_tile_values, tiles, tile_inputs))
+    else:
+        tile_values = list(batch_pool.map(_tile_values, tiles, tile_inputs, window=workers))
+
+    longest = max((len(sequence) for sequence in sequences), default=0)
+    dtype = np.int32 if 4 * longest < np.iinfo(np.int32).max else np.int64
+    condensed = np.empty(n * (n - 1) // 2, dtype=dtype)
+    for (row_start, row_stop, column_start, column_stop), values in zip(tiles, tile_values):
+        position = 0
+        for i in range(row_start, row_stop):
+            first = max(i + 1, column_start)
+            count = max(0, column_stop - first)
+            start = condensed_index(n, i, first) if count else 0
+            condensed[start:start + count] = values[position:position + count]
+            position += count
+    return condensed
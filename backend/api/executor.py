@@ -0,0 +1,129 @@
+import asyncio
+import collections
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from .instrumentation import call_recording_sizes, record_sizes
+
+class ExecutorBusy(Exception):
+    """
+    Raised when an AnalysisExecutor already has its maximum of calls pending.
+    """
+
+class WorkerPool:
+    """
+    Long-lived process pool shared by every request of a server process.
+
+    Workers are started with the forkserver method, so they never inherit the
+    server's threads or database connections. The pool is created on first
+    use and replaced if a worker dies.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context('forkserver')
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            return self._executor
+
+    def _reset(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def map(self, function, *iterables, window):
+        """
+        Lazily yield function(*args) for each args of zip(*iterables), in order,
+        with at most window calls submitted at a time. Calls not yet started
+        are cancelled if the caller stops early.
+
+        Args:
+            function (callable): A module-level function.
+            window (int): Calls submitted ahead of the one being waited on.
+        """
+        executor = self._get_executor()
+        pending = collections.deque()
+        arguments = zip(*iterables)
+        try:
+            for args in itertools.islice(arguments, window):
+                pending.append(executor.submit(function, *args))
+            while pending:
+                try:
+                    result = pending.popleft().result()
+                except BrokenProcessPool:
+                    self._reset(executor)
+                    raise
+                for args in itertools.islice(arguments, 1):
+                    pending.append(executor.submit(function, *args))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+class AnalysisExecutor(WorkerPool):
+    """
+    Bounded process pool for running CPU-bound analyses from async views.
+
+    At most max_workers analyses run at once, and at most max_pending are
+    accepted (running or waiting for a worker); calls beyond that raise
+    ExecutorBusy instead of queueing without limit.
+    """
+
+    def __init__(self, max_workers, max_pending):
+        super().__init__(max_workers)
+        self.max_pending = max_pending
+        self.pending = 0
+
+    async def run(self, function, data):
+        """
+        Run function(data) in a worker process.
+
+        Args:
+            function (callable): A module-level function (see api.runners).
+            data (dict): Its picklable argument.
+
+        Returns:
+            The function's result.
+
+        Raises:
+            ExecutorBusy: If max_pending calls are already pending.
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise ExecutorBusy()
+            self.pending += 1
+        try:
+            executor = self._get_executor()
+            try:
+                result, sizes = await asyncio.get_running_loop().run_in_executor(executor, call_recording_sizes, function, data)
+            except BrokenProcessPool:
+                self._reset(executor)
+                raise
+        finally:
+            with self._lock:
+                self.pending -= 1
+        record_sizes(**sizes)
+        return result
+
+analysis_executor = AnalysisExecutor(settings.ANALYSIS_WORKERS, settings.ANALYSIS_MAX_PENDING)
+
+# Runs the tiles of distance matrices and the samples of batch variant
+# detection for synchronous requests
+batch_pool = WorkerPool(settings.BATCH_WORKERS)
@@ -0,0 +1,177 @@
+import json
+
+import numpy as np
+
+from .analysis import START_CODON, STOP_CODONS, codon_index, reverse_complement
+from .sequences import BASE_CODES, codon_indices
+
+CHUNK_SIZE = 1024 * 1024
+
+_WHITESPACE = b' \t\r\n'
+
+_PLUS_START, _PLUS_STOP, _MINUS_START, _MINUS_STOP = 1, 2, 3, 4
+_CODON_EVENTS = np.zeros(65, dtype=np.uint8)
+_CODON_EVENTS[codon_index(START_CODON)] = _PLUS_START
+_CODON_EVENTS[[codon_index(codon) for codon in STOP_CODONS]] = _PLUS_STOP
+_CODON_EVENTS[codon_index(reverse_complement(START_CODON))] = _MINUS_START
+_CODON_EVENTS[[codon_index(reverse_complement(codon)) for codon in STOP_CODONS]] = _MINUS_STOP
+
+class StreamingORFScanner:
+    """
+    Six-frame ORF scan over a sequence fed in chunks of any size.
+
+    Both strands are scanned in forward order, one state per codon phase, so
+    only the last two bases of the previous chunk are kept. On the reverse
+    strand an ORF is the span from an in-frame reverse stop (TTA, CTA, TCA) to
+    the rightmost CAT before the next one, which is the ORF orf_detection
+    finds reading the reverse complement. Reverse frame numbers depend on the
+    total length and are assigned in finish().
+
+    Produces the same records as orf_detection(..., include_sequences=False).
+    """
+
+    def __init__(self, min_length=0, longest_only=True):
+        self.min_length = min_length
+        self.longest_only = longest_only
+        self.length = 0
+        self._tail = np.empty(0, dtype=np.uint8)
+        self._next_codon = [0, 1, 2]
+        self._open_starts = [[], [], []]
+        self._last_minus_stop = [None, None, None]
+        self._minus_starts = [[], [], []]
+        self._plus = []
+        self._minus = []
+
+    def feed(self, codes):
+        """
+        Scan the next base codes (0-3 for A, C, G, T; 4 for N).
+        """
+        buffer = np.concatenate((self._tail, codes))
+        buffer_start = self.length - len(self._tail)
+        self.length += len(codes)
+
+        for phase in range(3):
+            first = self._next_codon[phase]
+            events = _CODON_EVENTS[codon_indices(buffer, first - buffer_start)]
+            self._next_codon[phase] = first + 3 * len(events)
+            hits = np.flatnonzero(events)
+            for codon_number, event in zip(hits.tolist(), events[hits].tolist()):
+                self._event(phase, first + 3 * codon_number, event)
+
+        self._tail = buffer[min(self._next_codon) - buffer_start:]
+
+    def _event(self, phase, pos, event):
+        if event == _PLUS_START:
+            if not self.longest_only or not self._open_starts[phase]:
+                self._open_starts[phase].append(pos)
+        elif event == _PLUS_STOP:
+            for start in self._open_starts[phase]:
+                self._plus.append((phase, start, pos + 3))
+            self._open_starts[phase] = []
+        elif event == _MINUS_START:
+            if self.longest_only:
+                self._minus_starts[phase] = [pos]
+            else:
+                self._minus_starts[phase].append(pos)
+        else:
+            self._close_minus(phase)
+            self._last_minus_stop[phase] = pos
+
+    def _close_minus(self, phase):
+        stop = self._last_minus_stop[phase]
+        for start in self._minus_starts[phase]:
+            self._minus.append((phase, stop, start + 3))
+        self._minus_starts[phase] = []
+
+    def finish(self):
+        """
+        Close the sequence and return its ORFs in orf_detection order.
+        """
+        seq_len = self.length
+        for phase in range(3):
+            for start in self._open_starts[phase]:
+                self._plus.append((phase, start, seq_len))
+            self._close_minus(phase)
+
+        orfs = []
+        for phase, start, end in sorted(self._plus):
+            if end - start >= self.min_length:
+                orfs.append({'strand': '+', 'frame': phase + 1, 'start': start, 'end': end, 'length': end - start})
+        minus = sorted(((seq_len - phase) % 3, -end, stop, end) for phase, stop, end in self._minus)
+        for frame, _, stop, end in minus:
+            if stop is None:
+                orf_start, orf_end, orf_length = seq_len - end, seq_len, end
+            else:
+                orf_start, orf_end, orf_length = stop, end, end - stop
+            if orf_length >= self.min_length:
+                orfs.append({'strand': '-', 'frame': frame + 1, 'start': orf_start, 'end': orf_end, 'length': orf_length})
+        return orfs
+
+def fasta_orfs(chunks, min_length=0, longest_only=True):
+    """
+    Parse FASTA or multi-FASTA bytes incrementally and scan each record.
+
+    Header lines may be split across chunks; sequence lines are fed to a
+    StreamingORFScanner as they arrive, with whitespace removed and any
+    non-ACGT character read as N. Sequence before the first header forms a
+    record with an empty id.
+
+    Args:
+        chunks (iterable of bytes): The upload, in chunks of any size.
+        min_length (int): Skip ORFs shorter than this many bases.
+        longest_only (bool): Report only the longest ORF per stop codon.
+
+    Yields:
+        dict: One record with 'id', 'length' and 'orfs' per FASTA entry.
+    """
+    record_id, scanner = None, None
+    header = None
+    at_line_start = True
+
+    def finish():
+        return {'id': record_id, 'length': scanner.length, 'orfs': scanner.finish()}
+
+    for chunk in chunks:
+        pos = 0
+        while pos < len(chunk):
+            if header is not None:
+                newline = chunk.find(b'\n', pos)
+                header += chunk[pos:] if newline == -1 else chunk[pos:newline]
+                if newline == -1:
+                    break
+                if scanner is not None:
+                    yield finish()
+                fields = header.decode('utf-8', 'replace').split()
+                record_id = fields[0] if fields else ''
+                scanner = StreamingORFScanner(min_length, longest_only)
+                header = None
+                at_line_start = True
+                pos = newline + 1
+            elif at_line_start and chunk[pos] == ord('>'):
+                header = bytearray()
+                pos += 1
+            else:
+                newline = chunk.find(b'\n', pos)
+                end = len(chunk) if newline == -1 else newline
+                bases = chunk[pos:end].translate(None, _WHITESPACE)
+                if bases:
+                    if scanner is None:
+                        record_id, scanner = '', StreamingORFScanner(min_length, longest_only)
+                    scanner.feed(BASE_CODES[np.frombuffer(bases, dtype=np.uint8)])
+                at_line_start = newline != -1
+                pos = end + 1
+
+    if header is not None:
+        if scanner is not None:
+            yield finish()
+        fields = header.decode('utf-8', 'replace').split()
+        record_id, scanner = (fields[0] if fields else ''), StreamingORFScanner(min_length, longest_only)
+    if scanner is not None:
+        yield finish()
+
+def ndjson_lines(records):
+    """
+    Serialize records as newline-delimited JSON, one line per record.
+    """
+    for record in records:
+        yield json.dumps(record, separators=(',', ':')) + '\n'
@@ -0,0 +1,192 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+class RequestTimings:
+    """
+    Phase durations and input sizes collected while serving one request.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.sizes = {}
+        self.peak_bytes = None
+        self.active = set()
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+_current = ContextVar('request_timings', default=None)
+
+def start_request():
+    """
+    Begin collecting for the current request.
+
+    Returns:
+        tuple: (RequestTimings, token for end_request)
+    """
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+def end_request(token):
+    _current.reset(token)
+
+def current_timings():
+    return _current.get()
+
+@contextmanager
+def phase(name):
+    """
+    Time a block as a named phase of the current request. Outside a request
+    (tests, workers, management commands), or nested in a phase of the same
+    name, this does nothing.
+    """
+    timings = _current.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+        timings.active.discard(name)
+
+def record_sizes(**sizes):
+    """
+    Attach input sizes, such as sequence lengths and DP cells, to the current
+    request.
+    """
+    timings = _current.get()
+    if timings is not None:
+        timings.sizes.update(sizes)
+
+def call_recording_sizes(function, *args):
+    """
+    Call a function outside the serving process, such as in a worker, and
+    return its result with the sizes it recorded, for record_sizes there.
+
+    Returns:
+        tuple: (result, dict of sizes)
+    """
+    timings, token = start_request()
+    try:
+        return function(*args), timings.sizes
+    finally:
+        end_request(token)
+
+# DP rows between progress reports from row-driven engines
+PROGRESS_ROWS = 1024
+
+_progress = ContextVar('progress_reporter', default=None)
+
+@contextmanager
+def reporting_progress(report):
+    """
+    Pass the progress of analyses run in this block to report(fraction).
+    """
+    token = _progress.set(report)
+    try:
+        yield
+    finally:
+        _progress.reset(token)
+
+def progress_reporter():
+    """
+    The function set by reporting_progress, or None. Long-running engines call
+    it with the fraction of their work done, every PROGRESS_ROWS rows or so;
+    an analysis made of several passes may report a lower fraction when the
+    next pass starts.
+    """
+    return _progress.get()
+
+# Seconds; from sub-millisecond validation up to minute-long alignments
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+CELL_BUCKETS = tuple(10 ** exponent for exponent in range(2, 13))
+
+def _format_labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels)
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """
+    Thread-safe Prometheus histogram, one series per label combination.
+    """
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+            series = [(key, list(counts), count, total) for key, (counts, count, total) in series]
+        for key, counts, count, total in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(key + (('le', _format_value(bound)),))
+                lines.append(f'{self.name}_bucket{{{labels}}} {cumulative}')
+            labels = _format_labels(key + (('le', '+Inf'),))
+            lines.append(f'{self.name}_bucket{{{labels}}} {count}')
+            suffix = f'{{{_format_labels(key)}}}' if key else ''
+            lines.append(f'{self.name}_sum{suffix} {_format_value(total)}')
+            lines.append(f'{self.name}_count{suffix} {count}')
+        return lines
+
+request_duration = Histogram('http_request_duration_seconds', 'Request latency by route.', DURATION_BUCKETS)
+phase_duration = Histogram('analysis_phase_duration_seconds', 'Time spent in each request phase.', DURATION_BUCKETS)
+dp_cells = Histogram('analysis_dp_cells', 'Dynamic-programming cells per alignment request.', CELL_BUCKETS)
+
+def observe_request(route, method, status, seconds, timings):
+    request_duration.observe(seconds, route=route, method=method, status=status)
+    for name, phase_seconds in timings.phases.items():
+        phase_duration.observe(phase_seconds, route=route, phase=name)
+    if 'cells' in timings.sizes:
+        dp_cells.observe(timings.sizes['cells'], route=route)
+
+def server_timing(timings, total_seconds):
+    """
+    Format a request's phases as a Server-Timing header value.
+    """
+    entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.phases.items()]
+    if timings.sizes:
+        sizes = ' '.join(f'{name}={value}' for name, value in timings.sizes.items())
+        entries.append(f'sizes;desc="{sizes}"')
+    if timings.peak_bytes is not None:
+        entries.append(f'memory;desc="peak {timings.peak_bytes} bytes"')
+    entries.append(f'total;dur={total_seconds * 1000:.2f}')
+    return ', '.join(entries)
+
+def render_metrics(gauges=()):
+    """
+    Prometheus text exposition of the histograms plus (name, documentation,
+    type, value) gauges and counters.
+    """
+    lines = []
+    for histogram in (request_duration, phase_duration, dp_cells):
+        lines.extend(histogram.render())
+    for name, documentation, metric_type, value in gauges:
+        lines += [f'# HELP {name} {documentation}', f'# TYPE {name} {metric_type}', f'{name} {_format_value(value)}']
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,188 @@
+import datetime
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+from .runners import run_orf_detection, run_sequence_alignment, run_variant_detection, send_result, worker_data
+from .serializers import VariantDetectionSerializer, SequenceAlignmentSerializer, ORFDetectionSerializer
+
+# How often a running job checks whether it has been cancelled, in seconds
+JOB_POLL_INTERVAL = 0.5
+# How often a running job records that its supervisor is alive, and how long
+# without a heartbeat before the job is taken to have lost it, in seconds
+JOB_HEARTBEAT_INTERVAL = 10
+JOB_STALE_AFTER = 60
+
+# analysis_type -> (request serializer, function of its validated data)
+ANALYSES = {
+    'variant_detection': (VariantDetectionSerializer, run_variant_detection),
+    'sequence_alignment': (SequenceAlignmentSerializer, run_sequence_alignment),
+    'orf_detection': (ORFDetectionSerializer, run_orf_detection)
+}
+
+def wants_async(request):
+    """
+    Whether a request asked to run as a background job (?async=true).
+    """
+    return request.GET.get('async', '').lower() in ('1', 'true')
+
+def job_summary(job):
+    summary = {
+        'job_id': str(job.id),
+        'analysis_type': job.analysis_type,
+        'status': job.status,
+        'progress': job.progress,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at
+    }
+    if job.status == 'succeeded':
+        summary['result'] = job.result
+    elif job.status == 'failed':
+        summary['error'] = job.error
+    return summary
+
+def _finish(job_id, status, **fields):
+    # Conditional on 'running' so that a cancellation recorded meanwhile wins.
+    Job.objects.filter(id=job_id, status='running').update(
+        status=status, progress=1.0, finished_at=timezone.now(), **fields)
+
+def run_job(job_id):
+    """
+    Claim a queued job and run it to completion in a child process.
+
+    The job's request parameters are validated again here, so a reference_id
+    resolves to this process's cached reference. The analysis itself runs in
+    a separate process that is terminated if the job is cancelled, and whose
+    progress messages update the job's progress.
+
+    Returns:
+        bool: False if the job was no longer queued (cancelled or claimed
+        elsewhere).
+    """
+    now = timezone.now()
+    if not Job.objects.filter(id=job_id, status='queued').update(status='running', started_at=now, heartbeat_at=now):
+        return False
+    job = Job.objects.get(id=job_id)
+
+    serializer_class, function = ANALYSES[job.analysis_type]
+    serializer = serializer_class(data=job.params)
+    if not serializer.is_valid():
+        _finish(job_id, 'failed', error=str(serializer.errors))
+        return True
+
+    # forkserver, as in api.executor: forking this threaded process can deadlock the child.
+    context = multiprocessing.get_context('forkserver')
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=send_result, daemon=True,
+                              args=(child_conn, function, worker_data(serializer.validated_data)))
+    process.start()
+    child_conn.close()
+    last_heartbeat = time.monotonic()
+    status = 'running'
+    try:
+        while status == 'running':
+            if parent_conn.poll(JOB_POLL_INTERVAL):
+                try:
+                    status, payload = parent_conn.recv()
+                except EOFError:
+                    status, payload = 'failed', f'Analysis process exited with code {process.exitcode}'
+                if status == 'progress':
+                    # A multi-pass engine may start over at a lower fraction
+                    Job.objects.filter(id=job_id, status='running', progress__lt=payload).update(progress=payload)
+                    status = 'running'
+                else:
+                    break
+            # Cancelled, or given up on by fail_stale_jobs
+            if not Job.objects.filter(id=job_id, status='running').exists():
+                process.terminate()
+                return True
+            if time.monotonic() - last_heartbeat >= JOB_HEARTBEAT_INTERVAL:
+                Job.objects.filter(id=job_id, status='running').update(heartbeat_at=timezone.now())
+                last_heartbeat = time.monotonic()
+    finally:
+        process.join()
+        parent_conn.close()
+
+    if status == 'succeeded':
+        _finish(job_id, status, result=payload)
+    else:
+        _finish(job_id, status, error=payload)
+    return True
+
+def cancel_job(job_id):
+    """
+    Cancel a queued or running job.
+
+    Returns:
+        bool: False if the job had already finished.
+    """
+    return bool(Job.objects.filter(id=job_id, status__in=('queued', 'running')).update(
+        status='cancelled', finished_at=timezone.now()))
+
+def fail_stale_jobs():
+    """
+    Mark running jobs failed once their supervising thread has missed
+    heartbeats for JOB_STALE_AFTER seconds, as when its server process was
+    killed by a timeout, recycled or redeployed mid-run. They are not retried,
+    since the analysis itself may be what brought the process down.
+
+    Returns:
+        int: The number of jobs marked failed.
+    """
+    now = timezone.now()
+    cutoff = now - datetime.timedelta(seconds=JOB_STALE_AFTER)
+    stale = Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    return Job.objects.filter(stale, status='running').update(
+        status='failed', error='The server process running this job stopped before it finished.', finished_at=now)
+
+class JobQueue:
+    """
+    Runs jobs on a local thread pool of settings.JOB_MAX_CONCURRENCY slots,
+    each slot supervising one analysis process at a time.
+
+    The job table is the source of truth: a job is claimed with a conditional
+    update before it runs, so jobs left queued by an earlier server process
+    are picked up the first time this one submits work. Jobs left running by
+    a process that died are failed by fail_stale_jobs on every submission.
+    """
+
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max_concurrency
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, job_id):
+        fail_stale_jobs()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='job')
+                pending = Job.objects.filter(status='queued').exclude(id=job_id).order_by('created_at')
+                for pending_id in pending.values_list('id', flat=True):
+                    self._executor.submit(self._run, pending_id)
+            self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        close_old_connections()
+        try:
+            run_job(job_id)
+        finally:
+            close_old_connections()
+
+job_queue = JobQueue(settings.JOB_MAX_CONCURRENCY)
+
+def submit_job(analysis_type, params):
+    """
+    Record a queued job for a validated request and hand it to job_queue once
+    the row is committed.
+    """
+    job = Job.objects.create(analysis_type=analysis_type, params=params)
+    transaction.on_commit(lambda: job_queue.submit(job.id))
+    return job
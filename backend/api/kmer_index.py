@@ -0,0 +1,184 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .sequences import as_packed
+
+KMER_SIZE = 12
+MAX_KMER_OCCURRENCES = 64
+
+def kmer_codes(seq, k=KMER_SIZE):
+    """
+    2-bit pack every k-mer of a DNA sequence into a uint64.
+
+    Args:
+        seq (str or PackedSequence): DNA sequence.
+        k (int): k-mer length, at most 32.
+
+    Returns:
+        tuple: (codes, valid), one entry per k-mer start. k-mers containing a
+        base other than A, C, G or T are marked invalid.
+    """
+    encoded = as_packed(seq).codes()
+    count = len(encoded) - k + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=bool)
+
+    codes = np.zeros(count, dtype=np.uint64)
+    invalid = np.zeros(count, dtype=bool)
+    for offset in range(k):
+        window = encoded[offset:offset + count]
+        invalid |= window > 3
+        codes = (codes << np.uint64(2)) | (window & 3).astype(np.uint64)
+    return codes, ~invalid
+
+class KmerIndex:
+    """
+    Sorted array of a reference's 2-bit packed k-mers and their positions.
+
+    Lookups are binary searches over the sorted codes, so a whole read's
+    k-mers are resolved with one np.searchsorted call.
+    """
+
+    def __init__(self, reference, k=KMER_SIZE):
+        self.k = k
+        self.reference_length = len(reference)
+        codes, valid = kmer_codes(reference, k)
+        positions = np.flatnonzero(valid)
+        order = np.argsort(codes[positions], kind='stable')
+        self.codes = codes[positions][order]
+        self.positions = positions[order]
+
+    @classmethod
+    def from_arrays(cls, codes, positions, k, reference_length):
+        """
+        Wrap the sorted codes and positions of an index built earlier, such as
+        one mapped from a SharedReferenceStore, without copying them.
+        """
+        index = cls.__new__(cls)
+        index.k = k
+        index.reference_length = reference_length
+        index.codes = codes
+        index.positions = positions
+        return index
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.positions.nbytes
+
+    def seed_hits(self, read, max_occurrences=MAX_KMER_OCCURRENCES):
+        """
+        Find exact k-mer matches between a read and the reference.
+
+        k-mers occurring more than max_occurrences times in the reference are
+        skipped as repeats.
+
+        Returns:
+            tuple: (read_offsets, reference_positions) arrays of equal length.
+        """
+        codes, valid = kmer_codes(read, self.k)
+        read_offsets = np.flatnonzero(valid)
+        codes = codes[read_offsets]
+        lo = np.searchsorted(self.codes, codes, side='left')
+        hi = np.searchsorted(self.codes, codes, side='right')
+        counts = hi - lo
+        keep = (counts > 0) & (counts <= max_occurrences)
+        read_offsets, lo, counts = read_offsets[keep], lo[keep], counts[keep]
+        if not len(counts):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        repeated_offsets = np.repeat(read_offsets, counts)
+        run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+        hit_indexes = np.repeat(lo, counts) + np.arange(counts.sum()) - run_starts
+        return repeated_offsets, self.positions[hit_indexes]
+
+def content_key(seq):
+    """
+    Digest of a sequence's bases, equal for a str and a PackedSequence (or a
+    view of one) holding the same sequence.
+    """
+    seq = as_packed(seq)
+    packed = np.array(seq.packed, dtype=np.uint8)
+    # Clear the bits past the end of a view, which belong to other bases.
+    tail = len(seq) % 4
+    if tail:
+        packed[-1] &= (0xFF << (8 - 2 * tail)) & 0xFF
+    digest = hashlib.blake2b(packed.tobytes(), digest_size=16)
+    if seq.n_mask is not None:
+        digest.update(np.flatnonzero(seq.codes() > 3).tobytes())
+    digest.update(len(seq).to_bytes(8, 'little'))
+    return digest.hexdigest()
+
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+_index_cache_bytes = 0
+
+def get_kmer_index(reference, k=KMER_SIZE):
+    """
+    Build a KmerIndex for a reference, reusing it for repeated references.
+
+    Indexes of the most recently used references are kept up to a total of
+    settings.INDEX_CACHE_BYTES (an index takes 16 bytes per base), keyed on
+    their content, so a reference parsed afresh for every request still finds
+    its index. An index larger than the whole budget is not kept, and neither
+    are the references themselves.
+    """
+    global _index_cache_bytes
+    key = (content_key(reference), k)
+    with _index_cache_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+
+    index = KmerIndex(reference, k)
+    max_bytes = settings.INDEX_CACHE_BYTES
+    if index.nbytes > max_bytes:
+        return index
+    with _index_cache_lock:
+        if key in _index_cache:
+            _index_cache.move_to_end(key)
+            return _index_cache[key]
+        _index_cache[key] = index
+        _index_cache_bytes += index.nbytes
+        while _index_cache_bytes > max_bytes:
+            _, oldest = _index_cache.popitem(last=False)
+            _index_cache_bytes -= oldest.nbytes
+    return index
+
+def find_seed_window(index, read, padding=None):
+    """
+    Choose the reference window a read should be aligned against.
+
+    Seed hits are grouped by diagonal (reference position minus read offset).
+    The best chain is the set of hits within `padding` of the most frequent
+    diagonal, and the window spans that chain plus `padding` on each side.
+
+    Args:
+        index (KmerIndex): Index over the reference.
+        read (str): The read to place.
+        padding (int): Slack for indels; defaults to max(32, len(read) // 10).
+
+    Returns:
+        tuple: (start, end) of the window, or None if the read has no seed hit.
+    """
+    if padding is None:
+        padding = max(32, len(read) // 10)
+    read_offsets, reference_positions = index.seed_hits(read)
+    if not len(read_offsets):
+        return None
+
+    diagonals = reference_positions - read_offsets
+    values, counts = np.unique(diagonals, return_counts=True)
+    cumulative = np.concatenate(([0], np.cumsum(counts)))
+    support = (cumulative[np.searchsorted(values, values + padding, side='right')]
+               - cumulative[np.searchsorted(values, values - padding, side='left')])
+    best = values[np.argmax(support)]
+    chain = diagonals[np.abs(diagonals - best) <= padding]
+
+    start = max(0, int(chain.min()) - padding)
+    end = min(index.reference_length, int(chain.max()) + len(read) + padding)
+    return start, end
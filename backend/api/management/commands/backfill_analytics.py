@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from api.analytics import rebuild_daily_counts
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily analytics rollup from recorded analysis results.'
+
+    def handle(self, *args, **options):
+        written = rebuild_daily_counts()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily analysis counts.'))
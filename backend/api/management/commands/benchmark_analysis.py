@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import CASES, DEFAULT_BASELINE, DEFAULT_SEED, DEFAULT_SIZES, DEFAULT_THRESHOLD, compare, run_benchmarks
+
+class Command(BaseCommand):
+    help = 'Time the analysis functions across input sizes and compare against a baseline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                            help='Comma-separated reference lengths.')
+        parser.add_argument('--case', action='append', dest='cases', choices=list(CASES),
+                            help='Case to run; repeat for several. Defaults to all.')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed calls per measurement.')
+        parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+        parser.add_argument('--output', help='Write results to this JSON file.')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                            help='Compare against results stored in this JSON file; defaults to the '
+                                 'committed api/benchmark_baseline.json. Pass "" to skip the comparison.')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Allowed slowdown or memory growth over the baseline, as a fraction.')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+
+        def progress(result):
+            self.stdout.write(f"{result['name']:<28} {result['size']:>9} "
+                              f"{result['seconds'] * 1000:>11.2f} ms {result['peak_bytes'] / 2 ** 20:>9.2f} MiB")
+
+        # Read before running, since --output may overwrite the baseline
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        current = run_benchmarks(sizes, options['cases'], options['repeat'], options['seed'], progress)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(current, output, indent=2)
+
+        if baseline is not None:
+            regressions = compare(current, baseline, options['threshold'])
+            for regression in regressions:
+                self.stderr.write(f"{regression['name']} at {regression['size']}: {regression['metric']} "
+                                  f"{regression['baseline']:.4g} -> {regression['current']:.4g} "
+                                  f"({regression['ratio']:.2f}x)")
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) over the baseline.')
+            self.stdout.write(self.style.SUCCESS('No regressions over the baseline.'))
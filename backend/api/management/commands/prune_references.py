@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.references import preloaded_reference_ids, shared_store
+
+class Command(BaseCommand):
+    help = 'Delete references from the shared reference store that no process is using.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--include-preloaded', action='store_true',
+                            help='Also delete references named by REFERENCE_PRELOAD.')
+
+    def handle(self, *args, **options):
+        store = shared_store()
+        if store is None:
+            raise CommandError('REFERENCE_STORE_DIR is not set.')
+        keep = () if options['include_preloaded'] else set(preloaded_reference_ids())
+        removed = store.remove_unused(keep=keep)
+        self.stdout.write(self.style.SUCCESS(f'Removed {len(removed)} unused references.'))
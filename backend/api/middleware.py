@@ -0,0 +1,272 @@
+import cProfile
+import io
+import os
+import random
+import re
+import threading
+import time
+import tracemalloc
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+from django.middleware.gzip import GZipMiddleware
+
+from .instrumentation import current_timings, end_request, observe_request, server_timing, start_request
+
+# Compressed bytes read from the client per step while decompressing
+_READ_SIZE = 64 * 1024
+
+class DecompressionError(Exception):
+    """
+    Raised by GzipRequestStream for a body it cannot or will not inflate.
+    """
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+class GzipRequestStream:
+    """
+    File-like reader that inflates a gzip request body as it is read, reading
+    the compressed stream _READ_SIZE bytes at a time and never inflating more
+    than limit bytes in total.
+    """
+
+    def __init__(self, stream, limit):
+        self._stream = stream
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._buffer = bytearray()
+        self.limit = limit
+        self.inflated = 0
+
+    def peek(self, size):
+        """
+        Inflate until at least size bytes (or the rest of the body) are
+        buffered, and return them without consuming them.
+
+        Raises:
+            DecompressionError: For invalid or truncated gzip data (400) or a
+                body inflating past the limit (413).
+        """
+        try:
+            while len(self._buffer) < size and not self._decompressor.eof:
+                chunk = self._decompressor.unconsumed_tail or self._stream.read(_READ_SIZE)
+                if not chunk:
+                    raise DecompressionError('Request body is truncated gzip data.', 400)
+                data = self._decompressor.decompress(chunk, min(size - len(self._buffer), self.limit + 1 - self.inflated))
+                self.inflated += len(data)
+                if self.inflated > self.limit:
+                    raise DecompressionError(f'Decompressed request body exceeds {self.limit} bytes.', 413)
+                self._buffer += data
+        except zlib.error:
+            raise DecompressionError('Request body is not valid gzip data.', 400)
+        return bytes(self._buffer[:size])
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.limit + 1
+        data = self.peek(size)
+        del self._buffer[:len(data)]
+        return data
+
+class RequestDecompressionMiddleware:
+    """
+    Accept request bodies sent with Content-Encoding: gzip.
+
+    The body is inflated before the view sees it, and requests that would
+    inflate past settings.MAX_DECOMPRESSED_REQUEST_BYTES are refused with 413
+    without inflating the remainder. Views with streams_request_body set, which
+    read their body incrementally, get a stream that inflates as they read
+    instead; an error found only later in the body then ends the response
+    early rather than changing its status.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # Work happens in process_view, once the view is known.
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """
+        Replace a gzip request body with its inflated bytes, or with a stream
+        inflating them for views that read the body incrementally.
+
+        Returns:
+            JsonResponse: An error response, or None to continue with the request.
+        """
+        encoding = request.META.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if encoding in ('', 'identity'):
+            return None
+        if encoding != 'gzip':
+            return JsonResponse({'detail': f'Unsupported Content-Encoding "{encoding}".'}, status=415)
+
+        stream = GzipRequestStream(request._stream, settings.MAX_DECOMPRESSED_REQUEST_BYTES)
+        incremental = (getattr(getattr(view_func, 'view_class', None), 'streams_request_body', False)
+                       and not request.content_type.startswith('multipart/'))
+        try:
+            if incremental:
+                # Check the gzip header now, while an error can still be a 400.
+                stream.peek(1)
+            else:
+                body = stream.read()
+        except DecompressionError as exc:
+            return JsonResponse({'detail': str(exc)}, status=exc.status)
+
+        if incremental:
+            # The inflated length is unknown; CONTENT_LENGTH keeps the
+            # compressed one, which only tells parsers there is a body.
+            request._stream = stream
+        else:
+            request._stream = io.BytesIO(body)
+            request.META['CONTENT_LENGTH'] = str(len(body))
+        request._read_started = False
+        del request.META['HTTP_CONTENT_ENCODING']
+        return None
+
+def sync_flushed_gzip(chunks):
+    """
+    Gzip a sequence of byte strings, flushing after each so the client can
+    inflate every item as soon as it arrives.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+async def async_sync_flushed_gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+class ResponseCompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that leaves responses smaller than
+    settings.RESPONSE_COMPRESSION_MIN_BYTES uncompressed.
+
+    Streaming responses are always compressed, but flushed after every item
+    (see sync_flushed_gzip) rather than buffered as GZipMiddleware would, so
+    streamed NDJSON and VCF still reach the client record by record.
+    """
+
+    def process_response(self, request, response):
+        if not response.streaming:
+            if len(response.content) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+                return response
+            return super().process_response(request, response)
+
+        already_encoded = response.has_header('Content-Encoding')
+        content = response.streaming_content
+        response = super().process_response(request, response)
+        if not already_encoded and response.get('Content-Encoding') == 'gzip':
+            # Replace GZipMiddleware's compressor, keeping the headers it set.
+            response.streaming_content = (async_sync_flushed_gzip(content) if response.is_async
+                                          else sync_flushed_gzip(content))
+        return response
+
+# Held while a request is profiled: Python allows one active profiler, so a
+# sampled request that overlaps another goes unprofiled.
+_profiling = threading.Lock()
+
+class InstrumentationMiddleware:
+    """
+    Time each request and its phases (see api.instrumentation.phase).
+
+    Phases are reported in a Server-Timing header and aggregated into the
+    histograms served at /metrics. With settings.INSTRUMENT_MEMORY the peak
+    traced allocation is reported too, at tracemalloc's cost. A
+    settings.PROFILE_SAMPLE_RATE fraction of requests run under cProfile, and
+    those slower than settings.PROFILE_THRESHOLD_MS are saved to
+    settings.PROFILE_DIR. Only one request is profiled at a time; under ASGI
+    its profile also covers whatever other requests the event loop served
+    meanwhile.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop(state)
+        return self._report(request, response, state)
+
+    async def __acall__(self, request):
+        state = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._stop(state)
+        return self._report(request, response, state)
+
+    def _start(self):
+        timings, token = start_request()
+        trace_memory = settings.INSTRUMENT_MEMORY
+        started_tracing = False
+        if trace_memory:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        profiler = None
+        if (settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE
+                and _profiling.acquire(blocking=False)):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler (not one of ours) is active.
+                _profiling.release()
+                profiler = None
+        return {'timings': timings, 'token': token, 'trace_memory': trace_memory,
+                'started_tracing': started_tracing, 'profiler': profiler, 'start': time.perf_counter()}
+
+    def _stop(self, state):
+        state['total'] = time.perf_counter() - state['start']
+        if state['profiler'] is not None:
+            state['profiler'].disable()
+            _profiling.release()
+        end_request(state['token'])
+
+    def _report(self, request, response, state):
+        timings, total, profiler = state['timings'], state['total'], state['profiler']
+        if state['trace_memory']:
+            timings.peak_bytes = tracemalloc.get_traced_memory()[1]
+            if state['started_tracing']:
+                tracemalloc.stop()
+
+        route = request.resolver_match.route if request.resolver_match else 'unmatched'
+        observe_request(route, request.method, response.status_code, total, timings)
+        response['Server-Timing'] = server_timing(timings, total)
+
+        if profiler is not None and total * 1000 >= settings.PROFILE_THRESHOLD_MS:
+            os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+            name = re.sub(r'[^A-Za-z0-9]+', '-', route).strip('-') or 'root'
+            profiler.dump_stats(os.path.join(settings.PROFILE_DIR, f'{time.time_ns()}-{name}.prof'))
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF renders the response after the view returns; time that as 'render'.
+        timings = current_timings()
+        if timings is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: timings.add('render', time.perf_counter() - start))
+        return response
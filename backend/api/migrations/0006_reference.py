@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_remove_analysisresult_input_sequence_1_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reference',
+            fields=[
+                ('id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('length', models.PositiveBigIntegerField()),
+                ('packed_sequence', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
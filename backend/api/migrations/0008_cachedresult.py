@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedResult',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('analysis_type', models.CharField(choices=[('variant_detection', 'Variant Detection'), ('sequence_alignment', 'Sequence Alignment'), ('orf_detection', 'ORF Detection')], max_length=19)),
+                ('result', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
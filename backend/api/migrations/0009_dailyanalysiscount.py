@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:56
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_counts(apps, schema_editor):
+    AnalysisResult = apps.get_model('api', 'AnalysisResult')
+    DailyAnalysisCount = apps.get_model('api', 'DailyAnalysisCount')
+    totals = (AnalysisResult.objects.annotate(date=TruncDate('created_at'))
+              .values('date', 'analysis_type').annotate(count=Count('id')).order_by())
+    DailyAnalysisCount.objects.bulk_create(
+        DailyAnalysisCount(date=row['date'], analysis_type=row['analysis_type'], count=row['count'])
+        for row in totals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_cachedresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAnalysisCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('analysis_type', models.CharField(choices=[('variant_detection', 'Variant Detection'), ('sequence_alignment', 'Sequence Alignment'), ('orf_detection', 'ORF Detection')], max_length=19)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'analysis_type'), name='unique_daily_analysis_count')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_counts, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 class AnalysisResult(models.Model):
@@ -9,4 +12,47 @@ class AnalysisResult(models.Model):
     }
 
     analysis_type = models.CharField(max_length=19, choices=ANALYSIS_TYPES)
+    created_at = models.DateTimeField(default=timezone.now)
+
+class Reference(models.Model):
+    id = models.CharField(max_length=64, primary_key=True)
+    length = models.PositiveBigIntegerField()
+    packed_sequence = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class Job(models.Model):
+    STATUSES = {
+        'queued': 'Queued',
+        'running': 'Running',
+        'succeeded': 'Succeeded',
+        'failed': 'Failed',
+        'cancelled': 'Cancelled'
+    }
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    analysis_type = models.CharField(max_length=19, choices=AnalysisResult.ANALYSIS_TYPES)
+    status = models.CharField(max_length=9, choices=STATUSES, default='queued')
+    progress = models.FloatField(default=0.0)
+    params = models.JSONField()
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+class CachedResult(models.Model):
+    key = models.CharField(max_length=64, primary_key=True)
+    analysis_type = models.CharField(max_length=19, choices=AnalysisResult.ANALYSIS_TYPES)
+    result = models.BinaryField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+class DailyAnalysisCount(models.Model):
+    date = models.DateField()
+    analysis_type = models.CharField(max_length=19, choices=AnalysisResult.ANALYSIS_TYPES)
+    count = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'analysis_type'], name='unique_daily_analysis_count')
+        ]
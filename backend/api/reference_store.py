@@ -0,0 +1,187 @@
+import fcntl
+import json
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+
+from .kmer_index import KmerIndex
+from .sequences import PackedSequence
+
+_REFERENCE_ID = re.compile(r'[0-9a-f]{64}')
+
+class MappedArray(np.ndarray):
+    """
+    Read-only view of an .npy file mapped into memory.
+
+    A whole mapped array pickles as its path rather than its contents, so a
+    worker process it is sent to maps the same file instead of receiving a
+    copy. Arrays derived from it pickle as ordinary arrays.
+    """
+
+    def __array_finalize__(self, obj):
+        self.path = None
+
+    def __reduce__(self):
+        if self.path is not None:
+            return (map_array, (self.path,))
+        return np.asarray(self).__reduce__()
+
+def map_array(path):
+    array = np.load(path, mmap_mode='r').view(MappedArray)
+    array.path = path
+    return array
+
+class SharedReferenceStore:
+    """
+    Packed references and their k-mer indexes in memory-mapped files, shared
+    by every process using the same directory.
+
+    Each reference is a directory of .npy files, published with one atomic
+    rename so readers never see a partial write. Processes map the files
+    read-only, so the page cache holds one copy however many processes use a
+    reference.
+
+    A process holds a shared flock on a reference's lock file from acquire
+    until its matching release. The kernel thereby counts holders across
+    processes, and remove_unused deletes only references no process holds.
+    Locks die with their process, so a crashed worker leaves nothing behind.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._holders = {}
+        self._lock = threading.Lock()
+
+    def _path(self, reference_id, *names):
+        return os.path.join(self.directory, reference_id, *names)
+
+    def contains(self, reference_id):
+        return bool(_REFERENCE_ID.fullmatch(reference_id)) and os.path.exists(self._path(reference_id, 'lock'))
+
+    def write(self, reference_id, sequence, index):
+        """
+        Publish a reference unless it is already stored.
+
+        Args:
+            reference_id (str): The reference's content hash.
+            sequence (PackedSequence): The reference.
+            index (KmerIndex): Its k-mer index.
+        """
+        if self.contains(reference_id):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        staging = os.path.join(self.directory, f'.{reference_id}.{os.getpid()}.{threading.get_ident()}')
+        os.makedirs(staging)
+        try:
+            np.save(os.path.join(staging, 'packed.npy'), sequence.packed)
+            if sequence.n_mask is not None:
+                np.save(os.path.join(staging, 'n_mask.npy'), sequence.n_mask)
+            np.save(os.path.join(staging, 'codes.npy'), index.codes)
+            np.save(os.path.join(staging, 'positions.npy'), index.positions)
+            with open(os.path.join(staging, 'meta.json'), 'w') as meta:
+                json.dump({'length': len(sequence), 'k': index.k}, meta)
+            open(os.path.join(staging, 'lock'), 'w').close()
+            os.rename(staging, self._path(reference_id))
+        except OSError:
+            # Another process published it first.
+            if not self.contains(reference_id):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def acquire(self, reference_id):
+        """
+        Map a stored reference, holding it until the matching release.
+
+        Returns:
+            tuple: (PackedSequence, KmerIndex) over the mapped files, or None
+            if the reference is not stored.
+        """
+        if not _REFERENCE_ID.fullmatch(reference_id):
+            return None
+        with self._lock:
+            holder = self._holders.get(reference_id)
+            if holder is None:
+                mapped = self._map(reference_id)
+                if mapped is None:
+                    return None
+                holder = self._holders[reference_id] = [0, *mapped]
+            holder[0] += 1
+            return holder[2], holder[3]
+
+    def _map(self, reference_id):
+        lock_path = self._path(reference_id, 'lock')
+        try:
+            fd = os.open(lock_path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            # remove_unused may have taken the reference away while we waited.
+            if os.stat(lock_path).st_ino != os.fstat(fd).st_ino:
+                raise FileNotFoundError(lock_path)
+            with open(self._path(reference_id, 'meta.json')) as meta:
+                meta = json.load(meta)
+            n_mask_path = self._path(reference_id, 'n_mask.npy')
+            sequence = PackedSequence(map_array(self._path(reference_id, 'packed.npy')), meta['length'],
+                                      map_array(n_mask_path) if os.path.exists(n_mask_path) else None)
+            index = KmerIndex.from_arrays(map_array(self._path(reference_id, 'codes.npy')),
+                                          map_array(self._path(reference_id, 'positions.npy')),
+                                          meta['k'], meta['length'])
+        except FileNotFoundError:
+            os.close(fd)
+            return None
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd, sequence, index
+
+    def release(self, reference_id):
+        """
+        Drop one hold on a reference; the last lets other processes remove it.
+        Arrays still in use stay valid, as the mapping outlives the files.
+        """
+        with self._lock:
+            holder = self._holders[reference_id]
+            holder[0] -= 1
+            if holder[0] == 0:
+                del self._holders[reference_id]
+                os.close(holder[1])
+
+    def held(self):
+        with self._lock:
+            return {reference_id: holder[0] for reference_id, holder in self._holders.items()}
+
+    def remove_unused(self, keep=()):
+        """
+        Delete stored references that no process holds, except those in keep.
+
+        Returns:
+            list: The removed reference ids.
+        """
+        removed = []
+        if not os.path.isdir(self.directory):
+            return removed
+        for reference_id in sorted(os.listdir(self.directory)):
+            if not _REFERENCE_ID.fullmatch(reference_id) or reference_id in keep:
+                continue
+            try:
+                fd = os.open(self._path(reference_id, 'lock'), os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            try:
+                doomed = os.path.join(self.directory, f'.{reference_id}.removed.{os.getpid()}')
+                os.rename(self._path(reference_id), doomed)
+            finally:
+                os.close(fd)
+            shutil.rmtree(doomed, ignore_errors=True)
+            removed.append(reference_id)
+        return removed
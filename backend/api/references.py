@@ -0,0 +1,190 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .kmer_index import KmerIndex
+from .models import Reference
+from .reference_store import SharedReferenceStore
+from .sequences import PackedSequence
+
+def reference_hash(sequence):
+    """
+    Content hash used as a reference's id.
+    """
+    return hashlib.sha256(sequence.encode('ascii')).hexdigest()
+
+def pack_sequence(sequence):
+    """
+    Pack an A/C/G/T sequence into 2 bits per base, first base in the high bits.
+
+    Returns:
+        bytes: ceil(len(sequence) / 4) bytes.
+    """
+    return PackedSequence.from_string(sequence).packed.tobytes()
+
+def unpack_sequence(packed, length):
+    """
+    Inverse of pack_sequence.
+    """
+    return str(PackedSequence.from_packed(packed, length))
+
+class CachedReference:
+    """
+    A packed reference and its k-mer index, as held by ReferenceCache.
+
+    An entry mapped from the shared reference store holds its reference there
+    until the cache lets go of it.
+    """
+
+    def __init__(self, reference_id, sequence, index=None, store=None):
+        self.reference_id = reference_id
+        self.sequence = sequence
+        self.index = KmerIndex(sequence) if index is None else index
+        self.store = store
+        self.nbytes = sequence.nbytes + self.index.nbytes
+
+    def close(self):
+        if self.store is not None:
+            self.store.release(self.reference_id)
+            self.store = None
+
+class ReferenceCache:
+    """
+    Thread-safe LRU of CachedReference entries bounded by their total size.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, reference_id):
+        with self._lock:
+            entry = self._entries.get(reference_id)
+            if entry is not None:
+                self._entries.move_to_end(reference_id)
+            return entry
+
+    def put(self, entry):
+        with self._lock:
+            evicted = []
+            previous = self._entries.pop(entry.reference_id, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes
+                if previous is not entry:
+                    evicted.append(previous)
+            self._entries[entry.reference_id] = entry
+            self.nbytes += entry.nbytes
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                _, oldest = self._entries.popitem(last=False)
+                self.nbytes -= oldest.nbytes
+                evicted.append(oldest)
+        for oldest in evicted:
+            oldest.close()
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self.nbytes = 0
+        for entry in entries:
+            entry.close()
+
+reference_cache = ReferenceCache(settings.REFERENCE_CACHE_BYTES)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def shared_store():
+    """
+    The SharedReferenceStore in settings.REFERENCE_STORE_DIR, or None when
+    references are kept only in each process's own memory.
+    """
+    directory = settings.REFERENCE_STORE_DIR
+    if not directory:
+        return None
+    with _stores_lock:
+        store = _stores.get(directory)
+        if store is None:
+            store = _stores[directory] = SharedReferenceStore(directory)
+        return store
+
+def preloaded_reference_ids():
+    """
+    Ids named by settings.REFERENCE_PRELOAD, where 'all' means every stored
+    reference.
+    """
+    if settings.REFERENCE_PRELOAD == ['all']:
+        return list(Reference.objects.order_by('id').values_list('id', flat=True))
+    return settings.REFERENCE_PRELOAD
+
+def _open_reference(reference_id, reference=None):
+    """
+    Build the cache entry for a reference, mapping it from the shared store
+    when there is one and publishing it there first if needed.
+
+    Returns:
+        CachedReference: The entry, or None if the id is unknown.
+    """
+    store = shared_store()
+    if store is not None:
+        mapped = store.acquire(reference_id)
+        if mapped is not None:
+            return CachedReference(reference_id, *mapped, store=store)
+
+    if reference is None:
+        reference = Reference.objects.filter(id=reference_id).first()
+        if reference is None:
+            return None
+    entry = CachedReference(reference_id, PackedSequence.from_packed(bytes(reference.packed_sequence), reference.length))
+    if store is not None:
+        store.write(reference_id, entry.sequence, entry.index)
+        mapped = store.acquire(reference_id)
+        if mapped is not None:
+            return CachedReference(reference_id, *mapped, store=store)
+    return entry
+
+def preload_references(reference_ids):
+    """
+    Load references into this process's cache (and the shared store) ahead of
+    their first request.
+
+    Returns:
+        list: The ids that were found.
+    """
+    return [reference_id for reference_id in reference_ids if get_reference(reference_id) is not None]
+
+def store_reference(sequence):
+    """
+    Store a validated reference once under its content hash.
+
+    Returns:
+        tuple: (Reference, created)
+    """
+    reference_id = reference_hash(sequence)
+    reference, created = Reference.objects.get_or_create(
+        id=reference_id,
+        defaults={'length': len(sequence), 'packed_sequence': pack_sequence(sequence)},
+    )
+    if reference_cache.get(reference_id) is None:
+        reference_cache.put(_open_reference(reference_id, reference))
+    return reference, created
+
+def get_reference(reference_id):
+    """
+    Fetch a stored reference, mapping it from the shared store or decoding
+    and indexing it on a cache miss.
+
+    Returns:
+        CachedReference: The cached entry, or None if the id is unknown.
+    """
+    entry = reference_cache.get(reference_id)
+    if entry is not None:
+        return entry
+    entry = _open_reference(reference_id)
+    if entry is not None:
+        reference_cache.put(entry)
+    return entry
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import CachedResult
+from .references import reference_hash
+
+# Bump when an analysis changes its output, so stale entries stop matching.
+RESULT_CACHE_VERSION = 1
+
+def result_key(analysis_type, data):
+    """
+    Content hash of an analysis request.
+
+    Sequence fields are reduced to their content hash, so a reference given
+    by reference_id and the same reference given inline share a key.
+
+    Args:
+        analysis_type (str): One of AnalysisResult.ANALYSIS_TYPES.
+        data (dict): The request serializer's validated data.
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    params = {}
+    for name, value in data.items():
+        if name in ('reference_id', 'reference_index'):
+            continue
+        if name.endswith('_sequence'):
+            if name in ('reference_sequence', 'input_sequence') and 'reference_id' in data:
+                value = data['reference_id']
+            else:
+                value = reference_hash(str(value))
+        params[name] = value
+    payload = json.dumps([RESULT_CACHE_VERSION, analysis_type, params], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('ascii')).hexdigest()
+
+class ResultCache:
+    """
+    Thread-safe LRU of JSON-encoded analysis results bounded by their total
+    size, optionally backed by the CachedResult table.
+    """
+
+    def __init__(self, max_bytes, use_db=False):
+        self.max_bytes = max_bytes
+        self.use_db = use_db
+        self.nbytes = 0
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_memory(self, key):
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return encoded
+
+    def _put_memory(self, key, encoded):
+        if len(encoded) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= len(previous)
+            self._entries[key] = encoded
+            self.nbytes += len(encoded)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def get(self, key):
+        """
+        Returns:
+            The cached result, or None on a miss in every tier.
+        """
+        encoded = self._get_memory(key)
+        if encoded is None and self.use_db:
+            row = CachedResult.objects.filter(key=key).values_list('result', flat=True).first()
+            if row is not None:
+                encoded = bytes(row)
+                self._put_memory(key, encoded)
+                with self._lock:
+                    self.db_hits += 1
+        if encoded is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return json.loads(encoded)
+
+    def put(self, key, analysis_type, result):
+        encoded = json.dumps(result, separators=(',', ':')).encode()
+        self._put_memory(key, encoded)
+        if self.use_db:
+            CachedResult.objects.get_or_create(key=key, defaults={'analysis_type': analysis_type, 'result': encoded})
+
+    def get_or_compute(self, analysis_type, data, compute):
+        """
+        Serve an analysis from the cache, running compute(data) only on a miss.
+        """
+        key = result_key(analysis_type, data)
+        result = self.get(key)
+        if result is None:
+            result = compute(data)
+            self.put(key, analysis_type, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.nbytes,
+                'hits': self.hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = self.db_hits = self.misses = 0
+
+result_cache = ResultCache(settings.RESULT_CACHE_BYTES, use_db=settings.RESULT_CACHE_DB)
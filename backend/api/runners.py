@@ -0,0 +1,124 @@
+import time
+
+from .analysis import variant_detection, variant_alignment, normalized_variants, vcf_lines, sequence_alignment, compact_alignment, orf_page, alignment_score, edit_distance, local_alignment_score
+from .distance_matrix import distance_matrix
+from .fasta import ndjson_lines
+from .instrumentation import reporting_progress
+from .reference_store import MappedArray
+
+# Functions of a request serializer's validated data. They need no database
+# or settings, so they can run in worker processes as well as in a request.
+
+def worker_data(data):
+    """
+    The part of a request's validated data worth sending to another process.
+
+    A k-mer index mapped from the shared reference store pickles as its file
+    paths and is kept; any other index is dropped, since pickling it would copy
+    16 bytes per reference base on every call, and the worker falls back to its
+    own cached index (see get_kmer_index).
+    """
+    index = data.get('reference_index')
+    if index is None or (isinstance(index.codes, MappedArray) and index.codes.path is not None):
+        return data
+    return {key: value for key, value in data.items() if key != 'reference_index'}
+
+def run_variant_detection(data):
+    return variant_detection(data['reference_sequence'], data['sample_sequence'],
+                             engine=data['engine'], band_width=data['band_width'],
+                             index=data.get('reference_index'), normalize=data['normalize'])
+
+def run_variant_alignment(data):
+    return variant_alignment(data['reference_sequence'], data['sample_sequence'],
+                             engine=data['engine'], band_width=data['band_width'],
+                             index=data.get('reference_index'))
+
+def variant_lines(data, alignment):
+    """
+    Normalized variants of an alignment from run_variant_alignment, as lines
+    of NDJSON or VCF (per the request's output_format) produced while the
+    variants are found.
+    """
+    variants = normalized_variants(alignment['aligned_sequence_1'], alignment['aligned_sequence_2'],
+                                   alignment.get('reference_start', 0))
+    if data['output_format'] == 'vcf':
+        return vcf_lines(variants, data['reference_sequence'], contig=data.get('reference_id', 'reference'))
+    return ndjson_lines(variants)
+
+def stream_variant_detection(data):
+    """
+    Normalized variants of a request with a streaming output_format.
+    """
+    return variant_lines(data, run_variant_alignment(data))
+
+def run_sequence_alignment(data):
+    if data['score_only'] and data['engine'] == 'local':
+        score, reference_start, reference_end, query_start, query_end = local_alignment_score(
+            data['reference_sequence'], data['sample_sequence'])
+        return {
+            'alignment_score': score,
+            'reference_start': reference_start,
+            'reference_end': reference_end,
+            'query_start': query_start,
+            'query_end': query_end
+        }
+    if data['score_only'] and data['metric'] == 'alignment_score':
+        return {'alignment_score': alignment_score(data['reference_sequence'], data['sample_sequence'])}
+    if data['score_only']:
+        return {'edit_distance': edit_distance(data['reference_sequence'], data['sample_sequence'])}
+    result = sequence_alignment(data['reference_sequence'], data['sample_sequence'],
+                                engine=data['engine'], band_width=data['band_width'],
+                                index=data.get('reference_index'))
+    if data['output_format'] == 'gapped':
+        return result
+    return compact_alignment(result, len(data['reference_sequence']), len(data['sample_sequence']),
+                             include_gapped=data['output_format'] == 'both')
+
+def run_distance_matrix(data):
+    # In-process: in a worker, the executor already spreads requests across processes
+    return distance_matrix(data['sequences'], metric=data['metric'], cutoff=data['cutoff'], workers=1)
+
+# Seconds between progress messages from a background job
+PROGRESS_INTERVAL = 1.0
+
+def send_result(conn, function, data):
+    """
+    Child-process entry point for a background job: send ('succeeded', result)
+    or ('failed', message) for function(data) down conn, preceded by
+    ('progress', fraction) messages at most every PROGRESS_INTERVAL seconds
+    while the analysis reports progress.
+    """
+    last_sent = time.monotonic()
+
+    def report(fraction):
+        nonlocal last_sent
+        now = time.monotonic()
+        if now - last_sent >= PROGRESS_INTERVAL:
+            conn.send(('progress', fraction))
+            last_sent = now
+
+    try:
+        with reporting_progress(report):
+            result = function(data)
+        conn.send(('succeeded', result))
+    except Exception as exc:
+        conn.send(('failed', f'{type(exc).__name__}: {exc}'))
+    finally:
+        conn.close()
+
+def run_orf_detection(data):
+    limit = data.get('limit')
+    offset = data['offset']
+    count, page = orf_page(data['input_sequence'], offset, limit,
+                           min_length=data['min_length'],
+                           longest_only=data['longest_only'],
+                           include_sequences=data['include_sequences'])
+
+    if limit is None:
+        return page
+    return {
+        'count': count,
+        'offset': offset,
+        'limit': limit,
+        'results': page
+    }
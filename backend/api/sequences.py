@@ -0,0 +1,161 @@
+import numpy as np
+
+BASES = 'ACGT'
+N_CODON = 64
+
+# ASCII code -> base code (0-3 for A, C, G, T in either case; 4 for anything else)
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _code, _base in enumerate(BASES):
+    BASE_CODES[ord(_base)] = _code
+    BASE_CODES[ord(_base.lower())] = _code
+_ASCII_BASES = np.frombuffer(b'ACGTN', dtype=np.uint8)
+_SHIFTS = np.array([6, 4, 2, 0], dtype=np.uint8)
+
+def pack_codes(codes):
+    """
+    Pack base codes (0-3) four to a byte, first base in the high bits.
+    """
+    padded = np.zeros(-(-len(codes) // 4) * 4, dtype=np.uint8)
+    padded[:len(codes)] = codes & 3
+    return np.bitwise_or.reduce(padded.reshape(-1, 4) << _SHIFTS, axis=1).astype(np.uint8)
+
+class PackedSequence:
+    """
+    DNA sequence stored at 2 bits per base with a separate N-mask.
+
+    Any character other than A, C, G or T (in either case) is stored as N.
+    Slicing with step 1 returns a view over the same buffers, so sub-sequences
+    cost no copy. Bases are unpacked to NumPy arrays on demand by codes(),
+    ascii() and codon_indices().
+    """
+
+    __slots__ = ('_packed', '_n_mask', '_start', '_length')
+
+    def __init__(self, packed, length, n_mask=None, start=0):
+        self._packed = packed
+        self._n_mask = n_mask
+        self._start = start
+        self._length = length
+
+    @classmethod
+    def from_string(cls, seq):
+        return cls.from_codes(BASE_CODES[np.frombuffer(seq.encode('ascii', 'replace'), dtype=np.uint8)])
+
+    @classmethod
+    def from_codes(cls, codes):
+        """
+        Build from an array of base codes, where 4 marks N.
+        """
+        unknown = codes > 3
+        n_mask = np.packbits(unknown) if unknown.any() else None
+        return cls(pack_codes(codes), len(codes), n_mask)
+
+    @classmethod
+    def from_packed(cls, packed, length):
+        """
+        Wrap bytes laid out by pack_codes without copying them.
+        """
+        return cls(np.frombuffer(packed, dtype=np.uint8), length)
+
+    @property
+    def packed(self):
+        """
+        The packed bytes of this sequence, copied only for unaligned views.
+        """
+        if self._start % 4 == 0:
+            first = self._start // 4
+            return self._packed[first:first + -(-self._length // 4)]
+        return pack_codes(self.codes())
+
+    @property
+    def n_mask(self):
+        """
+        Packed bit mask of the N bases in the underlying buffer, or None.
+        """
+        return self._n_mask
+
+    @property
+    def nbytes(self):
+        return self._packed.nbytes + (0 if self._n_mask is None else self._n_mask.nbytes)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._length)
+            if step != 1:
+                return PackedSequence.from_codes(self.codes()[start:stop:step])
+            return PackedSequence(self._packed, max(0, stop - start), self._n_mask, self._start + start)
+        if key < 0:
+            key += self._length
+        if not 0 <= key < self._length:
+            raise IndexError('PackedSequence index out of range')
+        return str(self[key:key + 1])
+
+    def __str__(self):
+        return self.ascii().tobytes().decode('ascii')
+
+    def __repr__(self):
+        return f'PackedSequence({len(self)} bp)'
+
+    def codes(self):
+        """
+        Base codes (0-3 for A, C, G, T; 4 for N) as a uint8 array.
+        """
+        first, last = self._start // 4, -(-(self._start + self._length) // 4)
+        codes = ((self._packed[first:last, None] >> _SHIFTS) & 3).reshape(-1)
+        codes = codes[self._start - 4 * first:self._start - 4 * first + self._length]
+        if self._n_mask is not None:
+            unknown = np.unpackbits(self._n_mask, count=self._start + self._length)[self._start:]
+            codes[unknown.astype(bool)] = 4
+        return codes
+
+    def ascii(self):
+        """
+        Upper-case ASCII codes of the bases as a uint8 array.
+        """
+        return _ASCII_BASES[self.codes()]
+
+    def reverse_complement(self):
+        return PackedSequence.from_codes(complement_codes(self.codes()))
+
+    def codon_indices(self, frame=0):
+        """
+        Index (0-63, bases in ACGT order) of every full codon in a frame.
+
+        Codons containing N get index N_CODON.
+        """
+        return codon_indices(self.codes(), frame)
+
+def codon_indices(codes, frame=0):
+    """
+    Codon indices of a base-code array in one reading frame, see
+    PackedSequence.codon_indices.
+    """
+    codes = codes[frame:]
+    codons = codes[:len(codes) // 3 * 3].reshape(-1, 3).astype(np.int64)
+    indices = codons[:, 0] * 16 + codons[:, 1] * 4 + codons[:, 2]
+    indices[(codons > 3).any(axis=1)] = N_CODON
+    return indices
+
+def complement_codes(codes):
+    """
+    Reverse complement of a base-code array, keeping N as N.
+    """
+    codes = codes[::-1]
+    return np.where(codes > 3, codes, 3 - codes).astype(np.uint8)
+
+def as_packed(seq):
+    return seq if isinstance(seq, PackedSequence) else PackedSequence.from_string(seq)
+
+def as_string(seq):
+    return seq if isinstance(seq, str) else str(seq)
+
+def sequence_bytes(seq):
+    """
+    ASCII bytes of a str or PackedSequence.
+    """
+    if isinstance(seq, PackedSequence):
+        return seq.ascii().tobytes()
+    return seq.encode('ascii')
@@ -1,39 +1,177 @@
+import numpy as np
+from django.conf import settings
 from rest_framework import serializers
-from .models import AnalysisResult
+from .analysis import ALIGNMENT_ENGINES
+from .distance_matrix import DISTANCE_METRICS
+from .references import get_reference
+from .sequences import BASES, PackedSequence
 
-class AnalysisResultSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = AnalysisResult
-        fields = '__all__'
+IUPAC_AMBIGUITY_CODES = 'NRYKMSWBDHV'
+
+class SequenceField(serializers.CharField):
+    """
+    A DNA sequence, validated and normalized in bulk.
+
+    The input is checked against a 256-entry lookup table in one NumPy pass
+    rather than per character. Inputs longer than max_input_length characters
+    are rejected before any of that work.
+
+    Args:
+        allow_lowercase (bool): Accept a, c, g, t (and lowercase ambiguity
+            codes), normalized to upper case.
+        allow_whitespace (bool): Drop spaces and line breaks, e.g. in pasted
+            FASTA bodies.
+        allow_ambiguous (bool): Accept N and the other IUPAC ambiguity codes,
+            all normalized to N.
+        packed (bool): Return a PackedSequence rather than a str.
+        max_input_length (int): Defaults to settings.MAX_SEQUENCE_LENGTH.
+    """
+
+    default_error_messages = {
+        'invalid_characters': 'Sequence contains invalid characters. Only {allowed} are allowed.',
+        'too_long': 'Sequence is longer than {max_input_length} characters.'
+    }
+
+    def __init__(self, allow_lowercase=True, allow_whitespace=True, allow_ambiguous=False, packed=True,
+                 max_input_length=None, **kwargs):
+        kwargs['trim_whitespace'] = False
+        super().__init__(**kwargs)
+        # CharField's null/surrogate checks scan the text per character; the
+        # lookup table below already rejects anything outside the alphabet.
+        self.validators = []
+        self.allow_whitespace = allow_whitespace
+        self.packed = packed
+        self.max_input_length = settings.MAX_SEQUENCE_LENGTH if max_input_length is None else max_input_length
+
+        allowed = BASES + (IUPAC_AMBIGUITY_CODES if allow_ambiguous else '')
+        self.allowed = ', '.join(allowed) if not allow_ambiguous else 'A, C, G, T and IUPAC ambiguity codes'
+        self.codes = np.full(256, 255, dtype=np.uint8)
+        for char in allowed:
+            code = BASES.index(char) if char in BASES else 4
+            self.codes[ord(char)] = code
+            if allow_lowercase:
+                self.codes[ord(char.lower())] = code
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail('invalid')
+        if len(data) > self.max_input_length:
+            self.fail('too_long', max_input_length=self.max_input_length)
+        raw = data.encode('ascii', 'replace')
+        if self.allow_whitespace:
+            raw = raw.translate(None, b' \t\r\n\v\f')
+        if not raw:
+            self.fail('blank')
+
+        codes = self.codes[np.frombuffer(raw, dtype=np.uint8)]
+        if (codes == 255).any():
+            self.fail('invalid_characters', allowed=self.allowed)
+        sequence = PackedSequence.from_codes(codes)
+        return sequence if self.packed else str(sequence)
+
+def resolve_reference(data):
+    """
+    Require exactly one of reference_sequence and reference_id, replacing a
+    reference_id with the registered sequence, plus its k-mer index for the
+    'seeded' engine, the only one that uses it.
+    """
+    if ('reference_sequence' in data) == ('reference_id' in data):
+        raise serializers.ValidationError("Provide exactly one of reference_sequence and reference_id.")
+
+    if 'reference_id' in data:
+        reference = get_reference(data['reference_id'])
+        if reference is None:
+            raise serializers.ValidationError("Unknown reference_id.")
+        data['reference_sequence'] = reference.sequence
+        if data.get('engine') == 'seeded':
+            data['reference_index'] = reference.index
+
+class ChartRangeSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if 'start' in data and 'end' in data and data['start'] > data['end']:
+            raise serializers.ValidationError("start must not be after end.")
+        return data
 
 class VariantDetectionSerializer(serializers.Serializer):
-    reference_sequence = serializers.CharField()
-    sample_sequence = serializers.CharField()
+    reference_sequence = SequenceField(required=False)
+    reference_id = serializers.CharField(required=False)
+    sample_sequence = SequenceField()
+    engine = serializers.ChoiceField(choices=ALIGNMENT_ENGINES, default='auto')
+    band_width = serializers.IntegerField(min_value=0, required=False, allow_null=True, default=None)
+    normalize = serializers.BooleanField(default=False)
+    output_format = serializers.ChoiceField(choices=('json', 'ndjson', 'vcf'), default='json')
 
     def validate(self, data):
-        if any(char not in {'A', 'T', 'G', 'C'} for char in data['reference_sequence']):
-            raise serializers.ValidationError("Reference sequence contains invalid characters. Only A, T, G, C are allowed.")
+        resolve_reference(data)
+        return data
+
+class BatchVariantDetectionSerializer(serializers.Serializer):
+    reference_sequence = SequenceField(required=False)
+    reference_id = serializers.CharField(required=False)
+    sample_sequences = serializers.ListField(child=SequenceField(), allow_empty=False)
+    engine = serializers.ChoiceField(choices=ALIGNMENT_ENGINES, default='auto')
+    band_width = serializers.IntegerField(min_value=0, required=False, allow_null=True, default=None)
 
-        if any(char not in {'A', 'T', 'G', 'C'} for char in data['sample_sequence']):
-            raise serializers.ValidationError("Sample sequence contains invalid characters. Only A, T, G, C are allowed.")
+    def validate(self, data):
+        resolve_reference(data)
         return data
 
 class SequenceAlignmentSerializer(serializers.Serializer):
-    reference_sequence = serializers.CharField()
-    sample_sequence = serializers.CharField()
+    reference_sequence = SequenceField(required=False)
+    reference_id = serializers.CharField(required=False)
+    sample_sequence = SequenceField()
+    engine = serializers.ChoiceField(choices=ALIGNMENT_ENGINES, default='auto')
+    band_width = serializers.IntegerField(min_value=0, required=False, allow_null=True, default=None)
+    score_only = serializers.BooleanField(default=False)
+    # What score_only reports: the bit-parallel edit distance, or the
+    # Needleman–Wunsch score (a full DP pass). The 'local' engine always
+    # reports its Smith–Waterman score.
+    metric = serializers.ChoiceField(choices=DISTANCE_METRICS, default='edit_distance')
+    output_format = serializers.ChoiceField(choices=('gapped', 'cigar', 'both'), default='gapped')
 
     def validate(self, data):
-        if any(char not in {'A', 'T', 'G', 'C'} for char in data['reference_sequence']):
-            raise serializers.ValidationError("Reference sequence contains invalid characters. Only A, T, G, C are allowed.")
-
-        if any(char not in {'A', 'T', 'G', 'C'} for char in data['sample_sequence']):
-            raise serializers.ValidationError("Sample sequence contains invalid characters. Only A, T, G, C are allowed.")
+        resolve_reference(data)
         return data
 
 class ORFDetectionSerializer(serializers.Serializer):
-    input_sequence = serializers.CharField()
+    input_sequence = SequenceField(allow_ambiguous=True, required=False)
+    reference_id = serializers.CharField(required=False)
+    min_length = serializers.IntegerField(min_value=0, default=0)
+    longest_only = serializers.BooleanField(default=True)
+    include_sequences = serializers.BooleanField(default=False)
+    limit = serializers.IntegerField(min_value=1, required=False)
+    offset = serializers.IntegerField(min_value=0, default=0)
+
+    def validate(self, data):
+        if ('input_sequence' in data) == ('reference_id' in data):
+            raise serializers.ValidationError("Provide exactly one of input_sequence and reference_id.")
+
+        if 'reference_id' in data:
+            reference = get_reference(data['reference_id'])
+            if reference is None:
+                raise serializers.ValidationError("Unknown reference_id.")
+            data['input_sequence'] = reference.sequence
+        return data
+
+
+class DistanceMatrixSerializer(serializers.Serializer):
+    sequences = serializers.ListField(child=SequenceField(), min_length=2, max_length=settings.MAX_MATRIX_SEQUENCES)
+    metric = serializers.ChoiceField(choices=DISTANCE_METRICS, default='edit_distance')
+    cutoff = serializers.IntegerField(min_value=0, required=False, allow_null=True, default=None)
+    output_format = serializers.ChoiceField(choices=('json', 'npy'), default='json')
 
     def validate(self, data):
-        if any(char not in {'A', 'T', 'G', 'C'} for char in data['input_sequence']):
-            raise serializers.ValidationError("Input sequence contains invalid characters. Only A, T, G, C are allowed.")
-        return data
\ No newline at end of file
+        if data['cutoff'] is not None and data['metric'] != 'edit_distance':
+            raise serializers.ValidationError("cutoff applies only to the edit_distance metric.")
+        return data
+
+class FastaORFDetectionSerializer(serializers.Serializer):
+    min_length = serializers.IntegerField(min_value=0, default=0)
+    longest_only = serializers.BooleanField(default=True)
+
+class ReferenceSerializer(serializers.Serializer):
+    sequence = SequenceField(packed=False)
+
@@ -1,3 +1,1227 @@
-from django.test import TestCase
+import cProfile
+import datetime
+import gzip
+import io
+import json
+import multiprocessing
+import operator
+import os
+import pickle
+import random
+import re
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import analysis, middleware
+from .analytics import AnalyticsRecorder, analytics_recorder
+from .async_views import AsyncAreaChartView, AsyncDistanceMatrixView, AsyncORFDetectionView, AsyncSequenceAlignmentView, AsyncVariantDetectionView, iterate_in_thread
+from .batch import batch_variant_detection
+from .benchmarks import DEFAULT_BASELINE, Inputs, compare, run_benchmarks
+from .distance_matrix import BEYOND_CUTOFF, condensed_index, distance_matrix, edit_distance_lower_bounds, qgram_profiles
+from .executor import AnalysisExecutor, batch_pool
+from .fasta import StreamingORFScanner, fasta_orfs
+from .kmer_index import get_kmer_index
+from .middleware import DecompressionError, GzipRequestStream
+from .instrumentation import Histogram, phase, reporting_progress, start_request, end_request
+from .jobs import JOB_STALE_AFTER, cancel_job, fail_stale_jobs, run_job
+from .models import AnalysisResult, DailyAnalysisCount, Job
+from .sequences import PackedSequence, as_packed
+from .result_cache import ResultCache, result_cache, result_key
+from .runners import send_result, worker_data
+from .serializers import SequenceAlignmentSerializer, SequenceField, VariantDetectionSerializer
+from .reference_store import SharedReferenceStore
+from .references import CachedReference, ReferenceCache, pack_sequence, preload_references, reference_cache, reference_hash, shared_store, unpack_sequence
+from .analysis import alignment_cigar, normalized_variants, vcf_lines
+from .analysis import GENETIC_CODE, alignment_score, alignment_scores, edit_distance, find_orfs, orf_detection, orf_page, reverse_complement, sequence_alignment, translate, variant_detection
+
+def setUpModule():
+    # Write analytics inline so view tests see them inside their transaction.
+    analytics_recorder.buffered = False
+
+def random_sequence(rng, length, alphabet='ATGC'):
+    return ''.join(rng.choice(alphabet) for _ in range(length))
+
+def mutated_copy(rng, seq, rate=0.05):
+    out = []
+    for base in seq:
+        roll = rng.random()
+        if roll < rate / 3:
+            out.append(rng.choice('ATGC'))
+        elif roll < 2 * rate / 3:
+            continue
+        elif roll < rate:
+            out.append(base + rng.choice('ATGC'))
+        else:
+            out.append(base)
+    return ''.join(out)
+
+class LinearSpaceAlignmentTests(SimpleTestCase):
+    def test_matches_full_matrix_on_random_pairs(self):
+        rng = random.Random(0)
+        with mock.patch.object(analysis, 'HIRSCHBERG_BLOCK', 4):
+            for _ in range(300):
+                seq1 = random_sequence(rng, rng.randint(0, 30), rng.choice(['AT', 'ATGC']))
+                seq2 = random_sequence(rng, rng.randint(0, 30), rng.choice(['AT', 'ATGC']))
+                for scores in [(1, -1, -2), (2, -1, -1), (0, 0, 0)]:
+                    self.assertEqual(
+                        sequence_alignment(seq1, seq2, *scores, engine='linear'),
+                        sequence_alignment(seq1, seq2, *scores, engine='full'),
+                    )
+
+    def test_auto_switches_above_threshold(self):
+        rng = random.Random(1)
+        reference = random_sequence(rng, 120)
+        sample = mutated_copy(rng, reference)
+        with mock.patch.object(analysis, 'HIRSCHBERG_THRESHOLD', 100):
+            with mock.patch.object(analysis, 'hirschberg_alignment', wraps=analysis.hirschberg_alignment) as linear:
+                self.assertEqual(sequence_alignment(reference, sample),
+                                 sequence_alignment(reference, sample, engine='full'))
+                self.assertEqual(linear.call_count, 1)
+            result = variant_detection(reference, sample)
+            result.pop('band_width')
+            self.assertEqual(result, variant_detection(reference, sample, engine='full'))
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            sequence_alignment('ATG', 'ATG', engine='quantum')
+
+class NumpyAlignmentTests(SimpleTestCase):
+    def test_matches_full_matrix_tie_breaking(self):
+        rng = random.Random(2)
+        for _ in range(300):
+            seq1 = random_sequence(rng, rng.randint(0, 30), rng.choice(['AT', 'ATGC']))
+            seq2 = random_sequence(rng, rng.randint(0, 30), rng.choice(['AT', 'ATGC']))
+            for scores in [(1, -1, -2), (2, -1, -1), (0, 0, 0)]:
+                self.assertEqual(
+                    sequence_alignment(seq1, seq2, *scores, engine='numpy'),
+                    sequence_alignment(seq1, seq2, *scores, engine='full'),
+                )
+
+    def test_mutated_copy(self):
+        rng = random.Random(3)
+        reference = random_sequence(rng, 400)
+        sample = mutated_copy(rng, reference)
+        self.assertEqual(variant_detection(reference, sample, engine='numpy'),
+                         variant_detection(reference, sample, engine='full'))
+
+class BandedAlignmentTests(SimpleTestCase):
+    def test_automatic_band_matches_full_matrix(self):
+        rng = random.Random(4)
+        for _ in range(200):
+            seq1 = random_sequence(rng, rng.randint(0, 30), rng.choice(['AT', 'ATGC']))
+            seq2 = mutated_copy(rng, seq1, rate=rng.choice([0.0, 0.1, 0.5]))
+            with mock.patch.object(analysis, 'BAND_INITIAL_WIDTH', rng.choice([1, 2])):
+                result = sequence_alignment(seq1, seq2, engine='banded')
+            self.assertIn('band_width', result)
+            result.pop('band_width')
+            self.assertEqual(result, sequence_alignment(seq1, seq2, engine='full'))
+
+    def test_fixed_band_width(self):
+        reference = 'ATGCATGCATGCATGCATGC'
+        sample = 'ATGCATGCAATGCATGCATGC'
+        result = sequence_alignment(reference, sample, engine='banded', band_width=0)
+        self.assertEqual(result['band_width'], 0)
+        self.assertEqual(result['aligned_sequence_1'].replace('-', ''), reference)
+        self.assertEqual(result['aligned_sequence_2'].replace('-', ''), sample)
+        self.assertLessEqual(result['alignment_score'], sequence_alignment(reference, sample)['alignment_score'])
+
+    def test_variant_detection_reports_band(self):
+        rng = random.Random(5)
+        reference = random_sequence(rng, 2000)
+        sample = mutated_copy(rng, reference, rate=0.005)
+        result = variant_detection(reference, sample)
+        self.assertIsNotNone(result.pop('band_width'))
+        self.assertEqual(result, variant_detection(reference, sample, engine='numpy'))
+
+def levenshtein(seq1, seq2):
+    prev = list(range(len(seq2) + 1))
+    for i, base1 in enumerate(seq1, start=1):
+        cur = [i]
+        for j, base2 in enumerate(seq2, start=1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (base1 != base2)))
+        prev = cur
+    return prev[-1]
+
+class ScoreOnlyTests(SimpleTestCase):
+    def test_edit_distance_matches_dynamic_programming(self):
+        rng = random.Random(6)
+        for _ in range(300):
+            seq1 = random_sequence(rng, rng.randint(0, 150))
+            seq2 = random_sequence(rng, rng.randint(0, 150))
+            self.assertEqual(edit_distance(seq1, seq2), levenshtein(seq1, seq2))
+
+    def test_alignment_score_matches_full_matrix(self):
+        rng = random.Random(7)
+        for _ in range(100):
+            seq1 = random_sequence(rng, rng.randint(0, 40))
+            seq2 = random_sequence(rng, rng.randint(0, 40))
+            for scores in [(1, -1, -2), (0, -1, -1), (2, -1, -1)]:
+                self.assertEqual(alignment_score(seq1, seq2, *scores),
+                                 sequence_alignment(seq1, seq2, *scores, engine='full')['alignment_score'])
+
+class SeededAlignmentTests(SimpleTestCase):
+    def test_read_placed_in_reference_coordinates(self):
+        rng = random.Random(8)
+        reference = random_sequence(rng, 20000)
+        for start in [0, 7000, 19700]:
+            read = mutated_copy(rng, reference[start:start + 300], rate=0.03)
+            result = variant_detection(reference, read, engine='seeded')
+            self.assertLessEqual(abs(result['reference_start'] - start), 10)
+            self.assertEqual(result['aligned_reference'].replace('-', ''),
+                             reference[result['reference_start']:result['reference_end']])
+            self.assertEqual(result['aligned_sample'].replace('-', ''), read)
+            for variant in result['variants']:
+                if variant['type'] == 'substitution':
+                    self.assertEqual(reference[variant['position'] - 1], variant['reference_base'])
+                elif variant['type'] == 'deletion':
+                    self.assertEqual(reference[variant['position'] - 1], variant['deleted_base'])
+
+    def test_matches_fitting_alignment_over_whole_reference(self):
+        rng = random.Random(9)
+        reference = random_sequence(rng, 3000)
+        read = mutated_copy(rng, reference[1200:1500], rate=0.05)
+        self.assertEqual(analysis.seeded_alignment(reference, read)[2],
+                         analysis.fitting_alignment(reference, read)[2])
+
+    def test_index_reused(self):
+        reference = random_sequence(random.Random(10), 500)
+        self.assertIs(get_kmer_index(reference), get_kmer_index(reference))
+        # Requests parse a new PackedSequence each time; the index follows the content.
+        self.assertIs(get_kmer_index(PackedSequence.from_string(reference)), get_kmer_index(reference))
+        self.assertIs(get_kmer_index(PackedSequence.from_string('AC' + reference)[2:]), get_kmer_index(reference))
+        self.assertIsNot(get_kmer_index(reference[:-1]), get_kmer_index(reference))
+
+    def test_index_cache_bounded_by_size(self):
+        rng = random.Random(29)
+        references = [random_sequence(rng, 1000) for _ in range(4)]
+        size = get_kmer_index(references[0]).nbytes
+        with self.settings(INDEX_CACHE_BYTES=size * 2 + size // 2):
+            indexes = [get_kmer_index(reference) for reference in references]
+            self.assertIs(get_kmer_index(references[3]), indexes[3])
+            self.assertIs(get_kmer_index(references[2]), indexes[2])
+            self.assertIsNot(get_kmer_index(references[1]), indexes[1])
+        with self.settings(INDEX_CACHE_BYTES=size - 1):
+            reference = random_sequence(rng, 1000)
+            self.assertIsNot(get_kmer_index(reference), get_kmer_index(reference))
+
+def smith_waterman_score(seq1, seq2, match=1, mismatch=-1, gap=-2):
+    prev = [0] * (len(seq2) + 1)
+    best = 0
+    for base1 in seq1:
+        cur = [0]
+        for j, base2 in enumerate(seq2, start=1):
+            cur.append(max(0, prev[j - 1] + (match if base1 == base2 else mismatch), prev[j] + gap, cur[j - 1] + gap))
+        best = max(best, max(cur))
+        prev = cur
+    return best
+
+class LocalAlignmentTests(SimpleTestCase):
+    def test_matches_smith_waterman(self):
+        rng = random.Random(26)
+        for _ in range(200):
+            seq1 = random_sequence(rng, rng.randint(0, 40), rng.choice(['AT', 'ATGC']))
+            seq2 = random_sequence(rng, rng.randint(0, 40))
+            for scores in [(1, -1, -2), (2, -1, -1)]:
+                result = sequence_alignment(seq1, seq2, *scores, engine='local')
+                self.assertEqual(result['alignment_score'], smith_waterman_score(seq1, seq2, *scores))
+                self.assertEqual(result['aligned_sequence_1'].replace('-', ''),
+                                 seq1[result['reference_start']:result['reference_end']])
+                self.assertEqual(result['aligned_sequence_2'].replace('-', ''),
+                                 seq2[result['query_start']:result['query_end']])
+                self.assertEqual(alignment_score(result['aligned_sequence_1'].replace('-', ''),
+                                                 result['aligned_sequence_2'].replace('-', ''), *scores),
+                                 result['alignment_score'])
+
+    def test_primer_found_in_long_reference(self):
+        rng = random.Random(27)
+        reference = random_sequence(rng, 50000)
+        primer = reference[31000:31025]
+        for seq1, seq2 in [(reference, primer), (as_packed(reference), 'GGGG' + primer + 'CCCC')]:
+            result = analysis.local_alignment_score(seq1, seq2)
+            self.assertEqual(result[:3], (25, 31000, 31025))
+
+    def test_no_positive_score(self):
+        self.assertEqual(analysis.local_alignment('AAAA', 'CCCC'), ('', '', 0, 0, 0, 0, 0))
+
+    def test_variants_in_reference_coordinates(self):
+        rng = random.Random(28)
+        reference = random_sequence(rng, 5000)
+        sample = random_sequence(rng, 200) + reference[2000:2100] + 'N' + reference[2101:2300] + random_sequence(rng, 200)
+        result = variant_detection(reference, sample, engine='local')
+        self.assertLessEqual(abs(result['reference_start'] - 2000), 5)
+        self.assertLessEqual(abs(result['query_start'] - 200), 5)
+        self.assertEqual(result['aligned_reference'].replace('-', ''),
+                         reference[result['reference_start']:result['reference_end']])
+        self.assertIn({'type': 'substitution', 'position': 2101, 'reference_base': reference[2100], 'sample_base': 'N'},
+                      result['variants'])
+
+class PackedSequenceTests(SimpleTestCase):
+    def test_slicing_views_and_reverse_complement(self):
+        rng = random.Random(14)
+        for _ in range(200):
+            seq = random_sequence(rng, rng.randint(0, 60), 'ACGTN')
+            packed = PackedSequence.from_string(seq)
+            start = rng.randint(0, len(seq))
+            stop = rng.randint(start, len(seq))
+            view = packed[start:stop]
+            self.assertIs(view._packed, packed._packed)
+            self.assertEqual(str(view), seq[start:stop])
+            self.assertEqual(str(view.reverse_complement()), reverse_complement(seq[start:stop]))
+            self.assertEqual(translate(view), translate(seq[start:stop]))
+
+    def test_memory_is_quarter_of_string(self):
+        seq = random_sequence(random.Random(15), 100000)
+        self.assertLessEqual(PackedSequence.from_string(seq).nbytes, len(seq) // 4 + 1)
+
+    def test_analysis_functions_accept_packed(self):
+        rng = random.Random(16)
+        reference = random_sequence(rng, 300)
+        sample = mutated_copy(rng, reference)
+        packed_reference, packed_sample = PackedSequence.from_string(reference), PackedSequence.from_string(sample)
+        for engine in ['full', 'numpy', 'linear', 'banded', 'seeded', 'local']:
+            self.assertEqual(variant_detection(packed_reference, packed_sample, engine=engine),
+                             variant_detection(reference, sample, engine=engine))
+        self.assertEqual(orf_detection(packed_reference), orf_detection(reference))
+        self.assertEqual(edit_distance(packed_reference, packed_sample), edit_distance(reference, sample))
+
+def codon_by_codon_orfs(seq):
+    orfs = []
+    for frame in range(3):
+        start = None
+        for pos in range(frame, len(seq) - 2, 3):
+            codon = seq[pos:pos + 3]
+            if start is None and codon == 'ATG':
+                start = pos
+            elif start is not None and codon in ('TAA', 'TAG', 'TGA'):
+                orfs.append((frame + 1, start, pos + 3))
+                start = None
+        if start is not None:
+            orfs.append((frame + 1, start, len(seq)))
+    return orfs
+
+class ORFScannerTests(SimpleTestCase):
+    def test_matches_codon_by_codon_scan(self):
+        rng = random.Random(17)
+        for _ in range(200):
+            seq = random_sequence(rng, rng.randint(0, 200), rng.choice(['ATGC', 'ATGA', 'ATGCTAG']))
+            for strand, strand_seq in [('+', seq), ('-', reverse_complement(seq))]:
+                orfs = find_orfs(strand_seq, strand)
+                self.assertEqual([(orf['frame'], orf['nucleotide_seq']) for orf in orfs],
+                                 [(frame, strand_seq[start:end]) for frame, start, end in codon_by_codon_orfs(strand_seq)])
+                if strand == '+':
+                    self.assertEqual([(orf['start'], orf['end']) for orf in orfs],
+                                     [(start, end) for _, start, end in codon_by_codon_orfs(strand_seq)])
+                for orf in orfs:
+                    codons = [orf['nucleotide_seq'][i:i + 3] for i in range(0, len(orf['nucleotide_seq']) - 2, 3)]
+                    self.assertEqual(orf['protein_seq'], ''.join(GENETIC_CODE[codon] for codon in codons))
+
+    def test_trailing_orf_without_stop(self):
+        self.assertEqual(find_orfs('CCATGAAACC'), [{
+            'strand': '+', 'frame': 3, 'start': 2, 'end': 10, 'length': 8,
+            'nucleotide_seq': 'ATGAAACC', 'protein_seq': 'MK'
+        }])
+
+    def test_page_matches_full_scan(self):
+        rng = random.Random(18)
+        seq = random_sequence(rng, 600)
+        for longest_only in (True, False):
+            orfs = orf_detection(seq, longest_only=longest_only)
+            for offset, limit in [(0, 5), (3, 40), (len(orfs) - 2, 10), (len(orfs) + 1, 3), (4, None)]:
+                end = None if limit is None else offset + limit
+                self.assertEqual(orf_page(seq, offset, limit, longest_only=longest_only), (len(orfs), orfs[offset:end]))
+
+    def test_page_builds_only_its_sequences(self):
+        seq = 'ATGAAATAG' * 50
+        with mock.patch('api.analysis.as_string', wraps=analysis.as_string) as as_string, \
+                mock.patch('api.analysis.reverse_complement') as reverse:
+            count, page = orf_page(seq, 2, 3)
+        self.assertEqual((count, len(page)), (50, 3))
+        self.assertEqual(as_string.call_count, 3)
+        reverse.assert_not_called()
+
+class AlignmentEngineViewTests(TestCase):
+    def test_engine_parameter(self):
+        body = {'reference_sequence': 'ATGCTAGC', 'sample_sequence': 'ATGTAGC'}
+        expected = sequence_alignment(body['reference_sequence'], body['sample_sequence'], engine='full')
+        for engine in ['auto', 'full', 'numpy', 'linear']:
+            response = self.client.post(reverse('sequence-alignment'), {**body, 'engine': engine},
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), expected)
+
+    def test_unknown_engine_rejected(self):
+        body = {'reference_sequence': 'ATGC', 'sample_sequence': 'ATGC', 'engine': 'quantum'}
+        response = self.client.post(reverse('variant-detection'), body, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_score_only(self):
+        body = {'reference_sequence': 'ATGCTAGC', 'sample_sequence': 'ATGTAGC', 'score_only': True}
+        response = self.client.post(reverse('sequence-alignment'), body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'edit_distance': 1})
+        response = self.client.post(reverse('sequence-alignment'), dict(body, metric='alignment_score'),
+                                    content_type='application/json')
+        self.assertEqual(response.json(), {
+            'alignment_score': sequence_alignment('ATGCTAGC', 'ATGTAGC')['alignment_score']
+        })
+
+class ReferenceRegistryTests(TestCase):
+    def setUp(self):
+        reference_cache.clear()
+
+    def test_pack_round_trip(self):
+        rng = random.Random(11)
+        for length in [0, 1, 3, 4, 5, 1001]:
+            sequence = random_sequence(rng, length)
+            packed = pack_sequence(sequence)
+            self.assertEqual(len(packed), (length + 3) // 4)
+            self.assertEqual(unpack_sequence(packed, length), sequence)
+
+    def test_cache_evicts_by_size(self):
+        rng = random.Random(12)
+        entries = [CachedReference(str(i), PackedSequence.from_string(random_sequence(rng, 1000))) for i in range(3)]
+        cache = ReferenceCache(max_bytes=entries[0].nbytes * 2)
+        for entry in entries:
+            cache.put(entry)
+        self.assertIsNone(cache.get('0'))
+        self.assertIs(cache.get('2'), entries[2])
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+
+    def test_upload_and_use_reference_id(self):
+        rng = random.Random(13)
+        reference = random_sequence(rng, 3000)
+        sample = mutated_copy(rng, reference[1000:1300], rate=0.02)
+
+        response = self.client.post(reverse('references'), {'sequence': reference}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        reference_id = response.json()['reference_id']
+        response = self.client.post(reverse('references'), {'sequence': reference}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['reference_id'], reference_id)
+
+        reference_cache.clear()
+        for engine in ['auto', 'seeded']:
+            inline = self.client.post(reverse('variant-detection'),
+                                      {'reference_sequence': reference, 'sample_sequence': sample, 'engine': engine},
+                                      content_type='application/json')
+            stored = self.client.post(reverse('variant-detection'),
+                                      {'reference_id': reference_id, 'sample_sequence': sample, 'engine': engine},
+                                      content_type='application/json')
+            self.assertEqual(stored.status_code, 200)
+            self.assertEqual(stored.json(), inline.json())
+
+    def test_reference_arguments_validated(self):
+        for body in [{'sample_sequence': 'ATGC'},
+                     {'reference_sequence': 'ATGC', 'reference_id': 'abc', 'sample_sequence': 'ATGC'},
+                     {'reference_id': 'missing', 'sample_sequence': 'ATGC'}]:
+            response = self.client.post(reverse('sequence-alignment'), body, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+class SharedReferenceStoreTests(TestCase):
+    def setUp(self):
+        reference_cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.rng = random.Random(14)
+
+    def test_mapped_reference_matches_and_pickles_by_path(self):
+        sequence = PackedSequence.from_string(random_sequence(self.rng, 2000) + 'NN' + random_sequence(self.rng, 500))
+        index = get_kmer_index(sequence)
+        reference_id = reference_hash(str(sequence))
+        store = SharedReferenceStore(self.directory)
+        store.write(reference_id, sequence, index)
+        store.write(reference_id, sequence, index)
+
+        mapped, mapped_index = store.acquire(reference_id)
+        self.assertEqual(str(mapped), str(sequence))
+        self.assertFalse(mapped_index.codes.flags.writeable)
+        np.testing.assert_array_equal(mapped_index.positions, index.positions)
+        self.assertLess(len(pickle.dumps((mapped, mapped_index))), 1000)
+        copied, _ = pickle.loads(pickle.dumps((mapped, mapped_index)))
+        self.assertEqual(str(copied), str(sequence))
+        store.release(reference_id)
+
+    def test_only_unheld_references_are_removed(self):
+        ids = []
+        store = SharedReferenceStore(self.directory)
+        for _ in range(3):
+            sequence = PackedSequence.from_string(random_sequence(self.rng, 100))
+            ids.append(reference_hash(str(sequence)))
+            store.write(ids[-1], sequence, get_kmer_index(sequence))
+        store.acquire(ids[0])
+        store.acquire(ids[0])
+        store.release(ids[0])
+
+        other_process = SharedReferenceStore(self.directory)
+        self.assertEqual(other_process.remove_unused(keep={ids[1]}), [ids[2]])
+        store.release(ids[0])
+        self.assertEqual(other_process.remove_unused(), sorted(ids[:2]))
+        self.assertIsNone(store.acquire(ids[0]))
+
+    def test_index_sent_to_workers_only_when_mapped(self):
+        reference = random_sequence(self.rng, 3000)
+        for directory in ['', self.directory]:
+            with self.settings(REFERENCE_STORE_DIR=directory):
+                reference_id = self.client.post(reverse('references'), {'sequence': reference},
+                                                content_type='application/json').json()['reference_id']
+                for engine in ['auto', 'seeded']:
+                    serializer = SequenceAlignmentSerializer(data={'reference_id': reference_id, 'sample_sequence': 'ACGT',
+                                                                   'engine': engine})
+                    self.assertTrue(serializer.is_valid())
+                    self.assertEqual('reference_index' in serializer.validated_data, engine == 'seeded')
+                    self.assertEqual('reference_index' in worker_data(serializer.validated_data),
+                                     engine == 'seeded' and bool(directory))
+                    self.assertLess(len(pickle.dumps(worker_data(serializer.validated_data))), 2000)
+                reference_cache.clear()
+
+    def test_views_use_the_store(self):
+        reference = random_sequence(self.rng, 3000)
+        sample = mutated_copy(self.rng, reference[500:900], rate=0.02)
+        with self.settings(REFERENCE_STORE_DIR=self.directory):
+            reference_id = self.client.post(reverse('references'), {'sequence': reference},
+                                            content_type='application/json').json()['reference_id']
+            self.assertEqual(shared_store().held(), {reference_id: 1})
+            reference_cache.clear()
+            self.assertEqual(shared_store().held(), {})
+            self.assertEqual(preload_references([reference_id, 'unknown']), [reference_id])
+
+            inline = self.client.post(reverse('variant-detection'), {'reference_sequence': reference, 'sample_sequence': sample,
+                                                                     'engine': 'seeded'}, content_type='application/json')
+            stored = self.client.post(reverse('variant-detection'), {'reference_id': reference_id, 'sample_sequence': sample,
+                                                                     'engine': 'seeded'}, content_type='application/json')
+            self.assertEqual(stored.json(), inline.json())
+            orfs = self.client.post(reverse('orf-detection'), {'reference_id': reference_id}, content_type='application/json')
+            self.assertEqual(orfs.json(), self.client.post(reverse('orf-detection'), {'input_sequence': reference},
+                                                           content_type='application/json').json())
+            reference_cache.clear()
+
+class DistanceMatrixTests(SimpleTestCase):
+    def setUp(self):
+        rng = random.Random(15)
+        base = random_sequence(rng, 40)
+        self.sequences = [mutated_copy(rng, base, rate=rng.choice([0.05, 0.3])) for _ in range(9)] + ['', 'NNACGT']
+
+    def test_matches_pairwise_scores(self):
+        n = len(self.sequences)
+        for metric, score in (('edit_distance', edit_distance), ('alignment_score', alignment_score)):
+            expected = [score(self.sequences[i], self.sequences[j]) for i in range(n) for j in range(i + 1, n)]
+            self.assertEqual(distance_matrix(self.sequences, metric=metric, workers=1, tile_size=3).tolist(), expected)
+            self.assertEqual(distance_matrix(self.sequences, metric=metric, workers=2, tile_size=4).tolist(), expected)
+        self.assertEqual([condensed_index(4, i, j) for i in range(4) for j in range(i + 1, 4)], list(range(6)))
+        self.assertEqual(alignment_scores(self.sequences[0], []).tolist(), [])
+
+    def test_cutoff(self):
+        n = len(self.sequences)
+        distances = [edit_distance(self.sequences[i], self.sequences[j]) for i in range(n) for j in range(i + 1, n)]
+        lengths = np.array([len(sequence) for sequence in self.sequences])
+        blocks = (lengths, qgram_profiles(self.sequences))
+        bounds = edit_distance_lower_bounds(blocks, blocks)
+        self.assertTrue(all(bounds[i, j] <= distances[condensed_index(n, i, j)] for i in range(n) for j in range(i + 1, n)))
+        for cutoff in (0, 5, 15):
+            self.assertEqual(distance_matrix(self.sequences, cutoff=cutoff, workers=1, tile_size=5).tolist(),
+                             [distance if distance <= cutoff else BEYOND_CUTOFF for distance in distances])
+            self.assertEqual([edit_distance(self.sequences[0], other, max_distance=cutoff) for other in self.sequences],
+                             [d if d <= cutoff else None for d in (edit_distance(self.sequences[0], other) for other in self.sequences)])
+
+    def test_concurrent_in_process_matrices(self):
+        rng = random.Random(16)
+        inputs = [[random_sequence(rng, 200) for _ in range(16)] for _ in range(4)]
+        expected = [distance_matrix(sequences, workers=1).tolist() for sequences in inputs]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda sequences: distance_matrix(sequences, workers=1, tile_size=4).tolist(), inputs))
+        self.assertEqual(results, expected)
+
+class DistanceMatrixViewTests(TestCase):
+    sequences = ['ACGTACGT', 'ACGTTCGT', 'TTTTGGGG', 'ACGACGT']
+
+    def test_json_and_npy_output(self):
+        response = self.client.post(reverse('distance-matrix'), {'sequences': self.sequences, 'cutoff': 2},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        expected = [edit_distance(a, b) for i, a in enumerate(self.sequences) for b in self.sequences[i + 1:]]
+        self.assertEqual(response.json(), {'size': 4, 'metric': 'edit_distance', 'cutoff': 2,
+                                           'condensed': [d if d <= 2 else None for d in expected]})
+
+        response = self.client.post(reverse('distance-matrix'), {'sequences': self.sequences, 'metric': 'alignment_score',
+                                                                 'output_format': 'npy'}, content_type='application/json')
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        matrix = np.load(io.BytesIO(response.content))
+        self.assertEqual(matrix.tolist(), [alignment_score(a, b) for i, a in enumerate(self.sequences) for b in self.sequences[i + 1:]])
+        # One analysis per request, however many pairs it scored
+        self.assertEqual(DailyAnalysisCount.objects.get().count, 2)
+        self.assertEqual(AnalysisResult.objects.count(), 2)
+
+    def test_validation(self):
+        for body in [{'sequences': ['ACGT']},
+                     {'sequences': self.sequences, 'metric': 'alignment_score', 'cutoff': 3},
+                     {'sequences': ['ACGT', 'ACXT']}]:
+            response = self.client.post(reverse('distance-matrix'), body, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+class ORFDetectionViewTests(TestCase):
+    def post(self, **body):
+        return self.client.post(reverse('orf-detection'), {'input_sequence': 'ATGATGAAATAGCCATGCCCTGA', **body},
+                                content_type='application/json')
+
+    def test_coordinates_only_by_default(self):
+        response = self.post()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), orf_detection('ATGATGAAATAGCCATGCCCTGA', include_sequences=False))
+        self.assertEqual(self.post(include_sequences=True).json(), orf_detection('ATGATGAAATAGCCATGCCCTGA'))
+
+    def test_filters_and_pagination(self):
+        all_orfs = orf_detection('ATGATGAAATAGCCATGCCCTGA', longest_only=False, include_sequences=False)
+        self.assertEqual(len(all_orfs), 4)
+        self.assertEqual(self.post(longest_only=False, min_length=10).json(),
+                         [orf for orf in all_orfs if orf['length'] >= 10])
+        self.assertEqual(self.post(longest_only=False, limit=1, offset=1).json(),
+                         {'count': 4, 'offset': 1, 'limit': 1, 'results': all_orfs[1:2]})
+        self.assertEqual(self.post(limit=5, offset=10).json()['results'], [])
+
+class StreamingFastaTests(SimpleTestCase):
+    def test_scanner_matches_orf_detection_across_chunk_boundaries(self):
+        rng = random.Random(18)
+        for _ in range(300):
+            seq = random_sequence(rng, rng.randint(0, 200), rng.choice(['ATGC', 'ATGCN', 'ATGTAA', 'CATTTA']))
+            longest_only = rng.random() < 0.5
+            scanner = StreamingORFScanner(min_length=rng.choice([0, 12]), longest_only=longest_only)
+            codes = as_packed(seq).codes()
+            pos = 0
+            while pos < len(codes):
+                size = rng.randint(1, 8)
+                scanner.feed(codes[pos:pos + size])
+                pos += size
+            self.assertEqual(scanner.finish(), orf_detection(seq, min_length=scanner.min_length,
+                                                             longest_only=longest_only, include_sequences=False))
+
+    def test_multi_fasta_records(self):
+        rng = random.Random(19)
+        records = [(f'seq{i} sample', random_sequence(rng, rng.randint(0, 300))) for i in range(10)]
+        text = ''.join(f'>{header}\r\n' + '\n'.join(seq[i:i + 60] for i in range(0, len(seq), 60)) + '\n'
+                       for header, seq in records).encode()
+        for size in [1, 5, 64, len(text)]:
+            parsed = list(fasta_orfs(text[i:i + size] for i in range(0, len(text), size)))
+            self.assertEqual([(record['id'], record['length'], record['orfs']) for record in parsed],
+                             [(header.split()[0], len(seq), orf_detection(seq, include_sequences=False))
+                              for header, seq in records])
+
+class FastaORFDetectionViewTests(TestCase):
+    fasta = b'>one\nATGAAATAGCC\nATGCCC\n>two\nCCCTTACAT\n'
+
+    def test_raw_upload(self):
+        response = self.client.post(reverse('orf-detection-fasta'), self.fasta, content_type='text/x-fasta')
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([line['id'] for line in lines], ['one', 'two'])
+        self.assertEqual(lines[0]['orfs'], orf_detection('ATGAAATAGCCATGCCC', include_sequences=False))
+
+    def test_multipart_upload(self):
+        upload = SimpleUploadedFile('reads.fasta', self.fasta)
+        response = self.client.post(reverse('orf-detection-fasta') + '?min_length=10', {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(lines[1]['orfs'], orf_detection('CCCTTACAT', min_length=10, include_sequences=False))
+
+    def test_missing_data_rejected(self):
+        response = self.client.post(reverse('orf-detection-fasta'), b'', content_type='text/x-fasta')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.generic('POST', reverse('orf-detection-fasta'), self.fasta, content_type='text/x-fasta',
+                                       CONTENT_LENGTH='')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('orf-detection-fasta'), {'file': SimpleUploadedFile('empty.fasta', b'')})
+        self.assertEqual(response.status_code, 400)
+
+class BatchVariantDetectionTests(SimpleTestCase):
+    def test_pool_matches_single_sample_in_order(self):
+        rng = random.Random(20)
+        reference = random_sequence(rng, 400)
+        samples = [mutated_copy(rng, reference, rng.choice([0.0, 0.02, 0.1])) for _ in range(12)]
+        expected = [variant_detection(reference, sample) for sample in samples]
+        self.assertEqual(list(batch_variant_detection(reference, samples, workers=1)), expected)
+        self.assertEqual(list(batch_variant_detection(reference, samples, workers=3)), expected)
+        # Later batches, and distance matrices, reuse the same worker processes
+        executor = batch_pool._executor
+        self.assertEqual(list(batch_variant_detection(reference, samples[:4], workers=2)), expected[:4])
+        distance_matrix(samples, workers=2, tile_size=4)
+        self.assertIs(batch_pool._executor, executor)
+
+class BatchVariantDetectionViewTests(TestCase):
+    def test_streams_results_and_logs_each_sample(self):
+        samples = ['ATGCTAGC', 'ATGCAGC', 'ATGGCTAGC']
+        with self.settings(BATCH_WORKERS=1):
+            response = self.client.post(reverse('variant-detection-batch'),
+                                        {'reference_sequence': 'ATGCTAGC', 'sample_sequences': samples},
+                                        content_type='application/json')
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(lines, [variant_detection('ATGCTAGC', sample) for sample in samples])
+        self.assertEqual(AnalysisResult.objects.filter(analysis_type='variant_detection').count(), 3)
+
+    def test_rejects_invalid_sample(self):
+        response = self.client.post(reverse('variant-detection-batch'),
+                                    {'reference_sequence': 'ATGC', 'sample_sequences': ['ATGC', 'ATXC']},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+class JobTests(TestCase):
+    def test_async_request_runs_as_job(self):
+        body = {'reference_sequence': 'ATGCTAGCTA', 'sample_sequence': 'ATGCAGCTTA'}
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse('sequence-alignment') + '?async=true', body, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(callbacks), 1)
+        job_id = response.data['job_id']
+        self.assertEqual(self.client.get(reverse('job', args=[job_id])).data['status'], 'queued')
+
+        self.assertTrue(run_job(job_id))
+        polled = self.client.get(reverse('job', args=[job_id])).data
+        self.assertEqual(polled['status'], 'succeeded')
+        self.assertEqual(polled['progress'], 1.0)
+        self.assertEqual(polled['result'], self.client.post(reverse('sequence-alignment'), body, content_type='application/json').data)
+        self.assertEqual(self.client.post(reverse('job-cancel', args=[job_id])).status_code, 409)
+
+    def test_cancelled_job_does_not_run(self):
+        job = Job.objects.create(analysis_type='orf_detection', params={'input_sequence': 'ATGAAATAG'})
+        response = self.client.post(reverse('job-cancel', args=[job.id]))
+        self.assertEqual(response.data['status'], 'cancelled')
+        self.assertFalse(cancel_job(job.id))
+        self.assertFalse(run_job(job.id))
+
+    def test_failed_analysis_is_reported(self):
+        job = Job.objects.create(analysis_type='variant_detection',
+                                 params={'reference_sequence': 'ATGC', 'sample_sequence': 'ATGC', 'engine': 'seeded'})
+        # The analysis is pickled to a forkserver child, so it cannot be a lambda.
+        failing = operator.itemgetter('missing')
+        with mock.patch.dict('api.jobs.ANALYSES', {'variant_detection': (VariantDetectionSerializer, failing)}):
+            run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('KeyError', job.error)
+
+    def test_engines_report_progress(self):
+        rng = random.Random(12)
+        reference = random_sequence(rng, 3000)
+        sample = mutated_copy(rng, reference)
+        for engine in ('numpy', 'banded', 'linear', 'local'):
+            fractions = []
+            with reporting_progress(fractions.append):
+                sequence_alignment(reference, sample, engine=engine)
+            self.assertTrue(fractions, engine)
+            self.assertTrue(all(0 < fraction <= 1 for fraction in fractions), engine)
+        fractions = []
+        with reporting_progress(fractions.append):
+            orf_detection(reference)
+        self.assertEqual(fractions, [frame / 6 for frame in range(6)])
+
+    def test_progress_is_sent_before_result(self):
+        rng = random.Random(13)
+        data = {'seq1': random_sequence(rng, 3000), 'seq2': random_sequence(rng, 2500)}
+        parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+        with mock.patch('api.runners.PROGRESS_INTERVAL', 0):
+            send_result(child_conn, lambda data: sequence_alignment(**data, engine='numpy')['alignment_score'], data)
+        messages = []
+        with self.assertRaises(EOFError):
+            while True:
+                messages.append(parent_conn.recv())
+        self.assertEqual(messages[-1], ('succeeded', sequence_alignment(**data, engine='numpy')['alignment_score']))
+        fractions = [payload for status, payload in messages[:-1]]
+        self.assertEqual({status for status, payload in messages[:-1]}, {'progress'})
+        self.assertEqual(fractions, sorted(fractions))
+        self.assertEqual(len(fractions), 3000 // 1024)
+
+    def test_stale_running_jobs_fail(self):
+        now = timezone.now()
+        stale = Job.objects.create(analysis_type='orf_detection', params={}, status='running', started_at=now,
+                                   heartbeat_at=now - datetime.timedelta(seconds=JOB_STALE_AFTER + 1))
+        alive = Job.objects.create(analysis_type='orf_detection', params={}, status='running', started_at=now, heartbeat_at=now)
+        self.assertEqual(fail_stale_jobs(), 1)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'failed')
+        self.assertIsNotNone(stale.finished_at)
+        self.assertEqual(Job.objects.get(id=alive.id).status, 'running')
+
+class ResultCacheTests(TestCase):
+    def setUp(self):
+        result_cache.clear()
+
+    def test_views_serve_hits_without_computing(self):
+        body = {'reference_sequence': 'ATGCTAGCTA', 'sample_sequence': 'ATGCAGCTTA'}
+        first = self.client.post(reverse('variant-detection'), body, content_type='application/json')
+        with mock.patch('api.views.run_variant_detection') as run:
+            second = self.client.post(reverse('variant-detection'), body, content_type='application/json')
+        run.assert_not_called()
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(AnalysisResult.objects.count(), 2)
+        self.assertEqual((result_cache.hits, result_cache.misses), (1, 1))
+
+    def test_key_covers_inputs_and_parameters(self):
+        reference = 'ATGCATGCAA'
+        reference_id = self.client.post(reverse('references'), {'sequence': reference}).data['reference_id']
+        data = {'reference_sequence': reference, 'sample_sequence': 'ATGC', 'engine': 'auto', 'band_width': None}
+        by_id = dict(data, reference_id=reference_id, reference_sequence=PackedSequence.from_string(reference))
+        self.assertEqual(result_key('variant_detection', data), result_key('variant_detection', by_id))
+        self.assertNotEqual(result_key('variant_detection', data), result_key('sequence_alignment', data))
+        self.assertNotEqual(result_key('variant_detection', data), result_key('variant_detection', dict(data, engine='seeded')))
+
+    def test_evicts_least_recently_used_by_size(self):
+        cache = ResultCache(max_bytes=45)
+        for key in 'abc':
+            cache.put(key, 'orf_detection', [key * 10])
+        cache.get('a')
+        cache.put('d', 'orf_detection', ['d' * 10])
+        self.assertLessEqual(cache.nbytes, 45)
+        self.assertEqual(cache.get('a'), ['a' * 10])
+        self.assertIsNone(cache.get('b'))
+
+    def test_database_tier(self):
+        ResultCache(max_bytes=1024, use_db=True).put('k', 'orf_detection', [{'start': 1}])
+        cache = ResultCache(max_bytes=1024, use_db=True)
+        self.assertEqual(cache.get('k'), [{'start': 1}])
+        self.assertEqual(cache.get('k'), [{'start': 1}])
+        self.assertEqual(cache.stats()['db_hits'], 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+class AnalyticsRollupTests(TestCase):
+    def test_recording_updates_rollup(self):
+        self.client.post(reverse('orf-detection'), {'input_sequence': 'ATGAAATAG'}, content_type='application/json')
+        self.client.post(reverse('orf-detection'), {'input_sequence': 'ATGCCCTAG'}, content_type='application/json')
+        self.client.post(reverse('variant-detection-batch'),
+                         {'reference_sequence': 'ATGC', 'sample_sequences': ['ATGC', 'ATCC', 'AGC']},
+                         content_type='application/json')
+        radar = self.client.get(reverse('radarchart')).data
+        self.assertEqual(radar, [{'analysis_type': 'orf_detection', 'analysis_count': 2},
+                                 {'analysis_type': 'variant_detection', 'analysis_count': 3}])
+
+    def test_backfill_and_date_range(self):
+        for day, analysis_type in [(1, 'orf_detection'), (1, 'orf_detection'), (2, 'sequence_alignment'), (3, 'orf_detection')]:
+            result = AnalysisResult.objects.create(analysis_type=analysis_type)
+            created_at = datetime.datetime(2024, 5, day, 12, tzinfo=datetime.timezone.utc)
+            AnalysisResult.objects.filter(id=result.id).update(created_at=created_at)
+        call_command('backfill_analytics', stdout=io.StringIO())
+        self.assertEqual(DailyAnalysisCount.objects.count(), 3)
+
+        area = self.client.get(reverse('areachart'), {'start': '2024-05-01', 'end': '2024-05-02'}).data
+        self.assertEqual(area, [
+            {'date': '2024-05-01', 'analysis': [{'analysis_type': 'orf_detection', 'analysis_count': 2}]},
+            {'date': '2024-05-02', 'analysis': [{'analysis_type': 'sequence_alignment', 'analysis_count': 1}]}
+        ])
+        radar = self.client.get(reverse('radarchart'), {'start': '2024-05-02'}).data
+        self.assertEqual(radar, [{'analysis_type': 'orf_detection', 'analysis_count': 1},
+                                 {'analysis_type': 'sequence_alignment', 'analysis_count': 1}])
+        self.assertEqual(self.client.get(reverse('radarchart'), {'start': '2024-05-03', 'end': '2024-05-01'}).status_code, 400)
+
+class AnalyticsRecorderTests(TestCase):
+    def test_buffers_until_flush(self):
+        recorder = AnalyticsRecorder(max_queue=3, flush_size=100, flush_interval=3600)
+        recorder.record('orf_detection')
+        recorder.record('variant_detection', count=2)
+        recorder.record('orf_detection')
+        recorder.record('orf_detection')
+        self.assertEqual(AnalysisResult.objects.count(), 0)
+        self.assertEqual(recorder.dropped, 1)
+
+        recorder.flush()
+        recorder.close()
+        self.assertEqual(AnalysisResult.objects.filter(analysis_type='orf_detection').count(), 2)
+        self.assertEqual(AnalysisResult.objects.filter(analysis_type='variant_detection').count(), 2)
+        self.assertEqual(sorted(DailyAnalysisCount.objects.values_list('analysis_type', 'count')),
+                         [('orf_detection', 2), ('variant_detection', 2)])
+
+    def test_failed_write_is_counted(self):
+        recorder = AnalyticsRecorder(max_queue=10, flush_size=10, flush_interval=3600, buffered=False)
+        recorder._queue.put(('orf_detection', None, 3))
+        with self.assertLogs('api.analytics', 'ERROR'):
+            recorder.flush()
+        self.assertEqual(recorder.failed, 3)
+
+class SequenceFieldTests(SimpleTestCase):
+    def test_normalizes_case_and_whitespace(self):
+        value = SequenceField().run_validation('acgt\r\nACGT  tt\n')
+        self.assertIsInstance(value, PackedSequence)
+        self.assertEqual(str(value), 'ACGTACGTTT')
+        self.assertEqual(SequenceField(packed=False).run_validation('ac gt'), 'ACGT')
+
+    def test_rejects_characters_outside_the_alphabet(self):
+        for field, value in [(SequenceField(), 'ACGN'), (SequenceField(), 'ACGé'),
+                             (SequenceField(allow_lowercase=False), 'acgt'),
+                             (SequenceField(allow_whitespace=False), 'AC GT'),
+                             (SequenceField(allow_ambiguous=True), 'ACGX'), (SequenceField(), '\n\n')]:
+            with self.assertRaises(serializers.ValidationError):
+                field.run_validation(value)
+
+    def test_ambiguity_codes_become_n(self):
+        value = SequenceField(allow_ambiguous=True).run_validation('ACRYNkt')
+        self.assertEqual(str(value), 'ACNNNNT')
+
+    def test_rejects_oversized_input(self):
+        with self.settings(MAX_SEQUENCE_LENGTH=8):
+            field = SequenceField()
+        field.run_validation('ACGTACGT')
+        with self.assertRaises(serializers.ValidationError) as raised:
+            field.run_validation('ACGTACGTA')
+        self.assertEqual(raised.exception.detail[0].code, 'too_long')
+
+class CompressionTests(TestCase):
+    body = {'input_sequence': 'ATGAAACCCGGGTTTTAG' * 200, 'include_sequences': True}
+
+    def test_gzip_request_body(self):
+        plain = self.client.post(reverse('orf-detection'), self.body, content_type='application/json')
+        compressed = self.client.post(reverse('orf-detection'), gzip.compress(json.dumps(self.body).encode()),
+                                      content_type='application/json', headers={'Content-Encoding': 'gzip'})
+        self.assertEqual(compressed.status_code, 200)
+        self.assertEqual(compressed.json(), plain.json())
+
+    def test_decompressed_size_limit(self):
+        data = gzip.compress(json.dumps(self.body).encode())
+        with self.settings(MAX_DECOMPRESSED_REQUEST_BYTES=1024):
+            response = self.client.post(reverse('orf-detection'), data, content_type='application/json',
+                                        headers={'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 413)
+        response = self.client.post(reverse('orf-detection'), data[:-10], content_type='application/json',
+                                    headers={'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_gzip_fasta_inflated_as_read(self):
+        fasta = b'>one\nATGAAATAGCC\nATGCCC\n>two\nCCCTTACAT\n'
+        plain = self.client.post(reverse('orf-detection-fasta'), fasta, content_type='text/x-fasta')
+        compressed = self.client.post(reverse('orf-detection-fasta'), gzip.compress(fasta), content_type='text/x-fasta',
+                                      headers={'Content-Encoding': 'gzip'})
+        self.assertEqual(compressed.status_code, 200)
+        self.assertEqual(b''.join(compressed.streaming_content), b''.join(plain.streaming_content))
+        response = self.client.post(reverse('orf-detection-fasta'), b'not gzip', content_type='text/x-fasta',
+                                    headers={'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 400)
+
+        stream = GzipRequestStream(io.BytesIO(gzip.compress(b'A' * 10_000_000)), limit=20_000_000)
+        self.assertEqual(stream.read(1000), b'A' * 1000)
+        self.assertLess(stream.inflated, 100_000)
+        self.assertEqual(len(stream.read()), 10_000_000 - 1000)
+        with self.assertRaises(DecompressionError):
+            GzipRequestStream(io.BytesIO(gzip.compress(b'A' * 10_000)), limit=5000).read()
+
+    def test_response_compressed_by_size(self):
+        large = self.client.post(reverse('orf-detection'), self.body, content_type='application/json',
+                                 headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(large['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(large.content)), self.client.post(
+            reverse('orf-detection'), self.body, content_type='application/json').json())
+        small = self.client.post(reverse('orf-detection'), {'input_sequence': 'ATGTAG'}, content_type='application/json',
+                                 headers={'Accept-Encoding': 'gzip'})
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+    def test_streaming_response_flushed_per_item(self):
+        samples = ['ATGCTAGC', 'ATGCAGC', 'ATGGCTAGC']
+        with self.settings(BATCH_WORKERS=1):
+            response = self.client.post(reverse('variant-detection-batch'),
+                                        {'reference_sequence': 'ATGCTAGC', 'sample_sequences': samples},
+                                        content_type='application/json', headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            chunks = list(response.streaming_content)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        # Each chunk inflates to whole records without waiting for the end of the stream.
+        for chunk, sample in zip(chunks, samples):
+            self.assertEqual(json.loads(decompressor.decompress(chunk)), variant_detection('ATGCTAGC', sample))
+        self.assertEqual(b''.join(decompressor.decompress(chunk) for chunk in chunks[len(samples):]), b'')
+        self.assertTrue(decompressor.eof)
+
+def apply_variants(reference, variants):
+    pieces, next_base = [], 0
+    for variant in variants:
+        position = variant['position']
+        if variant['type'] == 'substitution':
+            pieces += [reference[next_base:position - 1], variant['sample_base']]
+            next_base = position
+        elif variant['type'] == 'insertion':
+            pieces += [reference[next_base:position], variant['inserted_bases']]
+            next_base = position
+        else:
+            pieces.append(reference[next_base:position - 1])
+            next_base = position - 1 + len(variant['deleted_bases'])
+    return ''.join(pieces) + reference[next_base:]
+
+class NormalizedVariantTests(SimpleTestCase):
+    def test_merges_and_left_normalizes_indels(self):
+        self.assertEqual(list(normalized_variants('ACGTTTTACG', 'ACG---TACG')),
+                         [{'type': 'deletion', 'position': 4, 'deleted_bases': 'TTT'}])
+        self.assertEqual(list(normalized_variants('ACG---TACG', 'ACGTTTTACG')),
+                         [{'type': 'insertion', 'position': 3, 'inserted_bases': 'TTT'}])
+        self.assertEqual(list(normalized_variants('ACGTA', 'ACCTA', reference_start=100)),
+                         [{'type': 'substitution', 'position': 103, 'reference_base': 'G', 'sample_base': 'C'}])
+
+    def test_variants_reproduce_sample(self):
+        rng = random.Random(21)
+        for _ in range(300):
+            reference = random_sequence(rng, rng.randint(1, 80), rng.choice(['AC', 'ACGT']))
+            sample = mutated_copy(rng, reference, 0.1) or 'A'
+            result = variant_detection(reference, sample, normalize=True)
+            variants = result['variants']
+            self.assertEqual(apply_variants(reference, variants), sample)
+            self.assertEqual([variant['position'] for variant in variants],
+                             sorted(variant['position'] for variant in variants))
+
+    def test_vcf_anchors_indels(self):
+        lines = list(vcf_lines(normalized_variants('AACGTTTTACG', '--CGTTT-ACG'), 'AACGTTTTACG'))
+        self.assertEqual(lines[0], '##fileformat=VCFv4.2\n')
+        self.assertEqual([line.split('\t')[1:5] for line in lines[3:]],
+                         [['1', '.', 'AAC', 'C'], ['4', '.', 'GT', 'G']])
+
+class VariantOutputFormatTests(TestCase):
+    body = {'reference_sequence': 'ACGTTTTACGGA', 'sample_sequence': 'ACGTACGCA'}
+
+    def test_ndjson(self):
+        response = self.client.post(reverse('variant-detection'), dict(self.body, output_format='ndjson'),
+                                    content_type='application/json')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        normalized = self.client.post(reverse('variant-detection'), dict(self.body, normalize=True),
+                                      content_type='application/json').json()
+        self.assertEqual(lines, normalized['variants'])
+        self.assertEqual(apply_variants(self.body['reference_sequence'], lines), self.body['sample_sequence'])
+
+    def test_vcf(self):
+        response = self.client.post(reverse('variant-detection'), dict(self.body, output_format='vcf'),
+                                    content_type='application/json')
+        self.assertEqual(response['Content-Type'], 'text/vcf')
+        text = b''.join(response.streaming_content).decode()
+        self.assertIn('##contig=<ID=reference,length=12>', text)
+        self.assertTrue(all(line.startswith('reference\t') for line in text.splitlines()[3:]))
+
+def expand_cigar(cigar, seq1, seq2):
+    aligned_seq1, aligned_seq2, i, j = [], [], 0, 0
+    for length, op in re.findall(r'(\d+)([=XID])', cigar):
+        length = int(length)
+        if op in '=X':
+            aligned_seq1.append(seq1[i:i + length])
+            aligned_seq2.append(seq2[j:j + length])
+            i, j = i + length, j + length
+        elif op == 'D':
+            aligned_seq1.append(seq1[i:i + length])
+            aligned_seq2.append('-' * length)
+            i += length
+        else:
+            aligned_seq1.append('-' * length)
+            aligned_seq2.append(seq2[j:j + length])
+            j += length
+    return ''.join(aligned_seq1), ''.join(aligned_seq2)
+
+class CigarOutputTests(TestCase):
+    def test_cigar_round_trips(self):
+        self.assertEqual(alignment_cigar('ACG--TAC', 'ACCAAT-C'), '2=1X2I1=1D1=')
+        self.assertEqual(alignment_cigar('', ''), '')
+        rng = random.Random(22)
+        for _ in range(100):
+            seq1 = random_sequence(rng, rng.randint(1, 60))
+            seq2 = mutated_copy(rng, seq1, 0.2) or 'A'
+            alignment = sequence_alignment(seq1, seq2)
+            self.assertEqual(expand_cigar(alignment_cigar(alignment['aligned_sequence_1'], alignment['aligned_sequence_2']), seq1, seq2),
+                             (alignment['aligned_sequence_1'], alignment['aligned_sequence_2']))
+
+    def test_view_output_formats(self):
+        body = {'reference_sequence': 'ACGTTAGCAT', 'sample_sequence': 'ACTTAGGCAT'}
+        gapped = self.client.post(reverse('sequence-alignment'), body, content_type='application/json').json()
+        cigar = self.client.post(reverse('sequence-alignment'), dict(body, output_format='cigar'),
+                                 content_type='application/json').json()
+        self.assertNotIn('aligned_sequence_1', cigar)
+        self.assertEqual(cigar['alignment_score'], gapped['alignment_score'])
+        self.assertEqual((cigar['reference_start'], cigar['reference_end'], cigar['query_start'], cigar['query_end']), (0, 10, 0, 10))
+        self.assertEqual(expand_cigar(cigar['cigar'], body['reference_sequence'], body['sample_sequence']),
+                         (gapped['aligned_sequence_1'], gapped['aligned_sequence_2']))
+        both = self.client.post(reverse('sequence-alignment'), dict(body, output_format='both'),
+                                content_type='application/json').json()
+        self.assertEqual(both['aligned_sequence_1'], gapped['aligned_sequence_1'])
+        self.assertEqual(both['cigar'], cigar['cigar'])
+
+    def test_local_engine_coordinates(self):
+        body = {'reference_sequence': 'TTTTTTACGTACGTTTTTTT', 'sample_sequence': 'GGACGTACGGG',
+                'engine': 'local', 'output_format': 'cigar'}
+        result = self.client.post(reverse('sequence-alignment'), body, content_type='application/json').json()
+        self.assertEqual((result['alignment_score'], result['cigar']), (7, '7='))
+        self.assertEqual((result['reference_start'], result['reference_end'], result['query_start'], result['query_end']), (6, 13, 2, 9))
+        score_only = self.client.post(reverse('sequence-alignment'), dict(body, score_only=True),
+                                      content_type='application/json').json()
+        self.assertEqual(score_only, {'alignment_score': 7, 'reference_start': 6, 'reference_end': 13, 'query_start': 2, 'query_end': 9})
+
+class BenchmarkTests(SimpleTestCase):
+    def test_inputs_are_seeded(self):
+        self.assertEqual(Inputs(500).sample, Inputs(500).sample)
+        self.assertNotEqual(Inputs(500).reference, Inputs(500, seed=1).reference)
+
+    def test_run_respects_case_size_limits(self):
+        with mock.patch.dict('api.benchmarks.CASES', {'small': (lambda inputs: len(inputs.reference), 100),
+                                                      'any': (lambda inputs: len(inputs.sample), None)}, clear=True):
+            results = run_benchmarks(sizes=[50, 200], repeat=1)['results']
+        self.assertEqual([(result['name'], result['size']) for result in results],
+                         [('small', 50), ('any', 50), ('any', 200)])
+
+    def test_compare_flags_regressions(self):
+        baseline = {'results': [{'name': 'translate', 'size': 10, 'seconds': 1.0, 'peak_bytes': 100}]}
+        current = {'results': [{'name': 'translate', 'size': 10, 'seconds': 1.2, 'peak_bytes': 200},
+                               {'name': 'find_orfs', 'size': 10, 'seconds': 9.0, 'peak_bytes': 1}]}
+        regressions = compare(current, baseline, threshold=0.25)
+        self.assertEqual([(regression['metric'], regression['ratio']) for regression in regressions], [('peak_bytes', 2.0)])
+
+    def test_command_compares_against_committed_baseline(self):
+        with open(DEFAULT_BASELINE) as baseline_file:
+            baseline = json.load(baseline_file)
+        self.assertEqual(baseline['meta']['seed'], 42)
+        self.assertIn({'name': 'translate', 'size': 1000}, [{'name': result['name'], 'size': result['size']} for result in baseline['results']])
+
+        slower = {'meta': {}, 'results': [dict(result, seconds=result['seconds'] * 10 + 1) for result in baseline['results']]}
+        with mock.patch('api.management.commands.benchmark_analysis.run_benchmarks', return_value=slower), \
+                self.assertRaisesMessage(CommandError, 'regression(s) over the baseline'):
+            call_command('benchmark_analysis', stdout=io.StringIO(), stderr=io.StringIO())
+        with mock.patch('api.management.commands.benchmark_analysis.run_benchmarks', return_value=slower):
+            call_command('benchmark_analysis', baseline='', stdout=io.StringIO(), stderr=io.StringIO())
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        result_cache.clear()
+
+    def test_server_timing_reports_phases_and_sizes(self):
+        response = self.client.post(reverse('sequence-alignment'), {'reference_sequence': 'ACGTACGT', 'sample_sequence': 'ACGTCGT'},
+                                    content_type='application/json')
+        header = response['Server-Timing']
+        for name in ('validate;dur=', 'analysis;dur=', 'align;dur=', 'render;dur=', 'total;dur='):
+            self.assertIn(name, header)
+        self.assertIn('sizes;desc="n=8 m=7 cells=56"', header)
+
+    def test_nested_phases_are_counted_once(self):
+        timings, token = start_request()
+        try:
+            with phase('align'):
+                with phase('align'):
+                    pass
+        finally:
+            end_request(token)
+        self.assertEqual(list(timings.phases), ['align'])
+
+    def test_histogram_exposition(self):
+        histogram = Histogram('demo_seconds', 'Demo.', (0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, route='r')
+        self.assertEqual(histogram.render()[2:], [
+            'demo_seconds_bucket{route="r",le="0.1"} 1',
+            'demo_seconds_bucket{route="r",le="1"} 2',
+            'demo_seconds_bucket{route="r",le="+Inf"} 3',
+            'demo_seconds_sum{route="r"} 5.55',
+            'demo_seconds_count{route="r"} 3'
+        ])
+
+    def test_metrics_endpoint(self):
+        self.client.post(reverse('orf-detection'), {'input_sequence': 'ATGAAATAG'}, content_type='application/json')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="POST",route="api/orf-detection/",status="200"}', text)
+        self.assertIn('analysis_phase_duration_seconds_bucket{phase="validate",route="api/orf-detection/",le="+Inf"}', text)
+        self.assertIn('# TYPE result_cache_misses_total counter', text)
+
+    def test_slow_requests_are_profiled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_THRESHOLD_MS=0, PROFILE_DIR=directory):
+                self.client.get(reverse('radarchart'))
+            self.assertEqual([name.endswith('-api-radarchart.prof') for name in os.listdir(directory)], [True])
+
+    def test_overlapping_requests_are_not_profiled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_THRESHOLD_MS=0, PROFILE_DIR=directory):
+                # A request already being profiled
+                with middleware._profiling:
+                    self.assertEqual(self.client.get(reverse('radarchart')).status_code, 200)
+                # A profiler that is not ours (an error on Python 3.12+ if enabled over)
+                external = cProfile.Profile()
+                external.enable()
+                try:
+                    self.assertEqual(self.client.get(reverse('radarchart')).status_code, 200)
+                finally:
+                    external.disable()
+            self.assertFalse(middleware._profiling.locked())
+
+class AsyncViewTests(TestCase):
+    factory = AsyncRequestFactory()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.executor = AnalysisExecutor(max_workers=1, max_pending=2)
+        patcher = mock.patch('api.async_views.analysis_executor', cls.executor)
+        patcher.start()
+        cls.addClassCleanup(patcher.stop)
+        cls.addClassCleanup(cls.executor.shutdown)
+
+    def setUp(self):
+        result_cache.clear()
+
+    async def post(self, view_class, body, path='/'):
+        request = self.factory.post(path, body, content_type='application/json')
+        return await view_class.as_view()(request)
+
+    async def test_matches_sync_views(self):
+        cases = [
+            (AsyncSequenceAlignmentView, 'sequence-alignment', {'reference_sequence': 'ACGTACGTTA', 'sample_sequence': 'ACGTCGTTA', 'output_format': 'both'}),
+            (AsyncORFDetectionView, 'orf-detection', {'input_sequence': 'ATGAAATAGCCATGCCCTGA', 'limit': 1}),
+            (AsyncVariantDetectionView, 'variant-detection', {'reference_sequence': 'ACGTACGTTA', 'sample_sequence': 'ACGAACGTA'}),
+            (AsyncDistanceMatrixView, 'distance-matrix', {'sequences': ['ACGTACGT', 'ACGTTCGT', 'TTTTGGGG'], 'cutoff': 1})
+        ]
+        for view_class, name, body in cases:
+            response = await self.post(view_class, body)
+            self.assertEqual(response.status_code, 200)
+            expected = await self.async_client.post(reverse(name), body, content_type='application/json')
+            self.assertEqual(json.loads(response.content), expected.json())
+
+    async def test_streaming_output_and_fallbacks(self):
+        body = {'reference_sequence': 'ACGTACGTTA', 'sample_sequence': 'ACGAACGTA', 'output_format': 'vcf'}
+        response = await self.post(AsyncVariantDetectionView, body)
+        self.assertEqual(response['Content-Type'], 'text/vcf')
+        text = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertTrue(text.startswith('##fileformat=VCF'))
+
+        response = await self.post(AsyncSequenceAlignmentView, {'reference_sequence': 'ACGT', 'sample_sequence': 'ACT'},
+                                   path='/?async=true')
+        self.assertEqual(response.status_code, 202)
+        response = await self.post(AsyncSequenceAlignmentView, {'reference_sequence': 'ACGU', 'sample_sequence': 'ACT'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('reference_sequence', json.loads(response.content))
+
+    async def test_body_over_upload_limit(self):
+        # Past DATA_UPLOAD_MAX_MEMORY_SIZE, which request.body would refuse
+        body = {'input_sequence': 'C' * 3_000_000}
+        with self.settings(DATA_UPLOAD_MAX_MEMORY_SIZE=2_621_440):
+            response = await self.post(AsyncORFDetectionView, body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), [])
+
+    async def test_full_executor_is_refused(self):
+        with mock.patch.object(self.executor, 'max_pending', 0):
+            response = await self.post(AsyncORFDetectionView, {'input_sequence': 'ATGAAATAG'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    async def test_chart_view(self):
+        today = datetime.date(2024, 5, 1)
+        await DailyAnalysisCount.objects.acreate(date=today, analysis_type='orf_detection', count=3)
+        response = await AsyncAreaChartView.as_view()(self.factory.get('/'))
+        self.assertEqual(json.loads(response.content), [
+            {'date': '2024-05-01', 'analysis': [{'analysis_type': 'orf_detection', 'analysis_count': 3}]}
+        ])
+
+    async def test_iterate_in_thread_batches_lines(self):
+        lines = [f'{i}\n' for i in range(5)]
+        self.assertEqual([chunk async for chunk in iterate_in_thread(lines, batch_size=2)], ['0\n1\n', '2\n3\n', '4\n'])
+
+    async def test_middleware_under_asgi(self):
+        body = {'input_sequence': 'ATGAAATAG'}
+        response = await self.async_client.post(reverse('orf-detection'), gzip.compress(json.dumps(body).encode()),
+                                                content_type='application/json', headers={'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('validate;dur=', response['Server-Timing'])
@@ -1,113 +1,300 @@
-from django.db.models import Count
-from django.db.models.functions import TruncDate
+import io
+from functools import partial
+
+import numpy as np
+from django.db.models import Sum
+from django.http import HttpResponse, StreamingHttpResponse
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import generics
 
-from .serializers import AnalysisResultSerializer, VariantDetectionSerializer, SequenceAlignmentSerializer, ORFDetectionSerializer
-from .analysis import variant_detection, sequence_alignment, orf_detection
-from .models import AnalysisResult
+from .serializers import ChartRangeSerializer, VariantDetectionSerializer, BatchVariantDetectionSerializer, SequenceAlignmentSerializer, DistanceMatrixSerializer, ORFDetectionSerializer, FastaORFDetectionSerializer, ReferenceSerializer
+from .models import DailyAnalysisCount, Job
+from .analytics import analytics_recorder
+from .references import reference_cache, store_reference
+from .fasta import CHUNK_SIZE, fasta_orfs, ndjson_lines
+from .batch import batch_variant_detection
+from .distance_matrix import BEYOND_CUTOFF, distance_matrix
+from .result_cache import result_cache
+from .instrumentation import phase, record_sizes, render_metrics
+from .jobs import cancel_job, job_summary, submit_job, wants_async
+from .runners import run_orf_detection, run_sequence_alignment, run_variant_detection, stream_variant_detection
 # Create your views here.
 
+def daily_counts(request):
+    """
+    Rollup rows within the request's optional start/end dates (inclusive).
+
+    Returns:
+        tuple: (queryset, None), or (None, serializer errors).
+    """
+    serializer = ChartRangeSerializer(data=request.GET)
+    if not serializer.is_valid():
+        return None, serializer.errors
+
+    counts = DailyAnalysisCount.objects.all()
+    if 'start' in serializer.validated_data:
+        counts = counts.filter(date__gte=serializer.validated_data['start'])
+    if 'end' in serializer.validated_data:
+        counts = counts.filter(date__lte=serializer.validated_data['end'])
+    return counts, None
+
+def radar_rows(counts):
+    return counts.values('analysis_type').annotate(count=Sum('count')).order_by('analysis_type')
+
+def radar_data(rows):
+    return [{"analysis_type": item['analysis_type'],
+             "analysis_count": item['count']} for item in rows]
+
+def area_rows(counts):
+    return counts.order_by('date', 'analysis_type').values('date', 'analysis_type', 'count')
+
+def area_data(rows):
+    date_data = {}
+
+    for entry in rows:
+        date = entry['date'].strftime('%Y-%m-%d')
+        type = entry['analysis_type']
+        count = entry['count']
+
+        if not date in date_data:
+            date_data[date] = []
+
+        date_data[date].append({"analysis_type": type, "analysis_count": count})
+
+    return [{"date": date, "analysis": analysis} for date, analysis in date_data.items()]
+
 class RadarChartView(APIView):
     def get(self, request):
-        data = AnalysisResult.objects.values('analysis_type').annotate(count=Count('analysis_type'))
+        counts, errors = daily_counts(request)
+        if errors:
+            return Response(errors, status.HTTP_400_BAD_REQUEST)
 
-        radar_data = [{"analysis_type": item['analysis_type'],
-                      "analysis_count": item['count']} for item in data]
-
-        return Response(radar_data, status=status.HTTP_200_OK)
+        return Response(radar_data(radar_rows(counts)), status=status.HTTP_200_OK)
 
 class AreaChartView(APIView):
     def get(self, request):
-        data = AnalysisResult.objects.annotate(date=TruncDate('created_at')).values('date', 'analysis_type').annotate(count=Count('analysis_type')).order_by('date')
+        counts, errors = daily_counts(request)
+        if errors:
+            return Response(errors, status.HTTP_400_BAD_REQUEST)
 
-        date_data = {}
+        return Response(area_data(area_rows(counts)), status=status.HTTP_200_OK)
 
-        for entry in data:
-            date = entry['date'].strftime('%Y-%m-%d')
-            type = entry['analysis_type']
-            count = entry['count']
+class MetricsView(APIView):
+    def get(self, request):
+        cache_stats = result_cache.stats()
+        metrics = render_metrics([
+            ('result_cache_hits_total', 'Result cache hits in memory.', 'counter', cache_stats['hits']),
+            ('result_cache_db_hits_total', 'Result cache hits in the database tier.', 'counter', cache_stats['db_hits']),
+            ('result_cache_misses_total', 'Result cache misses.', 'counter', cache_stats['misses']),
+            ('result_cache_bytes', 'Size of the in-memory result cache.', 'gauge', cache_stats['bytes']),
+            ('reference_cache_bytes', 'Size of the decoded reference cache.', 'gauge', reference_cache.nbytes),
+            ('analytics_dropped_total', 'Analytics events dropped on a full queue.', 'counter', analytics_recorder.dropped),
+            ('analytics_failed_total', 'Analytics events lost to failed writes.', 'counter', analytics_recorder.failed)
+        ])
+        return HttpResponse(metrics, content_type='text/plain; version=0.0.4; charset=utf-8')
 
-            if not date in date_data:
-                date_data[date] = []
-            
-            date_data[date].append({"analysis_type": type, "analysis_count": count})
+def request_params(request):
+    """
+    A request's parameters as stored on a Job, flattening form-encoded data.
+    """
+    return {key: request.data[key] for key in request.data}
 
-        area_data = [{"date": date, "analysis": analysis} for date, analysis in date_data.items()]
+class JobView(APIView):
+    def get(self, request, job_id):
+        job = Job.objects.filter(id=job_id).first()
+        if job is None:
+            return Response({'detail': 'Job not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job_summary(job), status=status.HTTP_200_OK)
 
-        return Response(area_data, status=status.HTTP_200_OK)
+class JobCancelView(APIView):
+    def post(self, request, job_id):
+        job = Job.objects.filter(id=job_id).first()
+        if job is None:
+            return Response({'detail': 'Job not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if not cancel_job(job_id):
+            return Response({'detail': f'Job already {job.status}.'}, status=status.HTTP_409_CONFLICT)
+        job.refresh_from_db()
+        return Response(job_summary(job), status=status.HTTP_200_OK)
 
-class VariantDetectionView(APIView):
+class ReferenceView(APIView):
     def post(self, request):
-        serializer = VariantDetectionSerializer(data=request.data)
+        serializer = ReferenceSerializer(data=request.data)
 
         if serializer.is_valid():
-            reference_sequence = serializer.validated_data['reference_sequence']
-            sample_sequence = serializer.validated_data['sample_sequence']
-
-            result = variant_detection(reference_sequence, sample_sequence)
+            reference, created = store_reference(serializer.validated_data['sequence'])
 
-            data = {
-                'analysis_type': 'variant_detection'
+            result = {
+                'reference_id': reference.id,
+                'length': reference.length
             }
 
-            db_serializer = AnalysisResultSerializer(data=data)
+            return Response(result, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+        else:
+            return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+class VariantDetectionView(APIView):
+    def post(self, request):
+        serializer = VariantDetectionSerializer(data=request.data)
 
-            if db_serializer.is_valid():
-                db_serializer.save()
-                return Response(result, status=status.HTTP_200_OK)
+        with phase('validate'):
+            valid = serializer.is_valid()
+
+        if valid:
+            output_format = serializer.validated_data['output_format']
+            if output_format != 'json':
+                with phase('analysis'):
+                    lines = stream_variant_detection(serializer.validated_data)
+                analytics_recorder.record('variant_detection')
+                content_type = 'text/vcf' if output_format == 'vcf' else 'application/x-ndjson'
+                return StreamingHttpResponse(lines, content_type=content_type)
+
+            if wants_async(request):
+                result, result_status = job_summary(submit_job('variant_detection', request_params(request))), status.HTTP_202_ACCEPTED
             else:
-                return Response(db_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                with phase('analysis'):
+                    result = result_cache.get_or_compute('variant_detection', serializer.validated_data, run_variant_detection)
+                result_status = status.HTTP_200_OK
+
+            analytics_recorder.record('variant_detection')
+            return Response(result, status=result_status)
         else:
             return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
 
 
-class SequenceAlignmentView(APIView):
+class BatchVariantDetectionView(APIView):
     def post(self, request):
-        serializer = SequenceAlignmentSerializer(data=request.data)
+        serializer = BatchVariantDetectionSerializer(data=request.data)
 
         if serializer.is_valid():
-            reference_sequence = serializer.validated_data['reference_sequence']
-            sample_sequence = serializer.validated_data['sample_sequence']
+            sample_sequences = serializer.validated_data['sample_sequences']
 
-            result = sequence_alignment(reference_sequence, sample_sequence)
+            results = batch_variant_detection(serializer.validated_data['reference_sequence'],
+                                              sample_sequences,
+                                              engine=serializer.validated_data['engine'],
+                                              band_width=serializer.validated_data['band_width'],
+                                              index=serializer.validated_data.get('reference_index'))
 
-            data = {
-                'analysis_type': 'sequence_alignment'
-            }
+            analytics_recorder.record('variant_detection', count=len(sample_sequences))
+
+            return StreamingHttpResponse(ndjson_lines(results), content_type='application/x-ndjson')
+        else:
+            return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+class SequenceAlignmentView(APIView):
+    def post(self, request):
+        serializer = SequenceAlignmentSerializer(data=request.data)
 
-            db_serializer = AnalysisResultSerializer(data=data)
+        with phase('validate'):
+            valid = serializer.is_valid()
 
-            if db_serializer.is_valid():
-                db_serializer.save()
-                return Response(result, status=status.HTTP_200_OK)
+        if valid:
+            if wants_async(request):
+                result, result_status = job_summary(submit_job('sequence_alignment', request_params(request))), status.HTTP_202_ACCEPTED
             else:
-                return Response(db_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                with phase('analysis'):
+                    result = result_cache.get_or_compute('sequence_alignment', serializer.validated_data, run_sequence_alignment)
+                result_status = status.HTTP_200_OK
+
+            analytics_recorder.record('sequence_alignment')
+            return Response(result, status=result_status)
+        else:
+            return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+class DistanceMatrixView(APIView):
+    def post(self, request):
+        serializer = DistanceMatrixSerializer(data=request.data)
+
+        with phase('validate'):
+            valid = serializer.is_valid()
+
+        if valid:
+            sequences = serializer.validated_data['sequences']
+            metric = serializer.validated_data['metric']
+            cutoff = serializer.validated_data['cutoff']
+            pairs = len(sequences) * (len(sequences) - 1) // 2
+            record_sizes(sequences=len(sequences), pairs=pairs)
+
+            with phase('analysis'):
+                condensed = distance_matrix(sequences, metric=metric, cutoff=cutoff)
+
+            analytics_recorder.record('sequence_alignment')
+
+            if serializer.validated_data['output_format'] == 'npy':
+                return npy_response(condensed)
+            return Response(distance_matrix_result(condensed, serializer.validated_data), status=status.HTTP_200_OK)
         else:
             return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
 
+def npy_response(condensed):
+    buffer = io.BytesIO()
+    np.save(buffer, condensed)
+    response = HttpResponse(buffer.getvalue(), content_type='application/octet-stream')
+    response['Content-Disposition'] = 'attachment; filename="distance-matrix.npy"'
+    return response
+
+def distance_matrix_result(condensed, data):
+    """
+    JSON body for a condensed matrix, with BEYOND_CUTOFF reported as null.
+    """
+    values = condensed.tolist()
+    if data['cutoff'] is not None:
+        values = [None if value == BEYOND_CUTOFF else value for value in values]
+    return {
+        'size': len(data['sequences']),
+        'metric': data['metric'],
+        'cutoff': data['cutoff'],
+        'condensed': values
+    }
+
 class ORFDetectionView(APIView):
     def post(self, request):
         serializer = ORFDetectionSerializer(data=request.data)
 
-        if serializer.is_valid():
-            input_sequence = serializer.validated_data['input_sequence']
+        with phase('validate'):
+            valid = serializer.is_valid()
 
-            result = orf_detection(input_sequence)
+        if valid:
+            if wants_async(request):
+                result, result_status = job_summary(submit_job('orf_detection', request_params(request))), status.HTTP_202_ACCEPTED
+            else:
+                with phase('analysis'):
+                    result = result_cache.get_or_compute('orf_detection', serializer.validated_data, run_orf_detection)
+                result_status = status.HTTP_200_OK
 
-            data = {
-                'analysis_type': 'orf_detection'
-            }
+            analytics_recorder.record('orf_detection')
+            return Response(result, status=result_status)
+        else:
+            return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
 
-            db_serializer = AnalysisResultSerializer(data=data)
-            
-            if db_serializer.is_valid():
-                db_serializer.save()
-                return Response(result, status=status.HTTP_200_OK)
+class FastaORFDetectionView(APIView):
+    # Reads its body in chunks, so a gzip body is inflated as it is read.
+    streams_request_body = True
+
+    def post(self, request):
+        serializer = FastaORFDetectionSerializer(data=request.query_params)
+
+        if serializer.is_valid():
+            if request.content_type.startswith('multipart/'):
+                upload = request.FILES.get('file')
+                if upload is None or not upload.size:
+                    return Response({'file': ['No FASTA file was submitted.']}, status.HTTP_400_BAD_REQUEST)
+                chunks = upload.chunks(CHUNK_SIZE)
+            elif request.stream is None:
+                # Empty, or sent without a Content-Length (chunked), which the server cannot read.
+                return Response({'detail': 'No FASTA data was received; send it as the request body with a '
+                                           'Content-Length, or as a multipart "file" field.'},
+                                status.HTTP_400_BAD_REQUEST)
             else:
-                return Response(db_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                chunks = iter(partial(request.stream.read, CHUNK_SIZE), b'')
+
+            records = fasta_orfs(chunks,
+                                 min_length=serializer.validated_data['min_length'],
+                                 longest_only=serializer.validated_data['longest_only'])
+
+            analytics_recorder.record('orf_detection')
+            return StreamingHttpResponse(ndjson_lines(records), content_type='application/x-ndjson')
         else:
-            return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 import os
 from dotenv import load_dotenv 
+from corsheaders.defaults import default_headers
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,7 +47,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.InstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'api.middleware.ResponseCompressionMiddleware',
+    'api.middleware.RequestDecompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +63,65 @@ MIDDLEWARE = [
 
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', '').split(',')
 
+# The frontend gzips large request bodies
+CORS_ALLOW_HEADERS = (*default_headers, 'content-encoding')
+
+# Largest request body accepted once a gzip Content-Encoding is undone, and
+# the smallest response worth compressing
+MAX_DECOMPRESSED_REQUEST_BYTES = int(os.getenv('MAX_DECOMPRESSED_REQUEST_BYTES', 256 * 1024 * 1024))
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', 1024))
+
+# Longest sequence input accepted by the API, in characters
+MAX_SEQUENCE_LENGTH = int(os.getenv('MAX_SEQUENCE_LENGTH', 50_000_000))
+
+# Most sequences accepted by one distance matrix request
+MAX_MATRIX_SEQUENCES = int(os.getenv('MAX_MATRIX_SEQUENCES', 500))
+
+# Size bound for the in-process cache of decoded, indexed references
+REFERENCE_CACHE_BYTES = int(os.getenv('REFERENCE_CACHE_BYTES', 256 * 1024 * 1024))
+
+# Size bound for the in-process cache of k-mer indexes of inline references
+# (16 bytes per base), used by the seeded engine
+INDEX_CACHE_BYTES = int(os.getenv('INDEX_CACHE_BYTES', 256 * 1024 * 1024))
+
+# Directory of memory-mapped references shared by every worker process (unset
+# keeps a private copy per process), and reference ids, or 'all', that each
+# worker loads at startup
+REFERENCE_STORE_DIR = os.getenv('REFERENCE_STORE_DIR', '')
+REFERENCE_PRELOAD = [reference_id for reference_id in os.getenv('REFERENCE_PRELOAD', '').split(',') if reference_id]
+
+# Size bound for the in-memory analysis result cache, and whether results
+# are also kept in the database
+RESULT_CACHE_BYTES = int(os.getenv('RESULT_CACHE_BYTES', 64 * 1024 * 1024))
+RESULT_CACHE_DB = os.getenv('RESULT_CACHE_DB', 'False') == 'True'
+
+# Analytics are buffered and written in bulk by a background thread; events
+# past ANALYTICS_QUEUE_SIZE are dropped rather than slowing requests down
+ANALYTICS_BUFFERED = os.getenv('ANALYTICS_BUFFERED', 'True') == 'True'
+ANALYTICS_QUEUE_SIZE = int(os.getenv('ANALYTICS_QUEUE_SIZE', 10000))
+ANALYTICS_FLUSH_SIZE = int(os.getenv('ANALYTICS_FLUSH_SIZE', 500))
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv('ANALYTICS_FLUSH_INTERVAL', 2.0))
+
+# Request instrumentation: peak-memory tracing (slow) and sampled cProfile
+# captures of requests slower than PROFILE_THRESHOLD_MS
+INSTRUMENT_MEMORY = os.getenv('INSTRUMENT_MEMORY', 'False') == 'True'
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_THRESHOLD_MS = float(os.getenv('PROFILE_THRESHOLD_MS', 1000))
+PROFILE_DIR = os.getenv('PROFILE_DIR', BASE_DIR / 'profiles')
+
+# Worker processes used by batch variant detection and distance matrices
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', os.cpu_count() or 1))
+
+# Background jobs (?async=true) run at most this many at once per server process
+JOB_MAX_CONCURRENCY = int(os.getenv('JOB_MAX_CONCURRENCY', 2))
+
+# Async serving (backend.asgi turns ASYNC_VIEWS on): analyses run on a pool of
+# ANALYSIS_WORKERS processes, and requests past ANALYSIS_MAX_PENDING waiting
+# or running analyses are answered with 503
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', os.cpu_count() or 1))
+ANALYSIS_MAX_PENDING = int(os.getenv('ANALYSIS_MAX_PENDING', 4 * ANALYSIS_WORKERS))
+
 
 ROOT_URLCONF = 'backend.urls'
 
@@ -14,17 +14,47 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.http import JsonResponse
 from django.contrib import admin
 from django.urls import path
-from api.views import RadarChartView, AreaChartView, VariantDetectionView, SequenceAlignmentView, ORFDetectionView
+from api.views import RadarChartView, AreaChartView, ReferenceView, VariantDetectionView, BatchVariantDetectionView, SequenceAlignmentView, DistanceMatrixView, ORFDetectionView, FastaORFDetectionView, JobView, JobCancelView, MetricsView
+
+if settings.ASYNC_VIEWS:
+    from api.async_views import health_check, streaming_view, AsyncRadarChartView, AsyncAreaChartView, AsyncVariantDetectionView, AsyncSequenceAlignmentView, AsyncDistanceMatrixView, AsyncORFDetectionView
+
+    radar_chart = AsyncRadarChartView.as_view()
+    area_chart = AsyncAreaChartView.as_view()
+    variant_detection = AsyncVariantDetectionView.as_view()
+    batch_variant_detection = streaming_view(BatchVariantDetectionView.as_view())
+    sequence_alignment = AsyncSequenceAlignmentView.as_view()
+    distance_matrix = AsyncDistanceMatrixView.as_view()
+    orf_detection = AsyncORFDetectionView.as_view()
+    fasta_orf_detection = streaming_view(FastaORFDetectionView.as_view())
+else:
+    health_check = lambda request: JsonResponse({"status": "ok"})
+    radar_chart = RadarChartView.as_view()
+    area_chart = AreaChartView.as_view()
+    variant_detection = VariantDetectionView.as_view()
+    batch_variant_detection = BatchVariantDetectionView.as_view()
+    sequence_alignment = SequenceAlignmentView.as_view()
+    distance_matrix = DistanceMatrixView.as_view()
+    orf_detection = ORFDetectionView.as_view()
+    fasta_orf_detection = FastaORFDetectionView.as_view()
 
 
 urlpatterns = [
-    path('', lambda request: JsonResponse({"status": "ok"}), name='health-check'),
-    path('api/radarchart/', RadarChartView.as_view(), name = 'radarchart'),
-    path('api/areachart/', AreaChartView.as_view(), name = 'areachart'),
-    path('api/variant-detection/', VariantDetectionView.as_view(), name='variant-detection'),
-    path('api/sequence-alignment/', SequenceAlignmentView.as_view(), name='sequence-alignment'),
-    path('api/orf-detection/', ORFDetectionView.as_view(), name='orf-detection'),
+    path('', health_check, name='health-check'),
+    path('api/radarchart/', radar_chart, name = 'radarchart'),
+    path('api/areachart/', area_chart, name = 'areachart'),
+    path('api/references/', ReferenceView.as_view(), name='references'),
+    path('api/variant-detection/', variant_detection, name='variant-detection'),
+    path('api/variant-detection/batch/', batch_variant_detection, name='variant-detection-batch'),
+    path('api/sequence-alignment/', sequence_alignment, name='sequence-alignment'),
+    path('api/distance-matrix/', distance_matrix, name='distance-matrix'),
+    path('api/orf-detection/', orf_detection, name='orf-detection'),
+    path('api/orf-detection/fasta/', fasta_orf_detection, name='orf-detection-fasta'),
+    path('api/jobs/<uuid:job_id>/', JobView.as_view(), name='job'),
+    path('api/jobs/<uuid:job_id>/cancel/', JobCancelView.as_view(), name='job-cancel'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
@@ -0,0 +1,30 @@
+"""
+Gunicorn configuration for serving backend.asgi with uvicorn workers:
+
+    gunicorn -c gunicorn_asgi.py backend.asgi:application
+
+Each worker runs one event loop, and analyses run on that worker's pool of
+ANALYSIS_WORKERS processes (see api.executor), so a few workers are enough;
+WEB_CONCURRENCY sets how many.
+"""
+
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_class = 'uvicorn_worker.UvicornWorker'
+
+# Long alignments are served on the executor, not inside the worker's loop,
+# so the heartbeat timeout only needs to cover a stuck loop.
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+def post_worker_init(worker):
+    # Map (or decode) the settings.REFERENCE_PRELOAD references before serving.
+    from django.db import close_old_connections
+
+    from api.references import preload_references, preloaded_reference_ids
+
+    preload_references(preloaded_reference_ids())
+    close_old_connections()
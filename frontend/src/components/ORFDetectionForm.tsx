@@ -55,6 +55,7 @@ export default function ORFDetectionForm() {
             try {
                 const body = {
                     input_sequence: values.input_sequence,
+                    include_sequences: true,
                 };
                 const endpoint = "https://medtech-backend-latest.onrender.com/api/orf-detection/";
     
@@ -1,8 +1,25 @@
+// Request bodies at least this large are gzipped before upload
+const COMPRESSION_THRESHOLD = 64 * 1024;
+
+async function gzip(text: string): Promise<Blob> {
+    const stream = new Blob([text]).stream().pipeThrough(new CompressionStream("gzip"));
+    return new Response(stream).blob();
+}
+
 export async function postData({ url, body, setResult }: { url: string; body: Record<string, any>; setResult: any }) {
+    const json = JSON.stringify(body);
+    const headers: Record<string, string> = { "Content-Type": "application/json" };
+    let payload: BodyInit = json;
+
+    if (json.length >= COMPRESSION_THRESHOLD && typeof CompressionStream !== "undefined") {
+        headers["Content-Encoding"] = "gzip";
+        payload = await gzip(json);
+    }
+
     const response = await fetch(url, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(body),
+        headers,
+        body: payload,
     });
 
     if (!response.ok) {